@@ -1,3 +1,4 @@
 from gym.envs.registration import register
 
-register(id='HandClassificationEnv-v3', entry_point='HandClassificationEnv.envs:HandClassificationEnv')
+register(id='HandClassificationEnv-v3',
+         entry_point='HandClassificationEnv.envs.HandClassificationEnv:HandClassificationEnv')
@@ -2,26 +2,80 @@ import treys
 import gym
 from itertools import compress
 import numpy as np
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import CARD_INTS, N_CARDS, check_obs_mode, encode, encode_onehot
+from PokerEngine.deck import Deck
+from PokerEngine.evaluation import evaluate_batch
+
+
+def make_observation_space(obs_mode):
+    if obs_mode == 'index':
+        return gym.spaces.Box(low=0, high=N_CARDS - 1, shape=(5,), dtype=np.uint8)
+    if obs_mode == 'onehot':
+        return gym.spaces.Box(low=0, high=1, shape=(N_CARDS,), dtype=np.uint8)
+    return gym.spaces.multi_binary.MultiBinary(160)  # 32 bits * 5 cards
 
 
 class HandClassificationEnv(gym.Env):
-    def __init__(self):
-        self.evaluator = treys.evaluator.Evaluator()
-        self.deck = treys.deck.Deck()
-        self.card_ints = self.deck.draw(5)
-        self.rank_class = self.evaluator.get_rank_class(self.evaluator._five(self.card_ints))
-        self.card_strings = [treys.Card.int_to_str(c) for c in self.card_ints]
+    # timed when a PokerEngine.profiling.Profiler is passed as profiler
+    PROFILED_PHASES = ('step', 'reset', '_get_rank_class', '_get_reward', '_get_obs')
+
+    def __init__(self, obs_mode='bits', profiler=None, obs_buffer=None, readonly_obs=False):
+        check_obs_mode(obs_mode)
+        self.obs_mode = obs_mode
+        self.readonly_obs = readonly_obs
+        if profiler is not None:
+            profiler.instrument(self, self.PROFILED_PHASES)
+        self.deck = Deck()
+        self.cards = self.deck.deal(5)
+        self.rank_class = self._get_rank_class()
         self.done = False
         self.reward_range = (-1, 1)
         self.action_space = gym.spaces.discrete.Discrete(9)  # select one of 9 hands from 5
-        self.observation_space = gym.spaces.multi_binary.MultiBinary(160)  # 32 bits * 5 cards
+        self.observation_space = make_observation_space(obs_mode)
+        # observations are written into obs_buffer in place when one is set, see PokerEngine.buffers
+        self.obs_buffer = None
+        self.set_obs_buffer(obs_buffer)
+
+    @property
+    def card_ints(self):
+        return CARD_INTS[self.cards].tolist()
+
+    @property
+    def card_strings(self):
+        return [treys.Card.int_to_str(c) for c in self.card_ints]
+
+    def seed(self, seed=None):
+        return self.deck.seed(seed)
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the following observations into buffer in place, or into new arrays if None"""
+        buffer = check_obs_buffer(buffer, self.observation_space.shape)
+        self.obs_buffer = buffer
 
     def _get_obs(self):
-        # the observation is the encoded representation of the cards
-        # get 13 cards and convert them to binary strings
-        return np.array(
-            [item for sublist in [[int(i) for i in y] for y in [f'{a:032b}' for a in self.card_ints]] for item in
-             sublist])
+        obs = self._build_obs(self.obs_buffer)
+        return readonly(obs) if self.readonly_obs else obs
+
+    def _build_obs(self, out):
+        # the observation is the encoded representation of the cards, by default 32 bits per card
+        if self.obs_mode == 'index':
+            # the dealt cards are a view of the deck, which is reshuffled on reset
+            if out is None:
+                return self.cards.copy()
+            out[:] = self.cards
+            return out
+        if self.obs_mode == 'onehot':
+            if out is None:
+                return encode_onehot(self.cards)
+            out[:] = 0
+            out[self.cards] = 1
+            return out
+        return encode(self.cards, out)
+
+    def _get_rank_class(self):
+        _, rank_classes = evaluate_batch(self.cards[None])
+        return int(rank_classes[0])
 
     def _get_reward(self, action):
         """If the choice matches the rank class, get one point. Otherwise, minus 1. 
@@ -36,8 +90,8 @@ class HandClassificationEnv(gym.Env):
         return self._get_obs(), self.reward, self.done, {}
 
     def reset(self):
-        self.deck = treys.deck.Deck()
+        self.deck.shuffle()
         self.done = False
-        self.card_ints = self.deck.draw(5)
-        self.rank_class = self.evaluator.get_rank_class(self.evaluator._five(self.card_ints))
+        self.cards = self.deck.deal(5)
+        self.rank_class = self._get_rank_class()
         return self._get_obs()
@@ -1,3 +1,2 @@
 from HandClassificationEnv.envs.HandClassificationEnv import HandClassificationEnv
-
-HandClassificationEnv()
+from HandClassificationEnv.envs.vec_env import VecHandClassificationEnv
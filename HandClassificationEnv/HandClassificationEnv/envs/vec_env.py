@@ -0,0 +1,27 @@
+import gym
+import numpy as np
+from PokerEngine.hands import HandDealer, VecHandEnv
+from HandClassificationEnv.envs.HandClassificationEnv import make_observation_space
+
+
+class VecHandClassificationEnv(VecHandEnv):
+    """N games of HandClassificationEnv dealt and scored together as NumPy arrays
+
+    Each step scores one action per game against the rank classes of the dealt hands and returns the next batch
+    of hands, which the `PokerEngine.hands.HandDealer` has already built while the actions were scored.
+    prefetch=False builds every batch on demand instead. obs_buffer and readonly_obs work as in
+    `PokerEngine.hands.VecHandEnv`.
+    """
+
+    def __init__(self, num_envs, seed=None, obs_mode='bits', prefetch=True, obs_buffer=None, readonly_obs=False):
+        dealer = HandDealer(num_envs, 1, obs_mode, seed=seed, prefetch=prefetch)
+        super().__init__(num_envs, dealer, readonly_obs)
+        self.obs_mode = obs_mode
+        self.observation_space = make_observation_space(obs_mode)
+        self.action_space = gym.spaces.Discrete(9)
+        self.set_obs_buffer(obs_buffer)
+        self.reward_range = (-1, 1)
+
+    def _get_rewards(self, batch, actions):
+        rank_classes = batch.rank_classes[:, 0]
+        return np.where(actions == rank_classes - 1, (9 - rank_classes) / 9, -1)
@@ -2,5 +2,5 @@ from setuptools import setup
 
 setup(name='HandClassificationEnv',
       version='0.3',
-      install_requires=['gym', 'treys']
+      install_requires=['gym', 'treys', 'numpy', 'PokerEngine']
       )
@@ -1,3 +1,3 @@
 from gym.envs.registration import register
 
-register(id='HandMakerEnv-v1', entry_point='HandMakerEnv.envs:HandMaker')
+register(id='HandMakerEnv-v1', entry_point='HandMakerEnv.envs.HandMakerEnv:HandMaker')
@@ -3,25 +3,81 @@ import gym
 from gym import spaces
 from itertools import compress
 import numpy as np
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import CARD_INTS, N_CARDS, check_obs_mode, encode, encode_onehot
+from PokerEngine.deck import Deck
+from PokerEngine.evaluation import evaluate_batch
+
+
+def make_observation_space(obs_mode):
+    if obs_mode == 'index':
+        return gym.spaces.Box(low=0, high=N_CARDS - 1, shape=(10,), dtype=np.uint8)
+    if obs_mode == 'onehot':
+        # one 52 wide vector for each of the two hands
+        return gym.spaces.Box(low=0, high=1, shape=(2 * N_CARDS,), dtype=np.uint8)
+    return gym.spaces.multi_binary.MultiBinary(320)  # 32 bits * 10 cards
 
 
 class HandMaker(gym.Env):
-    def __init__(self):
-        self.evaluator = treys.evaluator.Evaluator()
-        self.deck = treys.deck.Deck()
-        self.card_ints = self.deck.draw(10).sort()
-        self.card_strings = [treys.Card.int_to_str(c) for c in self.card_ints]
+    # timed when a PokerEngine.profiling.Profiler is passed as profiler
+    PROFILED_PHASES = ('step', 'reset', '_deal', '_get_reward', '_get_obs')
+
+    def __init__(self, obs_mode='bits', profiler=None, obs_buffer=None, readonly_obs=False):
+        check_obs_mode(obs_mode)
+        self.obs_mode = obs_mode
+        self.readonly_obs = readonly_obs
+        if profiler is not None:
+            profiler.instrument(self, self.PROFILED_PHASES)
+        self.deck = Deck()
+        self.cards = self._deal()
         self.done = False
         self.reward_range = (0, 1)
         self.action_space = gym.spaces.Discrete(2)  # select from 13 cards
-        self.observation_space = gym.spaces.multi_binary.MultiBinary(320)  # 32 bits * 10 cards
+        self.observation_space = make_observation_space(obs_mode)
+        # observations are written into obs_buffer in place when one is set, see PokerEngine.buffers
+        self.obs_buffer = None
+        self.set_obs_buffer(obs_buffer)
+
+    @property
+    def card_ints(self):
+        return CARD_INTS[self.cards].tolist()
+
+    @property
+    def card_strings(self):
+        return [treys.Card.int_to_str(c) for c in self.card_ints]
+
+    def seed(self, seed=None):
+        return self.deck.seed(seed)
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the following observations into buffer in place, or into new arrays if None"""
+        buffer = check_obs_buffer(buffer, self.observation_space.shape)
+        self.obs_buffer = buffer
+
+    def _deal(self):
+        # the two hands are the ten cards sorted by treys int, split in half
+        cards = self.deck.deal(10)
+        return cards[np.argsort(CARD_INTS[cards])]
 
     def _get_obs(self):
-        # the observation is the encoded representation of the cards
-        # get 10 cards and convert them to binary strings and then to bits
-        return np.array(
-            [item for sublist in [[int(i) for i in y] for y in [f'{a:032b}' for a in self.card_ints]] for item in
-             sublist], dtype='int')
+        obs = self._build_obs(self.obs_buffer)
+        return readonly(obs) if self.readonly_obs else obs
+
+    def _build_obs(self, out):
+        # the observation is the encoded representation of the cards, by default 32 bits per card
+        if self.obs_mode == 'index':
+            if out is None:
+                return self.cards.copy()
+            out[:] = self.cards
+            return out
+        if self.obs_mode == 'onehot':
+            if out is None:
+                return encode_onehot(self.cards.reshape(2, 5)).ravel()
+            out[:] = 0
+            out[self.cards[:5]] = 1
+            out[N_CARDS + self.cards[5:]] = 1
+            return out
+        return encode(self.cards, out)
 
     def _get_reward(self, action):
         """Return 1 minus the rank class percentage for the five card hand
@@ -29,7 +85,8 @@ class HandMaker(gym.Env):
         If we return 1 - this value, we return a reward in [0,1] where the 
         higher number is a better reward.
         """
-        zero_is_better = self.evaluator._five(self.card_ints[:5]) < self.evaluator._five(self.card_ints[5:])
+        ranks, _ = evaluate_batch(self.cards.reshape(2, 5))
+        zero_is_better = ranks[0] < ranks[1]
         return 1 if action == zero_is_better else 0
 
     def step(self, action):
@@ -39,10 +96,9 @@ class HandMaker(gym.Env):
         return self._get_obs(), self.reward, self.done, {}
 
     def reset(self):
-        self.deck = treys.deck.Deck()
+        self.deck.shuffle()
         self.done = False
-        self.card_ints = self.deck.draw(10).sort()
-        self.card_strings = [treys.Card.int_to_str(c) for c in self.card_ints]
+        self.cards = self._deal()
         return self._get_obs()
 
     def render(self, mode='human'):
@@ -1,3 +1,2 @@
 from HandMakerEnv.envs.HandMakerEnv import HandMaker
-
-HandMaker()
+from HandMakerEnv.envs.vec_env import VecHandMaker
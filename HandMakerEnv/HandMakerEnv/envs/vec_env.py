@@ -0,0 +1,27 @@
+import gym
+import numpy as np
+from PokerEngine.hands import HandDealer, VecHandEnv
+from HandMakerEnv.envs.HandMakerEnv import make_observation_space
+
+
+class VecHandMaker(VecHandEnv):
+    """N games of HandMaker dealt and scored together as NumPy arrays
+
+    Each game's ten cards are sorted by treys int and split into two hands, as in HandMaker. Each step scores one
+    action per game against the ranks of both hands and returns the next batch of hands, which the
+    `PokerEngine.hands.HandDealer` has already built while the actions were scored. prefetch=False builds every
+    batch on demand instead. obs_buffer and readonly_obs work as in `PokerEngine.hands.VecHandEnv`.
+    """
+
+    def __init__(self, num_envs, seed=None, obs_mode='bits', prefetch=True, obs_buffer=None, readonly_obs=False):
+        dealer = HandDealer(num_envs, 2, obs_mode, sort=True, seed=seed, prefetch=prefetch)
+        super().__init__(num_envs, dealer, readonly_obs)
+        self.obs_mode = obs_mode
+        self.observation_space = make_observation_space(obs_mode)
+        self.action_space = gym.spaces.Discrete(2)
+        self.set_obs_buffer(obs_buffer)
+        self.reward_range = (0, 1)
+
+    def _get_rewards(self, batch, actions):
+        zero_is_better = batch.ranks[:, 0] < batch.ranks[:, 1]
+        return (actions == zero_is_better).astype(np.float32)
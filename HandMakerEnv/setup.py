@@ -2,5 +2,5 @@ from setuptools import setup
 
 setup(name='HandMakerEnv',
       version='1.3',
-      install_requires=['gym', 'treys', 'numpy']
+      install_requires=['gym', 'treys', 'numpy', 'PokerEngine']
       )
@@ -1,3 +1,4 @@
 from gym.envs.registration import register
 
-register(id='OpenFaceSimpleEnv-v1', entry_point='OpenFaceSimpleEnv.envs:OpenFaceSimpleEnv')
+register(id='OpenFaceSimpleEnv-v1', entry_point='OpenFaceSimpleEnv.envs.OpenFaceSimpleEnv:OpenFaceSimpleEnv')
+register(id='OpenFaceEnv-v1', entry_point='OpenFaceSimpleEnv.envs.OpenFaceEnv:OpenFaceEnv')
@@ -1,7 +1,18 @@
+import subprocess
+import sys
+import tempfile
 import unittest
+import numpy as np
 import treys
 import OpenFaceSimpleEnv
 from OpenFaceSimpleEnv import convert_bitlist_to_int
+from OpenFaceEnv import OpenFaceEnv
+from vec_env import VecOpenFaceEnv, VecOpenFaceSimpleEnv
+from feature_processor import FEATURE_SIZE, FeatureObservation, VecFeatureObservation, observation_processor
+from PokerEngine import ofc
+from PokerEngine.cards import CARD_INTS
+from PokerEngine.profiling import Profiler
+from PokerEngine.trajectories import TrajectoryLog, TrajectoryRecorder
 
 print("testing")
 
@@ -37,34 +48,32 @@ class MyTestCase(unittest.TestCase):
 
     def test_render(self):
         env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
-        env.render()
+        assert env.render('ansi').count(' __ ') == 10
         done = env.done
         t = 0
         while env.done is False:
             t += 1
             action = t % 2
             obs, r, done, info = env.step(action)
-            env.render()
+            text = env.render('ansi')
+            assert f"Step: {env.state.step}" in text
         assert t == 10, f"Continued for too may steps {t}"
-        print(f"Rewards: {r}")
+        assert ' __ ' not in text
+        assert r in [2, -1]
 
     def test_experience_random(self, steps=15):
         env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
         o = env.observation_space.sample()
-        print("Starting random board")
         env.obs = o
-        env.render()
+        assert "Player card" in env.render('ansi')
         done = False
         for _ in range(steps):
             if done: break
-            print("TEST EXPERIENCE STEP {}".format(_))
-            print("Player card: ", treys.Card.int_to_pretty_str(convert_bitlist_to_int(env.obs[320:352])))
+            card = treys.Card.int_to_pretty_str(convert_bitlist_to_int(env.obs[320:352]))
             action = env.action_space.sample()
-
-            print("Placing into: {}".format(action))
             obs, r, done, info = env.step(action)
-            print(r)
-            env.render()
+            # the card is placed unless its row was already full
+            assert card in env.render('ansi').split("Board")[1] or r == ofc.FULL_ROW_REWARD
 
     def test_step(self):
         env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
@@ -76,23 +85,350 @@ class MyTestCase(unittest.TestCase):
     def test_repeated_action(self):
         # what happens when we step through the environment with the same action?
         env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
-        print("\n Repeating \n")
         t = 0
         actions_dict = {0: 0, 1: 0}
         while not env.done:
-            print(f"Steps: {t}")
-            env.render()
+            assert f"Step: {t}" in env.render('ansi')
             action = env.action_space.sample()
             actions_dict[action] = actions_dict[action] + 1
-            print(actions_dict)
-            print(f"attempting: {action}")
             obs, r, done, _ = env.step(action)
-            print(f"obs step: {obs[-4:]}")
-            print(f"Reward: {r}")
-            print(f"Done yet? {env.done}")
-            print("\n")
             t += 1
-        print(f"final iterations: {t}")
+        assert done and t <= 10 and sum(actions_dict.values()) == t
+        assert r == ofc.FULL_ROW_REWARD if max(actions_dict.values()) > 5 else r in [2, -1]
+
+    def test_obs_round_trip(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
+        for t in range(4):
+            env.step(t % 2)
+        o = env.obs
+        env.obs = o
+        assert (env.obs == o).all()
+        assert env.state.counts == [2, 2] and env.state.step == 4
+
+    def test_compact_obs_modes(self):
+        for obs_mode, shape in [('index', (12,)), ('onehot', (156,))]:
+            env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(obs_mode=obs_mode)
+            for t in range(10):
+                obs, r, done, info = env.step(t % 2)
+                assert obs.shape == shape and obs.dtype == np.uint8
+                assert env.observation_space.contains(obs)
+            state = env.state
+            env.obs = obs
+            assert sorted(env.state.board) == sorted(state.board) and env.state.card == state.card
+            assert env._get_reward(obs) == r
+
+    def test_play_matches_step(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
+        for t in range(10):
+            r, done = env.play(t % 2)
+        assert done and r in [2, -1]
+        assert r == env._get_reward(env.obs)
+
+    def test_sample_batch(self):
+        space = OpenFaceSimpleEnv.OFCSObservationSpace(356, seed=0)
+        obs = space.sample_batch(1000)
+        assert obs.shape == (1000, 356) and obs.dtype == np.uint8
+        for o in obs[:100]:
+            state = OpenFaceSimpleEnv.ofc.GameState.from_observation(o)
+            cards = [c for c in state.board if c != 52] + [state.card]
+            assert len(set(cards)) == len(cards) == state.step + 1 and state.step < 10
+        space.seed(0)
+        assert (space.sample_batch(1000) == obs).all()
+        for _ in range(20):
+            assert space.contains(space.sample())
+
+    def test_seed_reproducible(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
+        games = []
+        for _ in range(2):
+            env.seed(7)
+            obs = [env.reset()] + [env.step(t % 2)[0] for t in range(10)]
+            games.append(np.array(obs))
+        assert (games[0] == games[1]).all()
+
+    def test_profiler(self):
+        profiler = Profiler()
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(profiler=profiler)
+        for t in range(10):
+            env.step(t % 2)
+        phases = profiler.to_dict()['phases']
+        assert phases['step']['count'] == 10 and phases['place']['count'] == 10
+        assert set(phases) == {'step', 'reset', 'place', 'draw', 'get_reward', 'get_obs'}
+
+    def test_info_features(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(info_features=True)
+        for t in range(6):
+            obs, r, done, info = env.step(0 if t < 5 else 1)
+        front, back = info['rows']
+        assert front['full'] and front['n_cards'] == 5 and back['n_cards'] == 1
+        assert back['category'] == 9 and front['category'] <= 9
+
+
+class ObsBufferTestCase(unittest.TestCase):
+    def test_steps_write_into_the_buffer(self):
+        for obs_mode, size in (('bits', 356), ('index', 12), ('onehot', 156)):
+            rollout = np.zeros((11, size), dtype=np.uint8)
+            env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(obs_mode=obs_mode, obs_buffer=rollout[0])
+            boards = [list(env.state.board)]
+            for t in range(10):
+                row = rollout[t + 1]
+                env.set_obs_buffer(row)
+                obs, r, done, info = env.step(t % 2)
+                assert obs is row
+                boards.append(list(env.state.board))
+            for row, board in zip(rollout, boards):
+                assert sorted(env._decode(row).board) == sorted(board)
+
+    def test_readonly_obs(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(readonly_obs=True)
+        obs, r, done, info = env.step(0)
+        with self.assertRaises(ValueError):
+            obs[0] = 1
+        vec_env = VecOpenFaceSimpleEnv(4, seed=0, readonly_obs=True)
+        obs = vec_env.reset()
+        assert not obs.flags.writeable
+        obs, rewards, dones, infos = vec_env.step(np.zeros(4))
+        assert not obs.flags.writeable and (obs[:, -4:] == [0, 0, 0, 1]).all()
+
+    def test_readonly_obs_survive_the_next_step(self):
+        for env in (OpenFaceSimpleEnv.OpenFaceSimpleEnv(readonly_obs=True),
+                    OpenFaceSimpleEnv.OpenFaceSimpleEnv(obs_mode='index', readonly_obs=True),
+                    OpenFaceEnv(readonly_obs=True)):
+            stored = [env.reset()]
+            copies = [stored[0].copy()]
+            for t in range(4):
+                stored.append(env.step(t % 2)[0])
+                copies.append(stored[-1].copy())
+            assert all((obs == copy).all() for obs, copy in zip(stored, copies))
+            assert len({id(obs.base) for obs in stored}) == len(stored)
+        vec_env = VecOpenFaceSimpleEnv(4, seed=0, readonly_obs=True)
+        first = vec_env.reset()
+        copy = first.copy()
+        vec_env.step(np.zeros(4))
+        assert (first == copy).all()
+
+    def test_vec_env_adopts_a_bits_buffer(self):
+        buffer = np.zeros((8, 356), dtype=np.int8)
+        env = VecOpenFaceSimpleEnv(8, seed=1, obs_buffer=buffer)
+        reference = VecOpenFaceSimpleEnv(8, seed=1)
+        assert env.reset() is buffer and (buffer == reference.reset()).all()
+        for t in range(12):
+            obs, rewards, dones, infos = env.step(np.full(8, t % 2))
+            expected, expected_rewards, _, _ = reference.step(np.full(8, t % 2))
+            assert obs is buffer and (obs == expected).all() and (rewards == expected_rewards).all()
+        with self.assertRaises(ValueError):
+            env.set_obs_buffer(np.zeros((4, 356), dtype=np.int8))
+
+
+class VecEnvTestCase(unittest.TestCase):
+    def test_reset_shape(self):
+        env = VecOpenFaceSimpleEnv(8, seed=0)
+        obs = env.reset()
+        assert obs.shape == (8, 356)
+        assert (obs[:, :320] == 0).all()
+        assert (obs[:, -4:] == 0).all()
+
+    def test_alternating_actions_finish_in_ten_steps(self):
+        env = VecOpenFaceSimpleEnv(16, seed=1)
+        env.reset()
+        for t in range(10):
+            obs, rewards, dones, infos = env.step(np.full(16, t % 2))
+        assert dones.all()
+        assert set(rewards) <= {2, -1}
+        assert (obs[:, :320] == 0).all(), "finished games should be reset"
+        terminal = np.array([info['terminal_observation'] for info in infos])
+        assert (terminal[:, :320].reshape(16, 10, 32).sum(axis=2) > 0).all()
+
+    def test_full_row_ends_game(self):
+        env = VecOpenFaceSimpleEnv(4, seed=2)
+        env.reset()
+        for _ in range(5):
+            obs, rewards, dones, infos = env.step(np.zeros(4))
+        assert not dones.any()
+        obs, rewards, dones, infos = env.step(np.zeros(4))
+        assert dones.all() and (rewards == -10).all()
+
+    def test_matches_single_env_scoring(self):
+        env = VecOpenFaceSimpleEnv(32, seed=3)
+        env.reset()
+        single = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
+        for t in range(10):
+            obs, rewards, dones, infos = env.step(np.full(32, t % 2))
+        for reward, info in zip(rewards, infos):
+            single.obs = info['terminal_observation'].astype('int')
+            single.done = True
+            assert single._get_reward(single.obs) == reward
+
+
+class OpenFaceEnvTestCase(unittest.TestCase):
+    ROWS = [0] * 3 + [1] * 5 + [2] * 5
+
+    def test_spaces_follow_the_config(self):
+        env = OpenFaceEnv()
+        assert env.observation_space.n == 13 * 32 + 32 + 4 and env.action_space.n == 3
+        assert env.reset().shape == (452,)
+        assert OpenFaceEnv(obs_mode='index').reset().shape == (15,)
+        assert OpenFaceEnv(obs_mode='onehot').reset().shape == (208,)
+        assert OpenFaceEnv(config='simple').observation_space.n == 356
+
+    def test_full_game(self):
+        env = OpenFaceEnv()
+        env.seed(0)
+        env.reset()
+        for t, action in enumerate(self.ROWS):
+            obs, r, done, info = env.step(action)
+            assert done == (t == 12)
+        assert r == env.state.score() and env.reward_range[0] <= r <= env.reward_range[1]
+
+    def test_front_row_holds_three_cards(self):
+        env = OpenFaceEnv()
+        for _ in range(3):
+            obs, r, done, info = env.step(0)
+        assert not done
+        obs, r, done, info = env.step(0)
+        assert done and r == -10
+
+    def test_vec_env_matches_single_env_scoring(self):
+        env = VecOpenFaceEnv(32, seed=4, obs_mode='index')
+        env.reset()
+        for action in self.ROWS:
+            obs, rewards, dones, infos = env.step(np.full(32, action))
+        assert dones.all()
+        for reward, info in zip(rewards, infos):
+            single = OpenFaceEnv()
+            for card, action in zip(info['terminal_observation'][:13], self.ROWS):
+                single.state.card = int(card)
+                single.state.place(action)
+            assert single.state.score() == reward
+
+
+class FeatureProcessorTestCase(unittest.TestCase):
+    def test_features_of_a_board(self):
+        # front As Ks Qs Js, back 2h 2d 2c 7s, Ts to be placed
+        obs = np.array([48, 44, 40, 36, 52, 1, 2, 3, 20, 52, 32, 8], dtype=np.uint8)
+        features = observation_processor(obs, 'index')[12:]
+        assert features.shape == (FEATURE_SIZE,)
+        front, back, xor, card = features[:25], features[25:50], features[50:67], features[67:]
+        assert list(front[8:13]) == [0, 1, 1, 1, 1] and list(front[13:17]) == [4, 0, 0, 0]
+        # cards, pairs, trips, quads, max suit, flush draw, straight cards, straight draw
+        assert list(front[17:]) == [4, 0, 0, 0, 4, 1, 4, 1]
+        assert back[0] == 3 and back[5] == 1 and list(back[17:]) == [4, 0, 1, 0, 1, 0, 1, 0]
+        assert list(xor[:13]) == [1, 0, 0, 0, 0, 1, 0, 0, 0, 1, 1, 1, 1] and list(xor[13:]) == [0, 1, 1, 1]
+        assert list(card) == [0, 0, 4, 1]
+
+    def test_obs_modes_and_batches_agree(self):
+        features = []
+        for obs_mode in ('bits', 'index', 'onehot'):
+            env = VecOpenFaceSimpleEnv(16, seed=5, obs_mode=obs_mode)
+            env.reset()
+            for t in range(4):
+                obs, rewards, dones, infos = env.step(np.full(16, t % 2))
+            batch = observation_processor(obs, obs_mode)
+            assert (batch[:, :obs.shape[1]] == obs).all()
+            for row, augmented in zip(obs, batch):
+                assert (observation_processor(row, obs_mode) == augmented).all()
+            features.append(batch[:, obs.shape[1]:])
+        assert (features[0] == features[1]).all() and (features[0] == features[2]).all()
+        with self.assertRaises(ValueError):
+            observation_processor(obs, 'bits')
+
+    def test_wrappers(self):
+        env = FeatureObservation(OpenFaceSimpleEnv.OpenFaceSimpleEnv())
+        obs = env.reset()
+        for t in range(10):
+            assert env.observation_space.contains(obs)
+            obs, r, done, info = env.step(t % 2)
+        assert done and obs.shape == (356 + FEATURE_SIZE,)
+        vec_env = VecFeatureObservation(VecOpenFaceSimpleEnv(8, seed=6))
+        obs = vec_env.reset()
+        for t in range(10):
+            obs, rewards, dones, infos = vec_env.step(np.full(8, t % 2))
+        assert obs.shape == (8, 356 + FEATURE_SIZE) and dones.all()
+        # a full front row and a full back row
+        assert all(list(info['terminal_observation'][[356 + 17, 356 + 42]]) == [5, 5] for info in infos)
+
+
+class TrajectoryRecorderTestCase(unittest.TestCase):
+    def test_records_card_indices(self):
+        with tempfile.TemporaryDirectory() as path:
+            env = TrajectoryRecorder(OpenFaceSimpleEnv.OpenFaceSimpleEnv(), path, chunk_size=16)
+            twin = OpenFaceSimpleEnv.OpenFaceSimpleEnv(obs_mode='index')
+            env.seed(7)
+            twin.seed(7)
+            expected = []
+            for episode in range(4):
+                obs, twin_obs = env.reset(), twin.reset()
+                for t in range(10):
+                    expected.append(twin_obs)
+                    obs, reward, done, info = env.step(t % 2)
+                    twin_obs, *_ = twin.step(t % 2)
+            env.close()
+            log = TrajectoryLog(path)
+            assert log.metadata['encoding'] == 'index' and len(log) == 40 and len(log.chunks) == 3
+            assert (log.memmap('obs') == np.array(expected)).all()
+            episodes = list(log.iter_episodes())
+            assert len(episodes) == 4 and all(len(e['obs']) == 10 and e['done'][-1] for e in episodes)
+            assert (episodes[0]['action'] == [0, 1] * 5).all()
+
+
+class RenderTestCase(unittest.TestCase):
+    def test_render_modes(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv()
+        env.step(0)
+        lines = env.render('ansi').split("\n")
+        assert lines[1] == "Step: 1" and len(lines) == 8
+        assert lines[5].startswith(treys.Card.int_to_pretty_str(int(CARD_INTS[env.state.board[0]])))
+        image = env.render('rgb_array')
+        assert image.shape == (36, 40, 3) and image.dtype == np.uint8
+        with self.assertRaises(ValueError):
+            env.render('pixels')
+        image = OpenFaceEnv().render('rgb_array')
+        assert image.shape == (48, 40, 3)
+
+    def test_render_every(self):
+        env = OpenFaceSimpleEnv.OpenFaceSimpleEnv(render_every=3)
+        rendered = []
+        for episode in range(7):
+            rendered.append(env.render('ansi') is not None)
+            env.reset()
+        assert rendered == [True, False, False, True, False, False, True]
+        for render_every in (0, -1):
+            with self.assertRaises(ValueError):
+                OpenFaceSimpleEnv.OpenFaceSimpleEnv(render_every=render_every)
+            with self.assertRaises(ValueError):
+                OpenFaceEnv(render_every=render_every)
+
+    def test_vec_env_renders_a_grid(self):
+        env = VecOpenFaceSimpleEnv(10, seed=0)
+        env.reset()
+        env.step(np.zeros(10))
+        text = env.render('ansi', columns=4)
+        assert len(text.split("\n")) == 3 * 8 and text.count("Step: 1") == 10
+        assert env.render('rgb_array', indices=[0, 1, 2], columns=2).shape == (72, 80, 3)
+        images = env.get_images()
+        assert len(images) == 10 and images[0].shape == (36, 40, 3)
+
+
+class RegistrationTestCase(unittest.TestCase):
+    def test_envs_export_classes_after_importing_their_modules(self):
+        # run from a fresh interpreter, this file imports the env modules flat under the package names
+        script = (
+            "import gym, HandClassificationEnv, HandMakerEnv, OpenFaceSimpleEnv\n"
+            "import HandClassificationEnv.envs.vec_env, HandMakerEnv.envs.vec_env, OpenFaceSimpleEnv.envs.vec_env\n"
+            "import OpenFaceSimpleEnv.envs.OpenFaceSimpleEnv, OpenFaceSimpleEnv.envs.OpenFaceEnv\n"
+            "from OpenFaceSimpleEnv.envs import OpenFaceEnv, OpenFaceSimpleEnv\n"
+            "from HandClassificationEnv.envs import HandClassificationEnv\n"
+            "from HandMakerEnv.envs import HandMaker\n"
+            "for cls in (OpenFaceEnv, OpenFaceSimpleEnv, HandClassificationEnv, HandMaker):\n"
+            "    assert isinstance(cls, type), cls\n"
+            "for env_id in ('OpenFaceSimpleEnv-v1', 'OpenFaceEnv-v1', 'HandClassificationEnv-v3', 'HandMakerEnv-v1'):\n"
+            "    env = gym.make(env_id)\n"
+            "    env.reset()\n"
+            "    env.step(env.action_space.sample())\n"
+        )
+        with tempfile.TemporaryDirectory() as cwd:
+            result = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+import gym
+import numpy as np
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import check_obs_mode
+from PokerEngine.deck import Deck
+from PokerEngine.open_face import BoardState, Engine
+from PokerEngine.render import RENDER_MODES, check_render_every, render_board
+
+
+class OpenFaceEnv(gym.Env):
+    """Open Face environment for any `PokerEngine.open_face.GameConfig`
+
+    The generalization of OpenFaceSimpleEnv to any number of rows. Each card is placed in one of the rows,
+    front to back, so the action space is Discrete(n_rows). The observation layout and the rewards follow the
+    config, see `PokerEngine.open_face`. The default config='ofc' is 13 card Open Face Chinese: a front row of
+    three cards and middle and back rows of five, a foul when a row beats the row behind it and the standard
+    royalties for a board without a foul. config='simple' plays the rules of OpenFaceSimpleEnv.
+
+    obs_mode selects the same observation encodings as OpenFaceSimpleEnv, with a slot per card of the board:
+        'bits'      32 bits per slot and for the card to be placed, then the step counter, MultiBinary(452)
+        'index'     the card index of every slot (52 when empty), the card to be placed and the step, Box(15)
+        'onehot'    a 52 wide vector of the cards in each row and one for the card to be placed, Box(208)
+
+    With info_features=True the info dict of each step holds the hand features of every row under 'rows'.
+    Passing a `PokerEngine.profiling.Profiler` as profiler times each of the PROFILED_PHASES. obs_buffer and
+    readonly_obs work as in OpenFaceSimpleEnv, see `PokerEngine.buffers`, and so do render and render_every.
+    """
+
+    PROFILED_PHASES = ('step', 'reset', '_place', '_draw', '_get_reward', '_get_obs')
+
+    def __init__(self, config='ofc', obs_mode='bits', profiler=None, info_features=False, obs_buffer=None,
+                 readonly_obs=False, render_every=1):
+        check_obs_mode(obs_mode)
+        self.readonly_obs = readonly_obs
+        self.engine = Engine(config)
+        self.config = self.engine.config
+        self.obs_mode = obs_mode
+        self.info_features = info_features
+        if profiler is not None:
+            profiler.instrument(self, self.PROFILED_PHASES)
+        self.deck = Deck()
+        self.reward_range = self.config.reward_range
+        self.metadata = {'render_modes': list(RENDER_MODES)}
+        if obs_mode == 'index':
+            self.observation_space = gym.spaces.Box(low=0, high=self.engine.index_high, dtype=np.uint8)
+        elif obs_mode == 'onehot':
+            self.observation_space = gym.spaces.Box(low=0, high=1, shape=(self.config.onehot_size,), dtype=np.uint8)
+        else:
+            self.observation_space = gym.spaces.MultiBinary(self.engine.obs_size)
+        self.action_space = gym.spaces.Discrete(self.engine.n_rows)
+        self.obs_buffer = None
+        self.set_obs_buffer(obs_buffer)
+        self.done = False
+        self.state = None
+        self.render_every = check_render_every(render_every)
+        # episodes started, counted from 0 by the reset below
+        self.episodes = -1
+        self.reset()
+
+    @property
+    def obs(self):
+        return self._get_obs()
+
+    def _get_obs(self):
+        out = self.obs_buffer
+        if self.obs_mode == 'index':
+            obs = self.state.to_indices(out)
+        elif self.obs_mode == 'onehot':
+            obs = self.state.to_onehot(out)
+        else:
+            obs = self.state.to_observation(out)
+        return readonly(obs) if self.readonly_obs else obs
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the following observations into buffer in place, or into new arrays if None"""
+        buffer = check_obs_buffer(buffer, self.observation_space.shape)
+        self.obs_buffer = buffer
+
+    def _draw(self):
+        return self.deck.draw()
+
+    def _place(self, action):
+        return self.state.place(action)
+
+    def seed(self, seed=None):
+        """Seeds the deck, the game after the next `reset` is then reproducible"""
+        self.observation_space.seed(seed)
+        return self.deck.seed(seed)
+
+    def reset(self):
+        self.deck.shuffle()
+        self.episodes += 1
+        self.state = BoardState(self.engine, self._draw())
+        self.done = False
+        return self._get_obs()
+
+    def _get_reward(self):
+        return self.state.score() if self.done else 0
+
+    def play(self, action):
+        """Advances the game like `step`, without building the observation
+
+        :returns reward, done
+        """
+        if not self._place(action):
+            self.done = True
+            return self.config.full_row_reward, self.done
+        if self.state.is_over:
+            self.done = True
+        self.state.card = self._draw()
+        return self._get_reward(), self.done
+
+    def step(self, action):
+        """Places the player card in the first open slot of row `action`, placing it in a full row ends the game
+        with full_row_reward"""
+        reward, done = self.play(action)
+        info = {'rows': self.state.features()} if self.info_features else {}
+        return self._get_obs(), reward, done, info
+
+    def render(self, mode='human'):
+        """'human' prints the board, 'ansi' returns it as text and 'rgb_array' as an image, see
+        `PokerEngine.render`. Returns None without rendering in the episodes skipped by render_every"""
+        if self.episodes % self.render_every:
+            return None
+        return render_board(self.state.rows(), self.state.card, self.state.step, mode)
@@ -1,91 +1,58 @@
-from itertools import chain
 import gym
 import numpy as np
-import treys
 from gym.spaces import MultiBinary
+from PokerEngine import ofc
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import BIT_WEIGHTS, check_obs_mode, encode_ints
+from PokerEngine.deck import Deck
+from PokerEngine.render import RENDER_MODES, check_render_every, render_board
 
 
 def convert_card_to_bitlist(card):
-    # requires f strings
-    return [int(b) for b in "{:032b}".format(card)]
+    return encode_ints([card]).tolist()
+
 
 def convert_bitlist_to_int(bitlist):
-    output = 0
-    for bit in bitlist:
-        output = output * 2 + bit
-    return output
+    return int(np.dot(bitlist, BIT_WEIGHTS[-len(bitlist):]))
 
 
 class OFCSObservationSpace(gym.spaces.MultiBinary):
     """Mulitbinary observation space for the OFC Game
     This class implements sample specific to OFC
+
+    Samples are random positions still in play: between 0 and 9 placed cards split over the two rows, and the
+    card to be placed, all dealt from a fresh shuffle for every board.
     """
 
-    def __init__(self, n):
+    def __init__(self, n, seed=None):
         self.n = n
         self.shape = (n,)
-        self.deck = treys.Deck()
+        self.rng = np.random.default_rng(seed)
         super(MultiBinary, self).__init__((self.n,), np.int8)
 
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed]
+
     def sample(self):
         """We need to return 356 bit vector
         320 bits for the board
         32 bits for the player card
         4 bits for the game stage
         """
-        # generate a random board with a random number of cards
-        # first we need to get the number of cards for each row
-        # enforce that we never sample a full board
-        flip = np.random.choice(2)
-        if flip:
-            front_cards_num = np.random.choice(5)  # pick up to 4 cards
-            back_cards_num = np.random.choice(6)  # pick up to 5 cards
-        else:
-            front_cards_num = np.random.choice(6)  # pick up to 5 cards
-            back_cards_num = np.random.choice(5)  # pick up to 4 cards
-
-        blank_front_cards = 5 - front_cards_num
-        blank_back_cards = 5 - back_cards_num
-
-        # first we need to get the front card bits
-        # notice we need to add a variable number of zeroes depending on how many blanks we have
-        if front_cards_num > 0:
-            if front_cards_num == 1:
-                f_draw = [self.deck.draw(front_cards_num)]
-            else:
-                f_draw = self.deck.draw(front_cards_num)
-            card_bits = [convert_card_to_bitlist(card) for card in f_draw]
-            f_card_bits = np.array(list(chain(*card_bits)), dtype='int')
-            f_extra_bits = blank_front_cards * 32
-            front_bits = np.pad(f_card_bits, (0, f_extra_bits), 'constant')
-        else:
-            front_bits = np.zeros(160, dtype='int')
-
-        # and now we do the back bits
-        if back_cards_num > 0:
-            if back_cards_num == 1:
-                b_draw = [self.deck.draw(back_cards_num)]
-            else:
-                b_draw = self.deck.draw(back_cards_num)
-            card_bits = [convert_card_to_bitlist(card) for card in b_draw]
-            b_card_bits = np.array(list(chain(*card_bits)), dtype='int')
-            b_extra_bits = blank_back_cards * 32
-            back_bits = np.pad(b_card_bits, (0, b_extra_bits), 'constant')
-        else:
-            back_bits = np.zeros(160, dtype='int')
+        return self.sample_batch(1)[0]
 
-        # now we can do the bits for the observation card
-        player_card = convert_card_to_bitlist(self.deck.draw(1))
+    def sample_batch(self, n, out=None):
+        """Samples n observations in one pass
 
-        # and finally we can get the game state
-        # notice that the game state cannot exceed 8
-        # a game state of 0 means there are 0 cards played, whereas 9 means all but one cards are set
-        # a game state of 10 ends the episode
-        game_state = convert_card_to_bitlist(back_cards_num + front_cards_num)[-4:]
-        # print([front_bits, back_bits, game_state])
-        # now we can concatenate all of these
-
-        return np.concatenate([front_bits, back_bits, player_card, game_state])
+        :param n: int               number of observations
+        :param out: np.array        optional (n, 356) array to write into
+        :returns observations: np.array     (n, 356) uint8 bits
+        """
+        boards, _, cards, steps = ofc.sample_states(self.rng, n)
+        if out is None:
+            out = np.empty((n, self.n), dtype=np.uint8)
+        return ofc.encode_observations(boards, cards, steps, out=out)
 
 
 class OpenFaceSimpleEnv(gym.Env):
@@ -112,49 +79,141 @@ class OpenFaceSimpleEnv(gym.Env):
 
     For gym, this is MultiBinary(356)
 
+    Passing obs_mode='index' or obs_mode='onehot' (e.g. through `gym.make` kwargs) switches to a compact uint8
+    observation instead:
+        'index'     the card index of the 10 slots (52 when empty), the card to be placed and the step, Box(12)
+        'onehot'    a 52 wide vector of the cards in each row and one for the card to be placed, Box(156)
+
     The action space is Discrete(2). For each step, the agent must decide to play in row 0 or row 1.
+
+    With info_features=True the info dict of each step holds the hand features of both rows under 'rows': the
+    number of cards, whether the row is full, the best made hand category so far and the largest suit and rank
+    counts, see `PokerEngine.ofc.RowStrength`.
+
+    Passing a `PokerEngine.profiling.Profiler` as profiler times each of the PROFILED_PHASES.
+
+    Observations are new arrays unless an obs_buffer is passed, or set with `set_obs_buffer`, which every
+    observation is then written into in place. readonly_obs=True returns read-only observations, see
+    `PokerEngine.buffers`.
+
+    render(mode) prints the board ('human'), or returns it as text ('ansi') or as an RGB image ('rgb_array'), drawn
+    from glyphs cached per card, see `PokerEngine.render`. With render_every=k only every k-th episode is rendered,
+    render returns None in the others, so games of long runs can be watched without slowing them down.
     """
 
-    def __init__(self):
-        self.deck = treys.Deck()
-        self.evaluator = treys.Evaluator()
+    PROFILED_PHASES = ('step', 'reset', '_place', '_draw', '_get_reward', '_get_obs')
+
+    def __init__(self, obs_mode='bits', profiler=None, info_features=False, obs_buffer=None, readonly_obs=False,
+                 render_every=1):
+        check_obs_mode(obs_mode)
+        self.obs_mode = obs_mode
+        self.readonly_obs = readonly_obs
+        self.info_features = info_features
+        if profiler is not None:
+            profiler.instrument(self, self.PROFILED_PHASES)
+        self.deck = Deck()
         self.reward_range = (-1, 1)  # we will process the reward to fit in [-1,1] from [-10,10]
-        self.metadata = {'render_modes': ['ansi']}
-        self.observation_space = OFCSObservationSpace(356)
+        self.metadata = {'render_modes': list(RENDER_MODES)}
+        self.observation_space = self._make_observation_space()
         self.action_space = gym.spaces.Discrete(2)
+        self.obs_buffer = None
+        self.set_obs_buffer(obs_buffer)
         self.done = False
-        self.obs = self.reset()
+        self.state = None
+        self.render_every = check_render_every(render_every)
+        # episodes started, counted from 0 by the reset below
+        self.episodes = -1
+        self.reset()
+
+    def _make_observation_space(self):
+        if self.obs_mode == 'index':
+            return gym.spaces.Box(low=0, high=ofc.INDEX_HIGH, dtype=np.uint8)
+        if self.obs_mode == 'onehot':
+            return gym.spaces.Box(low=0, high=1, shape=(ofc.ONEHOT_SIZE,), dtype=np.uint8)
+        return OFCSObservationSpace(356)
+
+    @property
+    def obs(self):
+        """The observation in the env's obs_mode, built from the integer game state on demand"""
+        return self._get_obs()
+
+    def _get_obs(self):
+        out = self.obs_buffer
+        if self.obs_mode == 'index':
+            obs = self.state.to_indices(out)
+        elif self.obs_mode == 'onehot':
+            obs = self.state.to_onehot(out)
+        else:
+            obs = self.state.to_observation(out)
+        return readonly(obs) if self.readonly_obs else obs
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the following observations into buffer in place, or into new arrays if None"""
+        buffer = check_obs_buffer(buffer, self.observation_space.shape)
+        self.obs_buffer = buffer
+
+    @obs.setter
+    def obs(self, observation):
+        self.state = self._decode(observation)
+
+    def _decode(self, observation):
+        if self.obs_mode == 'index':
+            return ofc.GameState.from_indices(observation)
+        if self.obs_mode == 'onehot':
+            return ofc.GameState.from_onehot(observation)
+        return ofc.GameState.from_observation(observation)
+
+    def _draw(self):
+        return self.deck.draw()
+
+    def _place(self, action):
+        return self.state.place(action)
+
+    def seed(self, seed=None):
+        """Seeds the deck, the game after the next `reset` is then reproducible"""
+        self.observation_space.seed(seed)
+        return self.deck.seed(seed)
 
     def reset(self):
         """Returns a new observation and resets the env"""
-        self.deck = treys.Deck()
-        # create a new starting observation
-        obs = np.concatenate(
-            [np.zeros(320, dtype='int'), np.array(convert_card_to_bitlist(self.deck.draw(1)), dtype='int')])
-        obs = np.concatenate([obs, [0, 0, 0, 0]])  # add 4 bits of 0 for the game state
-        self.obs = obs
+        self.deck.shuffle()
+        self.episodes += 1
+        self.state = ofc.GameState(self._draw())
         self.done = False
-        return obs
+        return self._get_obs()
 
-    def _get_reward(self, observation):
+    def _get_reward(self, observation=None):
         """Checks if all cards have been placed and returns a positive reward if the front evaluation is 'higher'
         than the back evaluation, and returns a negative reward otherwise. If the game is not over, return 0"""
         if self.done:
-            # now get the card ints from the binary data for evaluation
-            front = [convert_bitlist_to_int(card) for card in [observation[32 * j:32 * (j + 1)] for j in range(0, 5)]]
-            back = [convert_bitlist_to_int(card) for card in [observation[32 * j:32 * (j + 1)] for j in range(5, 10)]]
-            # if 0 not in front and 0 not in back
-            front_eval = self.evaluator._five(front)
-            back_eval = self.evaluator._five(back)
-            return 2 if front_eval > back_eval else -1
+            state = self.state if observation is None else self._decode(observation)
+            return state.score()
 
         # return 0 as the agent is playing
         else:
             return 0
 
+    def play(self, action):
+        """Advances the game like `step`, without building the observation
+
+        :int action: binary value for action
+
+        :returns reward, done
+        """
+        if not self._place(action):
+            # the row is already full, the game is over and the agent will need to reset the game
+            self.done = True
+            return ofc.FULL_ROW_REWARD, self.done
+
+        # we have placed a valid card for the step, so now we can get a new card
+        if self.state.is_over:
+            self.done = True
+        self.state.card = self._draw()
+        return self._get_reward(), self.done
+
     def step(self, action):
         """The action space is Discrete(2) meaning only the values of `0` and `1` are valid.
-        This action will set the bits representing the player card in the correct row and position on the board
+        This action will place the player card in the first open slot of the chosen row
 
         If the board row is already full,
         then attempting to place a card there will end the episode
@@ -162,77 +221,13 @@ class OpenFaceSimpleEnv(gym.Env):
 
         :int action: binary value for action
         """
-
-        if action == 1:
-            # action == 1 points to the back row, which is the five cards, each 32 bits, after the first 160 bits
-            back_row = self.obs[160:320]
-            # then we chunk the array into 32 bit segments which represent a card
-            card_chunks = np.split(back_row, 5)
-            # we're interested in finding the first occurrence of an empty spot for the player's card
-            # the below returns an array with the index positions of all the board positions
-            empty_card_indices = np.where(np.array([sum(i) for i in card_chunks], dtype='int') == 0)[0]
-
-            if empty_card_indices.size > 0:  # if this array has any elements,
-                idx = empty_card_indices[0]
-                # now we know the index position of the first empty board position for the card so we can set a card
-                id_1 = 32 * (idx + 5)
-                id_2 = 32 * (idx + 6)
-                # player_card = self.obs[320:352]
-                self.obs[id_1: id_2] = self.obs[320:352]
-
-            # else (the action was 1 but we cannot find an empty board position), the game is over
-            # we return a negative reward and the agent will need to reset the game
-            else:
-                self.done = True
-                return self.obs, -10, self.done, {}
-
-        # this is the case for the front row, similar to the above
-        else:
-            # the first 5 cards are stored as the first 160 bits
-            front_row = self.obs[0:160]
-            card_chunks = np.split(front_row, 5)
-            empty_card_indices = np.where(np.array([sum(i) for i in card_chunks], dtype='int') == 0)[0]
-            if empty_card_indices.size > 0:
-                # now we'll find the index positions in the observation array and set the player card there
-                idx = empty_card_indices[0]
-                id_1 = 32 * idx
-                id_2 = 32 * (idx + 1)
-                # player_card = self.obs[320:352]
-                self.obs[id_1: id_2] = self.obs[320:352]
-            else:
-                # end the game and return a negative reward if we try to play a card in a full row
-                self.done = True
-                return self.obs, -10, self.done, {}
-
-        # if we have made it to this point, it means we have placed a valid card for the step
-        # then we can increment the step and get a new card
-        # first we get the step
-        step = convert_bitlist_to_int(self.obs[-4:])
-        step += 1
-        step_bin = [int(b) for b in "{:04b}".format(step)]
-        self.obs[-4:] = step_bin
-
-        if step == 10:
-            self.done = True
-
-        # now set a new player card
-        player_card = self.deck.draw(1)
-        card_bits = convert_card_to_bitlist(player_card)
-        self.obs[320:352] = card_bits
-
-        # get the reward and return
-        return self.obs, self._get_reward(self.obs), self.done, {}
-
-    def render(self, mode='ansi'):
-        print('-----------')
-        print("Step: {}".format(convert_bitlist_to_int(self.obs[-4:])))
-        print("Player card")
-        print(treys.Card.int_to_pretty_str(convert_bitlist_to_int(self.obs[320:352])))
-        print("Board")
-        front = [convert_bitlist_to_int(card) for card in [self.obs[32 * j:32 * (j + 1)] for j in range(0, 5)]]
-        back = [convert_bitlist_to_int(card) for card in [self.obs[32 * j:32 * (j + 1)] for j in range(5, 10)]]
-        print(front)
-        print(back)
-        print(*[treys.Card.int_to_pretty_str(i) if i != 0 else "__" for i in front])
-        print(*[treys.Card.int_to_pretty_str(i) if i != 0 else "__" for i in back])
-        print('-----------')
+        reward, done = self.play(action)
+        info = {'rows': self.state.features()} if self.info_features else {}
+        return self._get_obs(), reward, done, info
+
+    def render(self, mode='human'):
+        """'human' prints the board, 'ansi' returns it as text and 'rgb_array' as an image, see
+        `PokerEngine.render`. Returns None without rendering in the episodes skipped by render_every"""
+        if self.episodes % self.render_every:
+            return None
+        return render_board(self.state.rows(), self.state.card, self.state.step, mode)
@@ -1,3 +1,4 @@
 from OpenFaceSimpleEnv.envs.OpenFaceSimpleEnv import OpenFaceSimpleEnv
-
-OpenFaceSimpleEnv()
+from OpenFaceSimpleEnv.envs.OpenFaceEnv import OpenFaceEnv
+from OpenFaceSimpleEnv.envs.vec_env import VecOpenFaceEnv, VecOpenFaceSimpleEnv
+from OpenFaceSimpleEnv.envs.feature_processor import FeatureObservation, VecFeatureObservation
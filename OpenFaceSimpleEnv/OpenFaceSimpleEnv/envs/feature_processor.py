@@ -1,9 +1,228 @@
+"""Hand features appended to the observations of the simple Open Face game
+
+`observation_processor` decodes the card indices of the two rows and of the card to be placed from an
+observation, or an (N, ...) batch of them, and appends FEATURE_SIZE uint8 features computed from lookup tables
+over the card indices, with no Python loop over cards or games:
+
+    per row, front then back (25 each)
+        rank histogram      13  cards of each rank, deuce to ace
+        suit histogram      4   cards of each suit
+        cards               1   cards in the row
+        pairs, trips, quads 3   ranks held exactly 2, 3 and 4 times
+        max suit            1   cards of the row's most common suit
+        flush draw          1   all the row's cards share a suit, so a flush is still possible
+        straight cards      1   most distinct ranks of the row inside one straight, the wheel included
+        straight draw       1   all the row's cards fit in one straight, so a straight is still possible
+    between the rows (17)
+        rank xor            13  ranks held in exactly one of the rows
+        suit xor            4   suits held in exactly one of the rows
+    card to be placed (4)
+        rank count          2   cards of its rank in the front and in the back row
+        suit count          2   cards of its suit in the front and in the back row
+
+`FeatureObservation` applies it to a gym env and `VecFeatureObservation` to a vec env, in any obs_mode:
+
+    env = FeatureObservation(gym.make('OpenFaceSimpleEnv-v1'))     # MultiBinary(356) -> Box(427)
+"""
+import gym
 import numpy as np
-def observation_processor(observation):
-    """Augments the observation space to encode logical XOR
+from PokerEngine.cards import EMPTY, N_CARDS, RANKS, SUITS, check_obs_mode, decode
+from PokerEngine.ofc import INDEX_HIGH, INDEX_SIZE, N_ROWS, N_SLOTS, OBS_SIZE, ONEHOT_SIZE, PLAYER_CARD, ROW_SIZE
+
+try:
+    from stable_baselines.common.vec_env import VecEnv
+except ImportError:  # stable-baselines is only needed for training
+    VecEnv = object
+
+N_RANKS = 13
+N_SUITS = 4
+OBS_SIZES = {'bits': OBS_SIZE, 'index': INDEX_SIZE, 'onehot': ONEHOT_SIZE}
+
+# RANK_OF[c] and SUIT_OF[c] are the rank and suit of card index c, EMPTY gets a bin of its own after them
+RANK_OF = np.append(RANKS, N_RANKS)
+SUIT_OF = np.append(SUITS, N_SUITS)
+RANK_BITS = 1 << np.arange(N_RANKS)
+
+# the 13 bit rank masks of the ten straights, the wheel A2345 first
+STRAIGHT_MASKS = np.array([0b1000000001111] + [0b11111 << low for low in range(N_RANKS - 4)])
+_RANK_MASKS = np.arange(1 << N_RANKS)
+_POPCOUNT = ((_RANK_MASKS[:, None] >> np.arange(N_RANKS)) & 1).sum(axis=1)
+# STRAIGHT_CARDS[mask] is the most ranks of a 13 bit rank mask inside any one straight
+STRAIGHT_CARDS = _POPCOUNT[_RANK_MASKS[:, None] & STRAIGHT_MASKS].max(axis=1).astype(np.uint8)
+
+ROW_FEATURES = N_RANKS + N_SUITS + 8
+FEATURE_SIZE = N_ROWS * ROW_FEATURES + N_RANKS + N_SUITS + 2 * N_ROWS  # 71
+_ROW_HIGH = [4] * N_RANKS + [ROW_SIZE] * N_SUITS + [ROW_SIZE, 2, 1, 1, ROW_SIZE, 1, ROW_SIZE, 1]
+FEATURE_HIGH = np.array(_ROW_HIGH * N_ROWS + [1] * (N_RANKS + N_SUITS) + [3] * N_ROWS + [ROW_SIZE] * N_ROWS,
+                        dtype=np.uint8)
+
+
+def card_indices(observation, obs_mode='bits'):
+    """Card indices of the board slots and of the card to be placed
+
+    :param observation: np.array    (..., size) observations in obs_mode
+    :param obs_mode: str            one of `PokerEngine.cards.OBS_MODES`
+
+    :returns boards, cards: np.array    (..., 10) slot indices, EMPTY for open slots, and (...,) card indices.
+                                        'onehot' observations hold no slot order, their rows are in card order
+    """
+    if obs_mode == 'index':
+        return observation[..., :N_SLOTS].astype(np.intp), observation[..., N_SLOTS].astype(np.intp)
+    if obs_mode == 'onehot':
+        rows = observation.reshape(observation.shape[:-1] + (N_ROWS + 1, N_CARDS)).astype(bool)
+        # the held cards of each row first, in card order
+        order = np.argsort(~rows, axis=-1, kind='stable')[..., :ROW_SIZE]
+        cards = np.where(np.take_along_axis(rows, order, axis=-1), order, EMPTY)
+        return cards[..., :N_ROWS, :].reshape(observation.shape[:-1] + (N_SLOTS,)), cards[..., N_ROWS, 0]
+    cards = decode(observation[..., :PLAYER_CARD.stop])
+    return cards[..., :N_SLOTS], cards[..., N_SLOTS]
+
+
+def _histograms(values, n_bins):
+    """Counts of each of n_bins values along the last axis, one bincount over the whole batch"""
+    n = values.size // values.shape[-1]
+    keys = values.reshape(n, -1) + n_bins * np.arange(n)[:, None]
+    counts = np.bincount(keys.ravel(), minlength=n * n_bins).astype(np.uint8)
+    return counts.reshape(values.shape[:-1] + (n_bins,))
+
+
+def board_features(boards, cards, out=None):
+    """The FEATURE_SIZE features of boards and the cards to be placed, see the module docstring
+
+    :param boards: np.array     (..., 10) card indices, EMPTY for open slots
+    :param cards: np.array      (...,) card indices of the cards to be placed
+    :param out: np.array        optional (..., FEATURE_SIZE) array to write into
+
+    :returns features: np.array (..., FEATURE_SIZE) uint8
+    """
+    batch_shape = boards.shape[:-1]
+    rows = boards.reshape(batch_shape + (N_ROWS, ROW_SIZE))
+    rank_counts = _histograms(RANK_OF[rows], N_RANKS + 1)
+    suit_counts = _histograms(SUIT_OF[rows], N_SUITS + 1)
+    # the EMPTY bins are zeroed, so that looking up an EMPTY card counts nothing
+    rank_counts[..., N_RANKS] = suit_counts[..., N_SUITS] = 0
+    rank_hist = rank_counts[..., :N_RANKS]
+    suit_hist = suit_counts[..., :N_SUITS]
+    n_cards = (rows != EMPTY).sum(axis=-1, dtype=np.uint8)
+    max_suit = suit_hist.max(axis=-1)
+    ranks_held = rank_hist > 0
+    straight_cards = STRAIGHT_CARDS[ranks_held @ RANK_BITS]
+    # ranks held exactly 2, 3 and 4 times
+    sets = _histograms(rank_hist, 5)[..., 2:]
+    draws = np.stack([max_suit, max_suit == n_cards, straight_cards, straight_cards == n_cards], axis=-1)
+    per_row = np.concatenate([rank_hist, suit_hist, n_cards[..., None], sets, draws.astype(np.uint8)], axis=-1)
+    card_ranks = np.broadcast_to(RANK_OF[cards][..., None, None], batch_shape + (N_ROWS, 1))
+    card_suits = np.broadcast_to(SUIT_OF[cards][..., None, None], batch_shape + (N_ROWS, 1))
+
+    if out is None:
+        out = np.empty(batch_shape + (FEATURE_SIZE,), dtype=np.uint8)
+    end = N_ROWS * ROW_FEATURES
+    out[..., :end] = per_row.reshape(batch_shape + (end,))
+    out[..., end:end + N_RANKS] = ranks_held[..., 0, :] ^ ranks_held[..., 1, :]
+    end += N_RANKS
+    out[..., end:end + N_SUITS] = (suit_hist[..., 0, :] > 0) ^ (suit_hist[..., 1, :] > 0)
+    end += N_SUITS
+    out[..., end:end + N_ROWS] = np.take_along_axis(rank_counts, card_ranks, axis=-1)[..., 0]
+    out[..., end + N_ROWS:] = np.take_along_axis(suit_counts, card_suits, axis=-1)[..., 0]
+    return out
+
+
+def observation_processor(observation, obs_mode='bits'):
+    """Augments observations with the hand features of their boards
 
-    :param observation: np.array        this is the observation from the environment, should be a 356 binary vector
+    :param observation: np.array        one observation or an (N, size) batch in obs_mode, e.g. the 356 bits
+    :param obs_mode: str                one of `PokerEngine.cards.OBS_MODES`
 
-    :returns augmented_obs: np.array    the augmented observation with 64 additional bits, 420 bit vector
+    :returns augmented_obs: np.array    uint8 observations with FEATURE_SIZE more columns, e.g. 427 for bits
     """
-    raise NotImplemented
+    check_obs_mode(obs_mode)
+    observation = np.asarray(observation)
+    size = OBS_SIZES[obs_mode]
+    if observation.shape[-1] != size:
+        raise ValueError(f"{obs_mode} observations have {size} values, got shape {observation.shape}")
+    augmented = np.empty(observation.shape[:-1] + (size + FEATURE_SIZE,), dtype=np.uint8)
+    augmented[..., :size] = observation
+    board_features(*card_indices(observation, obs_mode), out=augmented[..., size:])
+    return augmented
+
+
+def feature_space(obs_mode='bits'):
+    """The observation space of augmented observations in obs_mode"""
+    check_obs_mode(obs_mode)
+    if obs_mode == 'index':
+        high = INDEX_HIGH
+    else:
+        high = np.ones(OBS_SIZES[obs_mode], dtype=np.uint8)
+    return gym.spaces.Box(low=0, high=np.concatenate([high, FEATURE_HIGH]), dtype=np.uint8)
+
+
+class FeatureObservation(gym.ObservationWrapper):
+    """Appends the hand features to the observations of an OpenFaceSimpleEnv
+
+    :param env: gym.Env     an OpenFaceSimpleEnv, or a wrapper of one
+    :param obs_mode: str    the env's obs_mode, read from the env by default
+    """
+
+    def __init__(self, env, obs_mode=None):
+        super().__init__(env)
+        self.obs_mode = obs_mode or getattr(env.unwrapped, 'obs_mode', 'bits')
+        self.observation_space = feature_space(self.obs_mode)
+
+    def observation(self, observation):
+        return observation_processor(observation, self.obs_mode)
+
+
+class VecFeatureObservation(VecEnv):
+    """Appends the hand features to the observations of a vec env of the simple game, a batch at a time
+
+    The observations in the 'terminal_observation' of the info dicts are augmented as well.
+
+    :param venv: VecEnv     e.g. a VecOpenFaceSimpleEnv
+    :param obs_mode: str    the vec env's obs_mode, read from it by default
+    """
+
+    def __init__(self, venv, obs_mode=None):
+        self.venv = venv
+        self.num_envs = venv.num_envs
+        self.obs_mode = obs_mode or getattr(venv, 'obs_mode', 'bits')
+        self.observation_space = feature_space(self.obs_mode)
+        self.action_space = venv.action_space
+        self.metadata = venv.metadata
+
+    def reset(self):
+        return observation_processor(self.venv.reset(), self.obs_mode)
+
+    def step_async(self, actions):
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        obs, rewards, dones, infos = self.venv.step_wait()
+        finished = [info for info in infos if 'terminal_observation' in info]
+        if finished:
+            terminal_obs = observation_processor(np.stack([info['terminal_observation'] for info in finished]),
+                                                 self.obs_mode)
+            for info, augmented in zip(finished, terminal_obs):
+                info['terminal_observation'] = augmented
+        return observation_processor(obs, self.obs_mode), rewards, dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seed=None):
+        return self.venv.seed(seed)
+
+    def close(self):
+        self.venv.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return self.venv.get_attr(attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        return self.venv.set_attr(attr_name, value, indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self.venv.env_method(method_name, *method_args, indices=indices, **method_kwargs)
+
+    def get_images(self, *args, **kwargs):
+        return self.venv.get_images(*args, **kwargs)
@@ -0,0 +1,186 @@
+import gym
+import numpy as np
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import BIT_TABLE, check_obs_mode
+from PokerEngine.open_face import SIMPLE, Engine
+from PokerEngine.deck import DeckBatch
+from PokerEngine.render import RENDER_MODES, board_images, render_boards
+
+try:
+    from stable_baselines.common.vec_env import VecEnv
+except ImportError:  # stable-baselines is only needed for training
+    VecEnv = object
+
+
+class VecOpenFaceEnv(VecEnv):
+    """N Open Face games of any `PokerEngine.open_face.GameConfig` stepped together as NumPy arrays
+
+    Keeps every game in one (N, obs_size) array and advances all of them with a single `step(actions)` call.
+    Each game draws from its own shuffled deck of card indices, so the next card is a lookup at the step counter
+    instead of a `treys.Deck` draw. The action picks a row, front to back, and the observation layout and the
+    rewards follow the config, e.g. config='ofc' for 13 card Open Face Chinese with fouls and royalties.
+
+    Finished games are reset automatically, as stable-baselines expects of a VecEnv. The last observation of a
+    finished game is returned in its info dict under 'terminal_observation'.
+
+    obs_mode selects the same observation encodings as OpenFaceSimpleEnv. Observations are new arrays unless an
+    (N, ...) obs_buffer is passed or set with `set_obs_buffer`, readonly_obs=True returns read-only views, see
+    `PokerEngine.buffers`. In 'bits' mode a buffer of the observation dtype becomes the env's own observation
+    array, so steps write into it without any copy.
+
+    render draws the boards of all games, or of the games at indices, into one grid in any of the render modes of
+    `PokerEngine.render`.
+    """
+
+    def __init__(self, num_envs, config='ofc', seed=None, obs_mode='bits', obs_buffer=None, readonly_obs=False):
+        check_obs_mode(obs_mode)
+        self.readonly_obs = readonly_obs
+        self.engine = engine = Engine(config)
+        self.config = engine.config
+        self.num_envs = num_envs
+        self.obs_mode = obs_mode
+        if obs_mode == 'index':
+            self.observation_space = gym.spaces.Box(low=0, high=engine.index_high, dtype=np.uint8)
+        elif obs_mode == 'onehot':
+            self.observation_space = gym.spaces.Box(low=0, high=1, shape=(self.config.onehot_size,), dtype=np.uint8)
+        else:
+            self.observation_space = gym.spaces.MultiBinary(engine.obs_size)
+        self.action_space = gym.spaces.Discrete(engine.n_rows)
+        self.reward_range = self.config.reward_range
+        self.metadata = {'render_modes': list(RENDER_MODES)}
+
+        self.obs = np.zeros((num_envs, engine.obs_size), dtype=np.int8)
+        self.boards = engine.empty_boards(num_envs)
+        self.counts = np.zeros((num_envs, engine.n_rows), dtype=np.int8)
+        self.steps = np.zeros(num_envs, dtype=np.int8)
+        self.deck = DeckBatch(num_envs, seed)
+        self.decks = self.deck.cards
+        self._games = np.arange(num_envs)
+        self._actions = None
+        self.obs_buffer = None
+        self.set_obs_buffer(obs_buffer)
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the observations of the following steps into buffer in place, or into new arrays if None"""
+        shape = (self.num_envs,) + self.observation_space.shape
+        buffer = check_obs_buffer(buffer, shape)
+        if self.obs is self.obs_buffer:
+            # stop writing into the previous buffer
+            self.obs = self.obs.copy()
+        if self.obs_mode == 'bits' and buffer is not None and buffer.dtype == self.obs.dtype:
+            buffer[...] = self.obs
+            self.obs = buffer
+        self.obs_buffer = buffer
+
+    def _reset_games(self, games):
+        engine = self.engine
+        self.boards[games] = engine.empty_boards(len(games))
+        self.counts[games] = 0
+        self.steps[games] = 0
+        self.deck.shuffle(games)
+        if self.obs_mode == 'bits':
+            self.obs[games] = engine.encode_observations(self.boards[games], self.decks[games, 0], self.steps[games])
+
+    def _observe(self, games):
+        if self.obs_mode == 'bits':
+            return self.obs[games]
+        steps = self.steps[games]
+        return self.engine.observations(self.obs_mode, self.boards[games], self.decks[games, steps], steps)
+
+    def _output(self):
+        """The observations of all games, in the obs buffer when one is set"""
+        if self.obs is self.obs_buffer:
+            obs = self.obs
+        else:
+            obs = self._observe(self._games)
+            if self.obs_buffer is not None:
+                self.obs_buffer[...] = obs
+                obs = self.obs_buffer
+        return readonly(obs) if self.readonly_obs else obs
+
+    def reset(self):
+        self._reset_games(self._games)
+        return self._output()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.intp).reshape(self.num_envs)
+
+    def step_wait(self):
+        engine = self.engine
+        actions = self._actions
+        cards = self.decks[self._games, self.steps]
+        placed, slots = engine.place_cards(self.boards, self.counts, actions, cards)
+
+        games = self._games[placed]
+        self.steps[games] += 1
+        if self.obs_mode == 'bits':
+            engine.encode_cards(self.obs, games, slots, cards[placed])
+            self.obs[games, engine.step] = engine.step_table[self.steps[games]]
+            self.obs[games, engine.player_card] = BIT_TABLE[self.decks[games, self.steps[games]]]
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        rewards[~placed] = self.config.full_row_reward
+        finished = placed & (self.steps == engine.n_slots)
+        if finished.any():
+            rewards[finished] = engine.score_boards(self.boards[finished])
+        dones = ~placed | finished
+
+        infos = [{} for _ in range(self.num_envs)]
+        done_games = self._games[dones]
+        if done_games.size:
+            terminal_obs = self._observe(done_games)
+            for i, game in enumerate(done_games):
+                infos[game]['terminal_observation'] = terminal_obs[i]
+            self._reset_games(done_games)
+
+        return self._output(), rewards, dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seed=None):
+        self.deck.seed(seed)
+        return [seed] * self.num_envs
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise NotImplementedError(f"{type(self).__name__} does not hold individual env instances")
+
+    def get_images(self, *args, **kwargs):
+        """An RGB image of the board of every game, see `PokerEngine.render`"""
+        return list(board_images(self.boards, self.decks[self._games, self.steps], self.config.row_sizes))
+
+    def render(self, mode='human', indices=None, columns=8):
+        """Renders the boards of the games at indices, all by default, into one text or image grid"""
+        games = np.asarray(self._get_indices(indices))
+        steps = self.steps[games]
+        return render_boards(self.boards[games], self.decks[games, steps], steps, self.config.row_sizes, mode,
+                             columns)
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
+
+
+class VecOpenFaceSimpleEnv(VecOpenFaceEnv):
+    """N games of OpenFaceSimpleEnv stepped together as NumPy arrays
+
+    The two row `PokerEngine.open_face.SIMPLE` config of VecOpenFaceEnv, with the rules and observation layout
+    of OpenFaceSimpleEnv.
+    """
+
+    def __init__(self, num_envs, seed=None, obs_mode='bits', obs_buffer=None, readonly_obs=False):
+        super().__init__(num_envs, SIMPLE, seed, obs_mode, obs_buffer, readonly_obs)
+        self.reward_range = (-1, 1)
@@ -2,5 +2,5 @@ from setuptools import setup
 
 setup(name='OpenFaceSimpleEnv',
       version='1.1',
-      install_requires=['gym', 'treys', 'numpy']
+      install_requires=['gym', 'treys', 'numpy', 'PokerEngine']
       )
@@ -0,0 +1,451 @@
+import tempfile
+import unittest
+import numpy as np
+import treys
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import CARD_INTS, BIT_TABLE, EMPTY, decode, decode_ints, encode
+from PokerEngine import ofc, open_face
+from PokerEngine.solver import Solver
+from PokerEngine.dataset import Dataset, generate
+from PokerEngine.deck import Deck, DeckBatch
+from PokerEngine.hands import HandDealer
+from PokerEngine.profiling import LatencyHistogram, Profiler
+from PokerEngine.render import BLANK, CARD_GLYPHS, TILES, board_images, image_grid, render_boards
+from PokerEngine.transposition import TranspositionCache, canonical_key, state_key
+from PokerEngine.trajectories import TrajectoryLog, TrajectoryWriter
+from PokerEngine.rollouts import estimate_action_values, iter_action_values
+from PokerEngine.evaluation import N_HANDS, cached_table, evaluate_batch, evaluate_five, evaluate_three, hand_index
+
+
+class CardsTestCase(unittest.TestCase):
+    def test_bit_table_matches_treys_ints(self):
+        for index in range(52):
+            bits = "".join(str(b) for b in BIT_TABLE[index])
+            assert int(bits, 2) == CARD_INTS[index]
+
+    def test_encode_decode_batch(self):
+        boards = np.random.default_rng(0).integers(0, 53, size=(64, 10))
+        bits = encode(boards)
+        assert bits.shape == (64, 320)
+        assert (decode(bits) == boards).all()
+        assert (decode_ints(bits) == CARD_INTS[boards]).all()
+
+    def test_empty_slot_is_zero_bits(self):
+        assert not encode([EMPTY]).any()
+        assert decode(np.zeros(32, dtype=np.uint8))[0] == EMPTY
+
+
+class DeckTestCase(unittest.TestCase):
+    def test_deals_every_card_once(self):
+        deck = Deck(seed=0)
+        cards = [deck.draw() for _ in range(2)] + deck.deal(50).tolist()
+        assert sorted(cards) == list(range(52)) and len(deck) == 0
+        with self.assertRaises(IndexError):
+            deck.draw()
+        deck.shuffle()
+        assert len(deck) == 52
+
+    def test_seeded_decks_repeat(self):
+        first, second = Deck(seed=1), Deck()
+        second.seed(1)
+        second.shuffle()
+        assert (first.deal(10) == second.deal(10)).all()
+
+    def test_batch_shuffle(self):
+        decks = DeckBatch(8, seed=2)
+        before = decks.cards.copy()
+        decks.shuffle(np.array([1, 5]))
+        changed = (decks.cards != before).any(axis=1)
+        assert changed.tolist() == [False, True, False, False, False, True, False, False]
+        assert (np.sort(decks.cards, axis=1) == np.arange(52)).all()
+
+
+class EvaluationTestCase(unittest.TestCase):
+    def test_evaluate_five_matches_treys(self):
+        evaluator = treys.Evaluator()
+        rng = np.random.default_rng(0)
+        hands = np.array([rng.choice(52, 5, replace=False) for _ in range(5000)])
+        expected = [evaluator._five([int(CARD_INTS[c]) for c in hand]) for hand in hands]
+        assert (evaluate_five(hands) == expected).all()
+
+    def test_evaluate_five_extremes(self):
+        indices = {int(card): index for index, card in enumerate(CARD_INTS[:52])}
+        royal_flush = [indices[treys.Card.new(c)] for c in ['As', 'Ks', 'Qs', 'Js', 'Ts']]
+        worst = [indices[treys.Card.new(c)] for c in ['7s', '5h', '4d', '3c', '2s']]
+        assert list(evaluate_five(np.array([royal_flush, worst]))) == [1, 7462]
+
+    def test_evaluate_batch_matches_treys(self):
+        evaluator = treys.Evaluator()
+        rng = np.random.default_rng(1)
+        hands = np.array([rng.choice(52, 5, replace=False) for _ in range(5000)])
+        ranks, rank_classes = evaluate_batch(hands)
+        for hand, rank, rank_class in zip(hands, ranks, rank_classes):
+            expected = evaluator._five([int(CARD_INTS[c]) for c in hand])
+            assert rank == expected
+            assert rank_class == evaluator.get_rank_class(expected)
+
+    def test_hand_index_is_order_independent(self):
+        hands = np.array([[0, 1, 2, 3, 4], [4, 3, 2, 1, 0], [47, 48, 49, 50, 51]])
+        assert list(hand_index(hands)) == [0, 0, N_HANDS - 1]
+
+    def test_cached_table_builds_once_per_version(self):
+        builds = []
+
+        def build():
+            builds.append(len(builds))
+            return np.arange(len(builds), dtype=np.int16)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = cached_table('test', build, 1, cache_dir)
+            again = cached_table('test', build, 1, cache_dir)
+            assert isinstance(again, np.memmap) and list(first) == list(again) == [0]
+            assert list(cached_table('test', build, 2, cache_dir)) == [0, 1] and len(builds) == 2
+
+
+def brute_force_values(state):
+    """Plain expectimax over GameState copies, without canonicalisation or memoisation"""
+    values = []
+    for action in (0, 1):
+        child = state.copy()
+        if not child.place(action):
+            values.append(ofc.FULL_ROW_REWARD)
+        elif child.is_over:
+            values.append(child.score())
+        else:
+            used = set(child.board)
+            deck = [c for c in range(52) if c not in used]
+            total = 0
+            for card in deck:
+                child.card = card
+                total += max(brute_force_values(child))
+            values.append(total / len(deck))
+    return values
+
+
+def make_state(placed, seed):
+    """A random position with `placed` cards dealt alternately to the front and back row"""
+    deck = np.random.default_rng(seed).permutation(52).tolist()
+    state = ofc.GameState(deck[0])
+    for i in range(placed):
+        state.place(i % 2)
+        state.card = deck[i + 1]
+    return state
+
+
+class RowStrengthTestCase(unittest.TestCase):
+    def test_full_rows_match_evaluate_batch(self):
+        rows = np.random.default_rng(0).permuted(np.tile(np.arange(52), (3000, 1)), axis=1)[:, :5]
+        ranks, rank_classes = evaluate_batch(rows)
+        for row, rank, rank_class in zip(rows.tolist(), ranks, rank_classes):
+            strength = ofc.RowStrength(row)
+            assert strength.full and strength.rank == rank and strength.rank_class == rank_class
+
+    def test_category_is_a_lower_bound(self):
+        rng = np.random.default_rng(1)
+        for _ in range(500):
+            row = rng.permutation(52)[:5].tolist()
+            strength = ofc.RowStrength(row[:3])
+            category = strength.category
+            strength.add(row[3])
+            assert strength.category <= category
+            strength.add(row[4])
+            assert strength.rank_class <= category
+
+    def test_game_score_matches_score_boards(self):
+        boards = np.random.default_rng(2).permuted(np.tile(np.arange(52), (500, 1)), axis=1)[:, :10]
+        expected = ofc.score_boards(boards)
+        for board, reward in zip(boards.tolist(), expected):
+            state = ofc.GameState(board[0])
+            for i, card in enumerate(board):
+                state.card = card
+                state.place(i // 5)
+            assert state.row_full(0) and state.row_full(1) and state.score() == reward
+            assert ofc.GameState(ofc.EMPTY, board, [5, 5], 10).score() == reward
+
+
+class BuffersTestCase(unittest.TestCase):
+    def test_readonly_view(self):
+        array = np.zeros(4)
+        view = readonly(array)
+        with self.assertRaises(ValueError):
+            view[0] = 1
+        array[0] = 1
+        assert view[0] == 1 and array.flags.writeable
+
+    def test_check_obs_buffer(self):
+        buffer = np.zeros((2, 12), dtype=np.uint8)
+        assert check_obs_buffer(buffer[0], (12,)) is not None and check_obs_buffer(None, (12,)) is None
+        for bad in (buffer, readonly(buffer[0])):
+            with self.assertRaises(ValueError):
+                check_obs_buffer(bad, (12,))
+        with self.assertRaises(TypeError):
+            check_obs_buffer([0] * 12, (12,))
+
+
+class HandDealerTestCase(unittest.TestCase):
+    def test_batches_are_ranked(self):
+        dealer = HandDealer(500, n_hands=2, obs_mode='index', sort=True, seed=0)
+        batch = dealer.next()
+        assert batch.cards.shape == (500, 10) and batch.ranks.shape == (500, 2)
+        assert (np.sort(batch.cards, axis=1)[:, 1:] != np.sort(batch.cards, axis=1)[:, :-1]).all()
+        assert (np.diff(CARD_INTS[batch.cards], axis=1) > 0).all()
+        ranks, rank_classes = evaluate_batch(batch.cards.reshape(1000, 5))
+        assert (batch.ranks.ravel() == ranks).all() and (batch.rank_classes.ravel() == rank_classes).all()
+        assert (batch.obs == batch.cards).all()
+        dealer.close()
+
+    def test_prefetch_deals_the_same_batches(self):
+        prefetching, on_demand = HandDealer(64, seed=3), HandDealer(64, seed=3, prefetch=False)
+        for _ in range(3):
+            assert (prefetching.next().obs == on_demand.next().obs).all()
+        prefetching.seed(5)
+        on_demand.seed(5)
+        assert (prefetching.next().cards == on_demand.next().cards).all()
+        prefetching.close()
+
+
+class OpenFaceTestCase(unittest.TestCase):
+    def test_three_card_ranks_compare_with_five_card_ranks(self):
+        aces_king = evaluate_three(np.array([[48, 49, 44]]))[0][0]
+        aces = evaluate_five(np.array([[48, 49, 44, 4, 0], [48, 49, 44, 40, 36], [44, 45, 40, 36, 32]]))
+        assert aces_king == aces[0], "A-A-K ranks as A-A-K-3-2"
+        assert aces[1] < aces_king < aces[2]
+        # 6-5-4 must not rank as a straight
+        ranks, rank_classes = evaluate_three(np.array([[16, 12, 8], [0, 1, 2]]))
+        assert rank_classes.tolist() == [9, 6]
+
+    def test_simple_config_matches_ofc(self):
+        boards = np.random.default_rng(0).permuted(np.tile(np.arange(52), (2000, 1)), axis=1)[:, :10]
+        engine = open_face.Engine('simple')
+        assert (engine.score_boards(boards) == ofc.score_boards(boards)).all()
+        cards, steps = boards[:, 9], np.full(2000, 3)
+        assert (engine.encode_observations(boards, cards, steps) == ofc.encode_observations(boards, cards, steps)).all()
+
+    def test_board_state_decodes_every_obs_mode(self):
+        engine = open_face.Engine('ofc')
+        deck = np.random.default_rng(3).permutation(52).tolist()
+        state = open_face.BoardState(engine, deck[0])
+        for i, action in enumerate([0, 1, 2, 2, 1, 0, 1]):
+            state.place(action)
+            state.card = deck[i + 1]
+        for decoded in (open_face.BoardState.from_indices(engine, state.to_indices()),
+                        open_face.BoardState.from_onehot(engine, state.to_onehot()),
+                        open_face.BoardState.from_observation(engine, state.to_observation())):
+            assert decoded.counts == state.counts == [2, 3, 2] and decoded.step == 7 and decoded.card == state.card
+            assert [sorted(row) for row in decoded.rows()] == [sorted(row) for row in state.rows()]
+            assert [row.product for row in decoded.strength] == [row.product for row in state.strength]
+
+    def test_board_state_matches_batch_scoring(self):
+        engine = open_face.Engine(open_face.OFC)
+        boards = np.random.default_rng(1).permuted(np.tile(np.arange(52), (500, 1)), axis=1)[:, :13]
+        rewards = engine.score_boards(boards)
+        for board, reward in zip(boards.tolist(), rewards):
+            state = open_face.BoardState(engine, board[0])
+            for row, row_slice in enumerate(engine.row_slices):
+                for card in board[row_slice]:
+                    state.card = card
+                    assert state.place(row)
+            assert state.is_over and state.score() == reward
+
+    def test_fouls_and_royalties(self):
+        engine = open_face.Engine('ofc')
+        # front Q-Q-2, middle two pair, back a royal flush in spades
+        board = np.array([[42, 43, 1, 4, 5, 8, 9, 12, 48, 44, 40, 36, 32]])
+        assert engine.score_boards(board)[0] == 7 + 25
+        # a front pair of queens over a middle pair of twos fouls
+        board[0, 3:8] = [2, 3, 16, 20, 24]
+        assert engine.score_boards(board)[0] == open_face.OFC.foul_reward
+
+    def test_invalid_configs(self):
+        with self.assertRaises(ValueError):
+            open_face.get_config('pineapple')
+        with self.assertRaises(ValueError):
+            open_face.get_config(open_face.OFC._replace(row_sizes=(4, 5, 5)))
+        with self.assertRaises(ValueError):
+            open_face.get_config(open_face.OFC._replace(row_royalties=('back', 'middle', 'front')))
+
+
+class SolverTestCase(unittest.TestCase):
+    def test_matches_brute_force(self):
+        for seed in range(3):
+            state = make_state(8, seed)
+            assert np.allclose(Solver().action_values(state), brute_force_values(state))
+
+    def test_accepts_observations(self):
+        state = make_state(7, 3)
+        solver = Solver()
+        assert solver.value(state.to_observation()) == solver.value(state.to_indices())
+        assert solver.best_action(state) in (0, 1)
+
+    def test_table_is_bounded(self):
+        solver = Solver(max_entries=10)
+        solver.value(make_state(6, 4))
+        assert len(solver.table) == 10
+
+
+class TranspositionTestCase(unittest.TestCase):
+    def test_key_ignores_suits_and_slot_order(self):
+        # 2s 3s | 4h with 5s to place against 3h 2h | 4d with 5h to place
+        assert canonical_key((0, 4), (9,), 12) == canonical_key((5, 1), (10,), 13)
+        assert canonical_key((0, 4), (9,), 12) != canonical_key((0, 4), (9,), 13)
+        assert canonical_key((0, 4), (9,)) != canonical_key((9,), (0, 4))
+        assert 0 <= canonical_key(tuple(range(47, 52)), tuple(range(42, 47)), 41) < 1 << 64
+
+    def test_state_key_accepts_observations(self):
+        state = make_state(5, 6)
+        assert state_key(state) == state_key(state.to_observation()) == state_key(state.to_onehot())
+
+    def test_cache_evicts_and_persists(self):
+        cache = TranspositionCache(max_entries=2)
+        for key in range(3):
+            cache.put(key, key / 2)
+        assert len(cache) == 2 and cache.get(0) is None and cache.get(2) == 1.0
+        assert cache.stats()['evictions'] == 1 and cache.hits == 1 and cache.misses == 1
+        with tempfile.TemporaryDirectory() as path:
+            path = f'{path}/table.npy'
+            cache.save(path)
+            loaded = TranspositionCache(max_entries=1, path=path)
+            assert loaded.get(1) == 0.5 and loaded.get(2) == 1.0 and 0 not in loaded
+
+    def test_solver_shares_a_cache(self):
+        state = make_state(7, 5)
+        cache = TranspositionCache()
+        first = Solver(table=cache).action_values(state)
+        misses = cache.misses
+        assert np.allclose(Solver(table=cache).action_values(state), first) and cache.misses == misses
+
+
+class RolloutTestCase(unittest.TestCase):
+    def test_random_rollouts_match_solver_when_forced(self):
+        # with 4 cards in each row every action leaves a single way to finish the game
+        state = make_state(8, 5)
+        estimate = estimate_action_values(state, 20000, n_workers=0, seed=0)
+        exact = Solver().action_values(state)
+        assert (estimate.lower <= exact + 1e-9).all() and (exact - 1e-9 <= estimate.upper).all()
+
+    def test_seeded_estimates_are_reproducible(self):
+        state = make_state(6, 6)
+        first = estimate_action_values(state, 5000, chunk_size=1000, n_workers=0, seed=7)
+        second = estimate_action_values(state, 5000, chunk_size=1000, n_workers=0, seed=7)
+        assert (first.means == second.means).all() and list(first.counts) == [5000, 5000]
+
+    def test_policy_rollouts(self):
+        state = make_state(2, 8)
+        estimate = estimate_action_values(state, 500, policy=lambda obs: obs[:, -1] % 2, n_workers=0, seed=0)
+        assert list(estimate.counts) == [500, 500]
+        assert ((estimate.means >= -10) & (estimate.means <= 2)).all()
+
+    def test_streaming_can_stop_early(self):
+        state = make_state(7, 0)
+        stream = iter_action_values(state, 100000, chunk_size=1000, n_workers=0, seed=0)
+        estimate = next(stream)
+        stream.close()
+        assert estimate.counts.sum() == 1000
+
+
+class DatasetTestCase(unittest.TestCase):
+    def test_generate_and_read_back(self):
+        with tempfile.TemporaryDirectory() as path:
+            manifest = generate('HandClassificationEnv-v3', path, 1000, shard_size=300, obs_mode='index', workers=0)
+            assert [shard['records'] for shard in manifest['shards']] == [300, 300, 300, 100]
+            dataset = Dataset(path)
+            batches = list(dataset.iter_batches(256))
+            assert [len(batch['actions']) for batch in batches] == [256, 256, 256, 232]
+            hands = np.concatenate([batch['observations'] for batch in batches])
+            labels = np.concatenate([batch['labels'] for batch in batches])
+            assert (evaluate_batch(hands)[1] - 1 == labels).all()
+
+    def test_generation_is_reproducible(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            generate('HandMakerEnv-v1', first, 500, shard_size=200, seed=3, workers=0)
+            generate('HandMakerEnv-v1', second, 500, shard_size=200, seed=3, workers=0)
+            for a, b in zip(Dataset(first).iter_batches(100), Dataset(second).iter_batches(100)):
+                assert all((a[field] == b[field]).all() for field in a)
+
+    def test_open_face_actions_are_optimal(self):
+        with tempfile.TemporaryDirectory() as path:
+            generate('OpenFaceSimpleEnv-v1', path, 20, shard_size=20, workers=0, min_placed=8)
+            batch = next(Dataset(path).iter_batches(20))
+            for obs, action in zip(batch['observations'], batch['actions']):
+                assert Solver().best_action(obs) == action
+
+
+class TrajectoryTestCase(unittest.TestCase):
+    @staticmethod
+    def _write(path, lengths, start=0, compress=True):
+        """Writes episodes of the given lengths, each step's obs and reward being its transition number"""
+        t = start
+        with TrajectoryWriter(path, (12,), chunk_size=7, compress=compress) as writer:
+            for length in lengths:
+                for step in range(length):
+                    writer.append(np.full(12, t % 256), step % 2, t, step == length - 1)
+                    t += 1
+        return t
+
+    def test_episodes_span_chunks(self):
+        with tempfile.TemporaryDirectory() as path:
+            n = self._write(path, [10, 3, 1, 9, 4])
+            log = TrajectoryLog(path)
+            assert len(log) == n == 27 and [c['records'] for c in log.chunks] == [7, 7, 7, 6]
+            episodes = list(log.iter_episodes())
+            assert [len(e['done']) for e in episodes] == [10, 3, 1, 9, 4]
+            assert all(e['done'][-1] and not e['done'][:-1].any() for e in episodes)
+            assert (np.concatenate([e['reward'] for e in episodes]) == np.arange(n)).all()
+            assert (episodes[3]['obs'][:, 0] == np.arange(14, 23)).all()
+
+    def test_append_and_memmap(self):
+        with tempfile.TemporaryDirectory() as path:
+            n = self._write(path, [5, 5], compress=False)
+            rewards = TrajectoryLog(path).memmap('reward')
+            assert (rewards == np.arange(n)).all() and not rewards.flags.writeable
+            # a second run appends new episodes, the cached column is rebuilt
+            n = self._write(path, [4], start=n)
+            log = TrajectoryLog(path)
+            assert (log.memmap('reward') == np.arange(n)).all()
+            assert [int(e['episode'][0]) for e in log.iter_episodes()] == [0, 1, 2]
+            with self.assertRaises(ValueError):
+                TrajectoryWriter(path, (5,))
+
+
+class RenderTestCase(unittest.TestCase):
+    def test_glyphs_and_tiles(self):
+        assert CARD_GLYPHS[51] == treys.Card.int_to_pretty_str(int(CARD_INTS[51])) and CARD_GLYPHS[EMPTY] == ' __ '
+        boards = np.array([[0, 1, 2, EMPTY, EMPTY, 48, 49, 50, 51, EMPTY]] * 3)
+        images = board_images(boards, [20, 21, 22], (3, 5, 2), scale=2)
+        assert images.shape == (3, 4 * 12 * 2, 5 * 8 * 2, 3)
+        # the card to be placed, then the front row padded with the table
+        assert (images[0, :24, :16] == TILES[20].repeat(2, axis=0).repeat(2, axis=1)).all()
+        assert (images[0, 24:48, 48:64] == TILES[BLANK].repeat(2, axis=0).repeat(2, axis=1)).all()
+        assert image_grid(images, columns=2).shape == (2 * 96, 2 * 80, 3)
+        text = render_boards(boards, [20, 21, 22], [4, 4, 4], (3, 5, 2), columns=2)
+        assert text.count("Step: 4") == 3 and len(text.split("\n")) == 2 * 9
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for us in [3] * 98 + [100, 5000]:
+            histogram.record(us / 1e6)
+        assert histogram.count == 100 and histogram.percentile(50) == 4 and histogram.percentile(99) == 128
+        assert histogram.max == 5000
+
+    def test_instrument_only_wraps_the_instance(self):
+        class Game:
+            def _draw(self):
+                return 7
+
+        lines = []
+        profiler = Profiler(log_every=2, log=lines.append)
+        game = profiler.instrument(Game(), ['_draw'])
+        assert game._draw() == 7 and hasattr(game._draw, '__wrapped__')
+        assert not hasattr(Game()._draw, '__wrapped__')
+        with profiler.phase('step'):
+            game._draw()
+        with profiler.phase('step'):
+            pass
+        phases = profiler.to_dict()['phases']
+        assert phases['draw']['count'] == 2 and phases['step']['count'] == 2 and len(lines) == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
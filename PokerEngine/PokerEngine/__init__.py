@@ -0,0 +1 @@
+"""Shared NumPy engine for the poker gym environments in this repository"""
@@ -0,0 +1,37 @@
+"""Caller-provided observation buffers
+
+By default the envs return a new array for every observation, which callers may keep. An env given an
+observation buffer instead writes every observation into that buffer in place and returns it, e.g. the row of a
+preallocated rollout array or a shared-memory slab, so stepping allocates no observation arrays:
+
+    env = gym.make('OpenFaceSimpleEnv-v1', obs_buffer=rollout[0])
+    for t in range(steps):
+        env.set_obs_buffer(rollout[t])
+        obs, reward, done, info = env.step(action)     # obs is rollout[t]
+
+With readonly_obs=True the returned observations are read-only, so code holding an observation can not write
+through it into the env. Without a buffer each observation is still a new array, which stays valid after the
+following steps, e.g. in a stored trajectory. With a buffer it is a read-only view that aliases the buffer,
+copy an observation to keep it past the next step when the buffer is reused.
+"""
+import numpy as np
+
+
+def check_obs_buffer(buffer, shape):
+    """Returns buffer as an array after checking that it holds one observation of the given shape"""
+    if buffer is None:
+        return None
+    if not isinstance(buffer, np.ndarray):
+        raise TypeError(f"obs_buffer must be an np.ndarray, got {type(buffer).__name__}")
+    if buffer.shape != tuple(shape):
+        raise ValueError(f"obs_buffer must have shape {tuple(shape)}, got {buffer.shape}")
+    if not buffer.flags.writeable:
+        raise ValueError("obs_buffer must be writeable")
+    return buffer
+
+
+def readonly(array):
+    """A read-only view of array, the array itself stays writeable"""
+    view = array.view()
+    view.flags.writeable = False
+    return view
@@ -0,0 +1,107 @@
+"""Card index conventions and the bit codec shared by the poker environments
+
+Every card is addressed by an index in [0, 52) ordered like `treys.Deck.GetFullDeck()`:
+    index = 4 * rank + suit
+with ranks deuce (0) to ace (12) and suits spades, hearts, diamonds, clubs (0 to 3).
+The index `EMPTY` (52) stands for an empty board slot.
+
+Observations encode each card as the 32 bits of its treys int, most significant bit first, and an empty
+slot as 32 zeros. `encode` and `decode` convert between card indices and these bits for any number of
+cards or whole batches of boards with table lookups, without going through strings.
+
+The environments can also observe cards in two compact uint8 modes, chosen with their `obs_mode` argument:
+    'bits'      the 32 bit treys encoding above, the default
+    'index'     the card index of every slot
+    'onehot'    a 52 wide vector per group of cards (a row or a hand) with a 1 for each card in it
+"""
+import numpy as np
+import treys
+
+N_CARDS = 52
+EMPTY = 52
+CARD_BITS = 32
+
+# treys card ints, with a trailing 0 for the empty slot
+CARD_INTS = np.array(treys.Deck.GetFullDeck() + [0], dtype=np.int64)
+RANKS = np.arange(N_CARDS) // 4
+SUITS = np.arange(N_CARDS) % 4
+
+# row i holds the 32 bits of CARD_INTS[i], the last row is the empty slot
+BIT_TABLE = ((CARD_INTS[:, None] >> np.arange(CARD_BITS - 1, -1, -1)) & 1).astype(np.uint8)
+ENCODE_TABLE = BIT_TABLE[:N_CARDS]
+# treys int to card index, for single cards
+CARD_INDEX = {int(card): index for index, card in enumerate(CARD_INTS)}
+# weights that pack 32 bits back into a treys int
+BIT_WEIGHTS = 1 << np.arange(CARD_BITS - 1, -1, -1, dtype=np.int64)
+
+OBS_MODES = ('bits', 'index', 'onehot')
+
+# card indices ordered by treys int, for mapping ints back to indices
+_INT_ORDER = np.argsort(CARD_INTS)
+
+
+def ints_to_indices(card_ints):
+    """Maps treys card ints to card indices, with 0 (an empty slot) mapping to EMPTY"""
+    card_ints = np.asarray(card_ints)
+    return _INT_ORDER[np.searchsorted(CARD_INTS, card_ints, sorter=_INT_ORDER)]
+
+
+def encode(indices, out=None):
+    """Encodes card indices as bits
+
+    :param indices: np.array    (..., k) card indices, EMPTY for empty slots
+    :param out: np.array        optional (..., 32 * k) array to write into
+
+    :returns bits: np.array     (..., 32 * k) uint8 bits, 32 per card
+    """
+    indices = np.asarray(indices)
+    bits = BIT_TABLE[indices].reshape(indices.shape[:-1] + (-1,))
+    if out is None:
+        return bits
+    out[...] = bits
+    return out
+
+
+def encode_ints(card_ints, out=None):
+    """Encodes treys card ints as bits, see `encode`"""
+    return encode(ints_to_indices(card_ints), out)
+
+
+def decode_ints(bits):
+    """Packs bits back into treys card ints
+
+    :param bits: np.array       (..., 32 * k) bits
+
+    :returns card_ints: np.array    (..., k) treys ints, 0 for empty slots
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    packed = np.packbits(bits.reshape(bits.shape[:-1] + (-1, CARD_BITS)), axis=-1)
+    return packed.view('>u4')[..., 0].astype(np.int64)
+
+
+def decode(bits):
+    """Decodes bits into card indices, the inverse of `encode`"""
+    return ints_to_indices(decode_ints(bits))
+
+
+def encode_onehot(indices):
+    """Encodes each group of card indices as a 52 wide membership vector
+
+    :param indices: np.array    (..., k) card indices, EMPTY slots are skipped
+
+    :returns onehot: np.array   (..., 52) uint8
+    """
+    indices = np.asarray(indices)
+    onehot = np.zeros(indices.shape[:-1] + (N_CARDS + 1,), dtype=np.uint8)
+    np.put_along_axis(onehot, indices.astype(np.intp), 1, axis=-1)
+    return onehot[..., :N_CARDS]
+
+
+def check_obs_mode(obs_mode):
+    if obs_mode not in OBS_MODES:
+        raise ValueError(f"obs_mode must be one of {OBS_MODES}, got {obs_mode!r}")
+
+
+def shuffled_decks(rng, n):
+    """Returns n independent permutations of the deck as an (n, 52) uint8 array of card indices"""
+    return np.argsort(rng.random((n, N_CARDS)), axis=1).astype(np.uint8)
@@ -0,0 +1,208 @@
+"""Offline datasets of labelled observations for the poker environments
+
+Records are generated directly from the NumPy engine in batches, with the same observation encodings as the
+gym environments, and written as fixed dtype .npy shards next to a manifest.json. Every shard is produced
+by one worker process from its own seed spawned from a single `np.random.SeedSequence`, so a dataset is
+reproducible from its seed regardless of the number of workers.
+
+Each shard holds three arrays:
+    observations    the env observation in the chosen obs_mode
+    labels          HandClassificationEnv-v3: rank class - 1, the action the env rewards
+                    HandMakerEnv-v1: the treys rank class of both five card hands
+                    OpenFaceSimpleEnv-v1: the exact expected reward of both actions
+    actions         the optimal action
+
+Usage:
+    python -m PokerEngine.dataset HandClassificationEnv-v3 data/hands --records 10000000 --workers 8
+and read it back with
+    dataset = Dataset('data/hands')
+    for batch in dataset.iter_batches(65536):
+        ...
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from PokerEngine import ofc
+from PokerEngine.cards import CARD_INTS, OBS_MODES, check_obs_mode, encode, encode_onehot, shuffled_decks
+from PokerEngine.evaluation import evaluate_batch
+from PokerEngine.solver import Solver
+from PokerEngine.transposition import TranspositionCache
+
+MANIFEST = 'manifest.json'
+FIELDS = ('observations', 'labels', 'actions')
+FORMAT_VERSION = 1
+
+
+def _hand_observations(hands, obs_mode):
+    if obs_mode == 'index':
+        return hands.astype(np.uint8)
+    if obs_mode == 'onehot':
+        return encode_onehot(hands.reshape(len(hands), -1, 5)).reshape(len(hands), -1)
+    return encode(hands)
+
+
+def hand_classification_records(rng, n, obs_mode='bits', **options):
+    hands = shuffled_decks(rng, n)[:, :5]
+    _, rank_classes = evaluate_batch(hands)
+    targets = (rank_classes - 1).astype(np.int8)
+    return _hand_observations(hands, obs_mode), targets, targets
+
+
+def hand_maker_records(rng, n, obs_mode='bits', **options):
+    cards = shuffled_decks(rng, n)[:, :10]
+    # HandMaker sorts its cards by treys int before splitting them into two hands
+    cards = np.take_along_axis(cards, np.argsort(CARD_INTS[cards], axis=1), axis=1)
+    ranks, rank_classes = evaluate_batch(cards.reshape(2 * n, 5))
+    ranks, rank_classes = ranks.reshape(n, 2), rank_classes.reshape(n, 2)
+    actions = (ranks[:, 0] < ranks[:, 1]).astype(np.int8)
+    return _hand_observations(cards, obs_mode), rank_classes.astype(np.int8), actions
+
+
+def open_face_records(rng, n, obs_mode='bits', min_placed=7, max_placed=ofc.N_SLOTS - 1, max_entries=1000000,
+                      cache_path=None):
+    """Random positions labelled by the exact solver, which is only cheap late in the game
+
+    cache_path reuses the board values of a table saved with `TranspositionCache.save`, read-only.
+    """
+    boards, counts, cards, steps = ofc.sample_states(rng, n, min_placed, max_placed)
+    solver = Solver(table=TranspositionCache(max_entries, cache_path))
+    values = np.empty((n, 2), dtype=np.float32)
+    for i in range(n):
+        state = ofc.GameState(int(cards[i]), boards[i].tolist(), counts[i].tolist(), int(steps[i]))
+        values[i] = solver.action_values(state)
+    observations = ofc.observations(obs_mode, boards, cards, steps)
+    return observations, values, values.argmax(axis=1).astype(np.int8)
+
+
+GENERATORS = {
+    'HandClassificationEnv-v3': hand_classification_records,
+    'HandMakerEnv-v1': hand_maker_records,
+    'OpenFaceSimpleEnv-v1': open_face_records,
+}
+
+
+def _shard_name(index, field):
+    return f'shard_{index:05d}_{field}.npy'
+
+
+def _write_shard(path, index, env_id, n, seed, obs_mode, options):
+    rng = np.random.default_rng(seed)
+    arrays = GENERATORS[env_id](rng, n, obs_mode, **options)
+    shard = {'index': index, 'records': n, 'files': {}}
+    for field, array in zip(FIELDS, arrays):
+        name = _shard_name(index, field)
+        np.save(os.path.join(path, name), np.ascontiguousarray(array))
+        shard['files'][field] = name
+    shard['dtypes'] = {field: array.dtype.str for field, array in zip(FIELDS, arrays)}
+    shard['shapes'] = {field: list(array.shape[1:]) for field, array in zip(FIELDS, arrays)}
+    return shard
+
+
+def generate(env_id, path, records, shard_size=1000000, obs_mode='bits', seed=0, workers=None, **options):
+    """Generates a sharded dataset and returns its manifest
+
+    :param env_id: str          one of the registered env ids in GENERATORS
+    :param path: str            output directory, created if needed
+    :param records: int         total number of records
+    :param shard_size: int      records per shard
+    :param obs_mode: str        observation encoding, see `PokerEngine.cards.OBS_MODES`
+    :param seed: int            root seed, each shard uses a seed spawned from it
+    :param workers: int         worker processes, 0 generates every shard in this process
+    :param options:             generator specific options, e.g. min_placed for OpenFaceSimpleEnv-v1
+    """
+    if env_id not in GENERATORS:
+        raise ValueError(f"env_id must be one of {sorted(GENERATORS)}, got {env_id!r}")
+    check_obs_mode(obs_mode)
+    os.makedirs(path, exist_ok=True)
+    sizes = [min(shard_size, records - start) for start in range(0, records, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(path, index, env_id, size, shard_seed, obs_mode, options)
+            for index, (size, shard_seed) in enumerate(zip(sizes, seeds))]
+
+    if workers == 0:
+        shards = [_write_shard(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_write_shard, *zip(*jobs)))
+
+    manifest = {'version': FORMAT_VERSION, 'env_id': env_id, 'obs_mode': obs_mode, 'seed': seed,
+                'records': records, 'options': options, 'shards': shards}
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class Dataset:
+    """Reads a generated dataset, memory-mapping each shard on access"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest['shards']
+
+    def __len__(self):
+        return self.manifest['records']
+
+    def shard(self, index):
+        """The arrays of one shard as a dict of read-only memory maps"""
+        files = self.shards[index]['files']
+        return {field: np.load(os.path.join(self.path, files[field]), mmap_mode='r') for field in FIELDS}
+
+    def iter_batches(self, batch_size):
+        """Yields dicts of arrays with batch_size records each, the last batch may be shorter
+
+        Batches inside a shard are memory-mapped slices, batches spanning two shards are copied together.
+        """
+        def joined(parts):
+            return {field: np.concatenate([part[field] for part in parts]) for field in FIELDS}
+
+        pending, pending_size = [], 0
+        for index, shard in enumerate(self.shards):
+            arrays = self.shard(index)
+            n = shard['records']
+            start = 0
+            if pending_size:
+                # top up the batch left over from the previous shard
+                start = min(batch_size - pending_size, n)
+                pending.append({field: arrays[field][:start] for field in FIELDS})
+                pending_size += start
+                if pending_size == batch_size:
+                    yield joined(pending)
+                    pending, pending_size = [], 0
+            while start + batch_size <= n:
+                yield {field: arrays[field][start:start + batch_size] for field in FIELDS}
+                start += batch_size
+            if start < n:
+                pending.append({field: arrays[field][start:] for field in FIELDS})
+                pending_size += n - start
+        if pending:
+            yield joined(pending)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('env_id', choices=sorted(GENERATORS))
+    parser.add_argument('path')
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--shard-size', type=int, default=1000000)
+    parser.add_argument('--obs-mode', choices=OBS_MODES, default='bits')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--min-placed', type=int, default=7, help="OpenFaceSimpleEnv-v1 only")
+    parser.add_argument('--cache', help="saved transposition table to reuse, OpenFaceSimpleEnv-v1 only")
+    args = parser.parse_args(args)
+
+    options = {}
+    if args.env_id == 'OpenFaceSimpleEnv-v1':
+        options = {'min_placed': args.min_placed, 'cache_path': args.cache}
+    manifest = generate(args.env_id, args.path, args.records, args.shard_size, args.obs_mode, args.seed,
+                        args.workers, **options)
+    print(f"[INFO] Wrote {manifest['records']} records in {len(manifest['shards'])} shards to {args.path}")
+
+
+if __name__ == '__main__':
+    main()
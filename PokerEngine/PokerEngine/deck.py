@@ -0,0 +1,87 @@
+"""Decks of card indices that are shuffled in place and dealt with a cursor
+
+`Deck` is a single 52 card deck for one game, `DeckBatch` holds one deck per game for vectorized envs. Both
+keep a preallocated uint8 array and a seeded `np.random.Generator`, so resets do not build new card lists and
+games are reproducible from the seed.
+"""
+import numpy as np
+
+from PokerEngine.cards import N_CARDS, shuffled_decks
+
+ORDERED = np.arange(N_CARDS, dtype=np.uint8)
+
+
+class Deck:
+    """One deck of card indices
+
+    :param seed: int or np.random.Generator     seed of the generator, or a generator to share
+    """
+
+    def __init__(self, seed=None):
+        self.cards = ORDERED.copy()
+        self.rng = np.random.default_rng(seed)
+        self.cursor = 0
+        self.shuffle()
+
+    def __len__(self):
+        """Number of cards left to deal"""
+        return N_CARDS - self.cursor
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed]
+
+    def shuffle(self):
+        """Shuffles all 52 cards back into the deck"""
+        # start from the same order every time so that a seeded deck repeats its deals
+        self.cards[:] = ORDERED
+        self.rng.shuffle(self.cards)
+        self.cursor = 0
+
+    def draw(self):
+        """Deals the next card index as an int"""
+        if self.cursor == N_CARDS:
+            raise IndexError("draw from an empty deck")
+        card = int(self.cards[self.cursor])
+        self.cursor += 1
+        return card
+
+    def deal(self, n):
+        """Deals the next n card indices as a view of the deck, valid until the next shuffle"""
+        if n > len(self):
+            raise IndexError(f"cannot deal {n} cards from a deck with {len(self)} left")
+        cards = self.cards[self.cursor:self.cursor + n]
+        self.cursor += n
+        return cards
+
+
+class DeckBatch:
+    """One deck per game, shuffled together
+
+    Games deal their cards by position, e.g. the open face envs deal card i of a deck at step i, so the batch
+    keeps no cursor.
+
+    :param n: int                               number of decks
+    :param seed: int or np.random.Generator     seed of the generator, or a generator to share
+    """
+
+    def __init__(self, n, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.cards = shuffled_decks(self.rng, n)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed]
+
+    def shuffle(self, games=None):
+        """Reshuffles the decks of the given games, all of them by default
+
+        :param games: np.array      indices of the decks to shuffle
+        """
+        if games is None:
+            self.cards[:] = shuffled_decks(self.rng, len(self.cards))
+        else:
+            self.cards[games] = shuffled_decks(self.rng, len(games))
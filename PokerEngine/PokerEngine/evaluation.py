@@ -0,0 +1,192 @@
+"""Vectorized five card hand evaluation
+
+`evaluate_five` uses the same lookup tables as `treys.Evaluator`, flattened into arrays so that whole batches
+of hands are ranked with a handful of NumPy operations. Ranks follow treys: 1 is a royal flush, 7462 is
+7-5-4-3-2 offsuit.
+
+`evaluate_batch` goes one step further with an exhaustive rank table. Every five card hand has a unique index
+in the combinatorial number system: with its card indices sorted c0 < c1 < c2 < c3 < c4, the index is
+C(c0, 1) + C(c1, 2) + C(c2, 3) + C(c3, 4) + C(c4, 5). The table holds the rank of all 2,598,960 hands at their
+index, so ranking a batch is a sort and a single gather.
+
+All tables, including the flush and prime product tables that treys regenerates for every `treys.Evaluator`,
+are built once by `cached_table`, saved as versioned .npy files in the cache directory (`POKER_ENGINE_CACHE`,
+by default ~/.cache/PokerEngine) and memory-mapped from then on. Importing this module in a new process, e.g. an
+env worker, is then a few file maps, and the pages are shared by every process that maps them.
+"""
+import functools
+import itertools
+import math
+import os
+import numpy as np
+import treys
+
+from PokerEngine.cards import N_CARDS, RANKS, SUITS
+
+PRIMES = np.array(treys.Card.PRIMES, dtype=np.int64)
+
+N_HANDS = 2598960
+# bump a version when the contents of its tables change, old cache files are then ignored
+TABLE_VERSION = 1
+EVALUATOR_TABLE_VERSION = 1
+CACHE_DIR = os.environ.get('POKER_ENGINE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'PokerEngine'))
+
+
+def cached_table(name, build, version, cache_dir=None):
+    """Returns the memory-mapped table `name`, calling build() and saving the result on first use
+
+    :param name: str            file name stem, the file is {name}_v{version}.npy in the cache directory
+    :param build: callable      returns the table as an np.array
+    :param version: int         version of the table contents
+    :param cache_dir: str       CACHE_DIR by default
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, f'{name}_v{version}.npy')
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a private file first so concurrent builders never see a partial table
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, build())
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+@functools.lru_cache(maxsize=None)
+def _build_tables():
+    table = treys.lookup.LookupTable()
+    # flushes are looked up by the 13 bit rank pattern of the hand
+    flush_ranks = np.zeros(1 << 13, dtype=np.int16)
+    for rankbits in range(1 << 13):
+        if bin(rankbits).count('1') == 5:
+            flush_ranks[rankbits] = table.flush_lookup[treys.Card.prime_product_from_rankbits(rankbits)]
+    # everything else is looked up by the product of the rank primes, kept sorted for searchsorted
+    products = np.array(sorted(table.unsuited_lookup), dtype=np.int64)
+    product_ranks = np.array([table.unsuited_lookup[p] for p in products], dtype=np.int16)
+    return flush_ranks, products, product_ranks
+
+
+FLUSH_RANKS, PRIME_PRODUCTS, PRIME_PRODUCT_RANKS = [
+    cached_table(name, lambda i=i: _build_tables()[i], EVALUATOR_TABLE_VERSION)
+    for i, name in enumerate(('flush_ranks', 'prime_products', 'prime_product_ranks'))]
+# the same tables as plain Python objects, for ranking single hands without NumPy overhead
+FLUSH_RANK_LIST = FLUSH_RANKS.tolist()
+PRIME_PRODUCT_RANK_DICT = dict(zip(PRIME_PRODUCTS.tolist(), PRIME_PRODUCT_RANKS.tolist()))
+
+
+def evaluate_five(hands):
+    """Ranks a batch of five card hands
+
+    :param hands: np.array      (N, 5) card indices
+
+    :returns ranks: np.array    (N,) treys hand ranks, lower is stronger
+    """
+    hands = np.asarray(hands)
+    ranks = RANKS[hands]
+    suits = SUITS[hands]
+    is_flush = (suits == suits[:, :1]).all(axis=1)
+    rankbits = np.bitwise_or.reduce(1 << ranks, axis=1)
+    products = PRIMES[ranks].prod(axis=1)
+    result = PRIME_PRODUCT_RANKS[np.searchsorted(PRIME_PRODUCTS, products)]
+    result[is_flush] = FLUSH_RANKS[rankbits[is_flush]]
+    return result
+
+
+# BINOMIAL[n, k] = n choose k
+BINOMIAL = np.array([[math.comb(n, k) for k in range(6)] for n in range(53)], dtype=np.int64)
+# the worst rank of each rank class, treys rank classes are 1 (straight flush) to 9 (high card)
+RANK_CLASS_MAX = np.array(sorted(treys.lookup.LookupTable.MAX_TO_RANK_CLASS), dtype=np.int16)
+
+_rank_table = None
+
+
+def hand_index(hands):
+    """Index of each five card hand in the rank table
+
+    :param hands: np.array      (N, 5) card indices in any order
+    """
+    hands = np.sort(hands, axis=1)
+    return BINOMIAL[hands, np.arange(1, 6)].sum(axis=1)
+
+
+def _build_rank_table():
+    combos = np.array(list(itertools.combinations(range(N_CARDS), 5)), dtype=np.int64)
+    table = np.empty(N_HANDS, dtype=np.int16)
+    table[hand_index(combos)] = evaluate_five(combos)
+    return table
+
+
+def rank_table(cache_dir=CACHE_DIR):
+    """Returns the memory-mapped rank table, building and caching it on first use"""
+    global _rank_table
+    if _rank_table is None:
+        _rank_table = cached_table('five_card_ranks', _build_rank_table, TABLE_VERSION, cache_dir)
+    return _rank_table
+
+
+def rank_class(ranks):
+    """treys rank class (1 to 9) of each rank"""
+    return np.searchsorted(RANK_CLASS_MAX, ranks) + 1
+
+
+def evaluate_batch(hands):
+    """Ranks a batch of five card hands with the exhaustive rank table
+
+    Agrees exactly with `treys.Evaluator._five`.
+
+    :param hands: np.array          (N, 5) card indices
+
+    :returns ranks: np.array        (N,) treys hand ranks, lower is stronger
+    :returns rank_classes: np.array (N,) treys rank classes
+    """
+    ranks = rank_table()[hand_index(hands)]
+    return ranks, rank_class(ranks)
+
+
+def _build_three_card_table():
+    """Ranks of three card hands on the five card scale, by the pattern index of their sorted ranks
+
+    A three card hand ranks as the weakest five card hand of the same category that contains it, e.g. A-A-K as
+    A-A-K-3-2, so a front row only beats a five card row that it would also beat as part of a five card hand.
+    """
+    primes = PRIMES.tolist()
+    table = np.zeros(13 ** 3, dtype=np.int16)
+    for pattern in THREE_CARD_PATTERNS:
+        category = {3: 9, 2: 8, 1: 6}[len(set(pattern))]  # high card, pair, three of a kind
+        product = math.prod(primes[r] for r in pattern)
+        kickers = [r for r in range(13) if r not in pattern]
+        ranks = np.array([PRIME_PRODUCT_RANK_DICT[product * primes[a] * primes[b]]
+                          for a, b in itertools.combinations(kickers, 2)])
+        table[_pattern_index(pattern)] = ranks[rank_class(ranks) == category].max()
+    return table
+
+
+def _pattern_index(pattern):
+    return pattern[0] * 169 + pattern[1] * 13 + pattern[2]
+
+
+# sorted rank triples of all three card hands
+THREE_CARD_PATTERNS = list(itertools.combinations_with_replacement(range(13), 3))
+THREE_CARD_RANKS = cached_table('three_card_ranks', _build_three_card_table, EVALUATOR_TABLE_VERSION)
+# by product of rank primes, for single hands
+THREE_CARD_RANK_DICT = {math.prod(PRIMES[list(pattern)].tolist()): int(THREE_CARD_RANKS[_pattern_index(pattern)])
+                        for pattern in THREE_CARD_PATTERNS}
+
+
+def three_card_index(hands):
+    """Pattern index of each three card hand, from its sorted card ranks
+
+    :param hands: np.array      (N, 3) card indices in any order
+    """
+    ranks = np.sort(RANKS[hands], axis=1)
+    return ranks[:, 0] * 169 + ranks[:, 1] * 13 + ranks[:, 2]
+
+
+def evaluate_three(hands):
+    """Ranks a batch of three card hands on the treys five card scale, see `_build_three_card_table`
+
+    :returns ranks: np.array        (N,) ranks, lower is stronger
+    :returns rank_classes: np.array (N,) 9 for high card, 8 for a pair, 6 for three of a kind
+    """
+    ranks = THREE_CARD_RANKS[three_card_index(hands)]
+    return ranks, rank_class(ranks)
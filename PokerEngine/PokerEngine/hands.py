@@ -0,0 +1,175 @@
+"""Batches of ranked five card hands for the one step hand envs
+
+HandClassificationEnv and HandMaker play one step episodes: deal, observe, score one action. Their batched
+versions deal N games at once with `HandDealer`, which draws the cards, ranks every hand with the exhaustive
+rank table and builds the observations in a handful of NumPy operations. The dealer keeps the next batch
+ready, computed on a background thread while the current actions are scored, so the reset after every step
+is only a swap.
+
+    dealer = HandDealer(4096, n_hands=2, obs_mode='index', sort=True, seed=0)
+    batch = dealer.next()   # HandBatch of cards, ranks, rank_classes and obs
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from PokerEngine.buffers import check_obs_buffer, readonly
+from PokerEngine.cards import CARD_INTS, N_CARDS, check_obs_mode, encode, encode_onehot
+from PokerEngine.evaluation import evaluate_batch
+
+try:
+    from stable_baselines.common.vec_env import VecEnv
+except ImportError:  # stable-baselines is only needed for training
+    VecEnv = object
+
+HAND_SIZE = 5
+
+# cards (N, 5 * n_hands) uint8, ranks and rank_classes (N, n_hands), obs (N, ...) in the dealer's obs_mode
+HandBatch = namedtuple('HandBatch', ['cards', 'ranks', 'rank_classes', 'obs'])
+
+
+def deal_hands(rng, n, n_cards):
+    """n deals of n_cards distinct card indices, an (n, n_cards) uint8 array"""
+    return np.argpartition(rng.random((n, N_CARDS)), n_cards, axis=1)[:, :n_cards].astype(np.uint8)
+
+
+class HandDealer:
+    """Deals and ranks batches of hands, one batch ahead
+
+    :param n: int               games per batch
+    :param n_hands: int         five card hands per game
+    :param obs_mode: str        one of `PokerEngine.cards.OBS_MODES`
+    :param sort: bool           sort each game's cards by treys int before splitting them into hands, as HandMaker
+    :param seed: int            seed of the generator, batches repeat for the same seed
+    :param prefetch: bool       build the next batch on a background thread, otherwise on demand
+    """
+
+    def __init__(self, n, n_hands=1, obs_mode='bits', sort=False, seed=None, prefetch=True):
+        check_obs_mode(obs_mode)
+        self.n = n
+        self.n_hands = n_hands
+        self.obs_mode = obs_mode
+        self.sort = sort
+        self.rng = np.random.default_rng(seed)
+        self.executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self.pending = None
+        self._prefetch()
+
+    def deal(self):
+        """Deals, ranks and encodes one batch"""
+        cards = deal_hands(self.rng, self.n, self.n_hands * HAND_SIZE)
+        if self.sort:
+            cards = np.take_along_axis(cards, np.argsort(CARD_INTS[cards], axis=1), axis=1)
+        hands = cards.reshape(self.n * self.n_hands, HAND_SIZE)
+        ranks, rank_classes = evaluate_batch(hands)
+        if self.obs_mode == 'index':
+            obs = cards
+        elif self.obs_mode == 'onehot':
+            obs = encode_onehot(cards.reshape(self.n, self.n_hands, HAND_SIZE)).reshape(self.n, -1)
+        else:
+            obs = encode(cards)
+        shape = (self.n, self.n_hands)
+        return HandBatch(cards, ranks.reshape(shape), rank_classes.reshape(shape), obs)
+
+    def _prefetch(self):
+        if self.executor is not None:
+            self.pending = self.executor.submit(self.deal)
+
+    def next(self):
+        """The next batch, and starts building the one after it"""
+        if self.pending is None:
+            return self.deal()
+        batch = self.pending.result()
+        self._prefetch()
+        return batch
+
+    def seed(self, seed=None):
+        """Reseeds the generator, the prefetched batch is dealt again from the new seed"""
+        if self.pending is not None:
+            self.pending.result()
+        self.rng = np.random.default_rng(seed)
+        self._prefetch()
+        return [seed]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = self.pending = None
+
+
+class VecHandEnv(VecEnv):
+    """Base of the batched one step hand envs
+
+    Every step ends every game, so every step returns the first observation of a fresh batch, with the last
+    observation of each game in its info dict under 'terminal_observation', as stable-baselines expects of a
+    VecEnv. Subclasses set the spaces and dealer and score a batch in `_get_rewards`.
+
+    Observations are the dealer's arrays unless an (N, ...) obs buffer is set with `set_obs_buffer`, which they
+    are then copied into. readonly_obs=True returns read-only views, see `PokerEngine.buffers`.
+    """
+
+    def __init__(self, num_envs, dealer, readonly_obs=False):
+        self.num_envs = num_envs
+        self.dealer = dealer
+        self.readonly_obs = readonly_obs
+        self.metadata = {'render_modes': []}
+        self.obs_buffer = None
+        self.batch = None
+        self._actions = None
+
+    def _get_rewards(self, batch, actions):
+        raise NotImplementedError
+
+    def set_obs_buffer(self, buffer=None):
+        """Writes the observations of the following steps into buffer in place, or returns new arrays if None"""
+        self.obs_buffer = check_obs_buffer(buffer, (self.num_envs,) + self.observation_space.shape)
+
+    def _output(self, obs):
+        if self.obs_buffer is not None:
+            self.obs_buffer[...] = obs
+            obs = self.obs_buffer
+        return readonly(obs) if self.readonly_obs else obs
+
+    def reset(self):
+        self.batch = self.dealer.next()
+        return self._output(self.batch.obs)
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        batch = self.batch
+        rewards = self._get_rewards(batch, self._actions).astype(np.float32)
+        self.batch = self.dealer.next()
+        infos = [{'terminal_observation': obs} for obs in batch.obs]
+        return self._output(self.batch.obs), rewards, np.ones(self.num_envs, dtype=bool), infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seed=None):
+        self.dealer.seed(seed)
+        return [seed] * self.num_envs
+
+    def close(self):
+        self.dealer.close()
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        raise NotImplementedError(f"{type(self).__name__} does not hold individual env instances")
+
+    def get_images(self, *args, **kwargs):
+        raise NotImplementedError(f"{type(self).__name__} does not render")
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        if isinstance(indices, int):
+            return [indices]
+        return indices
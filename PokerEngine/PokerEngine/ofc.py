@@ -0,0 +1,106 @@
+"""Batched game logic for the simple Open Face game
+
+The board holds two rows of five slots. Slots 0 to 4 are the front row (action 0) and slots 5 to 9 the back
+row (action 1). Cards are placed left to right, so a row's fill count is also the slot of its next card.
+The game is the SIMPLE config of `PokerEngine.open_face`: the functions here are those of its `Engine` and work
+on whole batches of games at once, `GameState` holds a single game for the scalar env.
+"""
+import numpy as np
+
+from PokerEngine.cards import EMPTY, shuffled_decks
+from PokerEngine.open_face import SIMPLE, BoardState, Engine, RowStrength
+
+ENGINE = Engine(SIMPLE)
+
+ROW_SIZE = SIMPLE.row_sizes[0]
+N_ROWS = SIMPLE.n_rows
+N_SLOTS = SIMPLE.n_slots
+STEP_SIZE = SIMPLE.step_bits
+OBS_SIZE = SIMPLE.obs_size  # 356
+
+# 'index' observations hold the 10 slots, the card to be placed and the step counter
+INDEX_SIZE = SIMPLE.index_size
+INDEX_HIGH = ENGINE.index_high
+# 'onehot' observations hold a 52 wide vector for each row and one for the card to be placed
+ONEHOT_SIZE = SIMPLE.onehot_size
+
+PLAYER_CARD = ENGINE.player_card
+STEP = ENGINE.step
+
+FULL_ROW_REWARD = SIMPLE.full_row_reward
+WIN_REWARD = SIMPLE.valid_reward
+LOSS_REWARD = SIMPLE.foul_reward
+
+# the 4 bit game stage for each step counter
+STEP_TABLE = ENGINE.step_table
+
+# score_boards(boards): WIN_REWARD where the front row is weaker than the back row, LOSS_REWARD otherwise
+score_boards = ENGINE.score_boards
+place_cards = ENGINE.place_cards
+empty_boards = ENGINE.empty_boards
+encode_observations = ENGINE.encode_observations
+index_observations = ENGINE.index_observations
+onehot_observations = ENGINE.onehot_observations
+observations = ENGINE.observations
+
+
+class GameState(BoardState):
+    """Integer state of a single game, the `BoardState` of the SIMPLE config
+
+    The 356 bit observation is only built when `to_observation` is called.
+    """
+    __slots__ = ()
+
+    def __init__(self, card, board=None, counts=None, step=0):
+        super().__init__(ENGINE, card, board, counts, step)
+
+    @classmethod
+    def from_indices(cls, indices):
+        return cls(*ENGINE.decode_indices(indices))
+
+    @classmethod
+    def from_onehot(cls, onehot):
+        """Decodes a 'onehot' observation, the cards of each row are placed in index order"""
+        return cls(*ENGINE.decode_onehot(onehot))
+
+    @classmethod
+    def from_observation(cls, observation):
+        """Decodes a 356 bit observation, assuming each row is filled from the left"""
+        return cls(*ENGINE.decode_observation(observation))
+
+
+def state_from_observation(observation):
+    """Decodes a single observation in any of the obs modes, recognised by its length"""
+    size = len(observation)
+    if size == INDEX_SIZE:
+        return GameState.from_indices(observation)
+    if size == ONEHOT_SIZE:
+        return GameState.from_onehot(observation)
+    return GameState.from_observation(observation)
+
+
+def sample_states(rng, n, min_placed=0, max_placed=N_SLOTS - 1):
+    """Samples n random positions that are still in play
+
+    The number of placed cards is uniform in [min_placed, max_placed] and the split between the rows is
+    uniform over the splits that fit. Cards come from a fresh shuffle for every position.
+
+    :returns boards: np.array   (n, 10) uint8 card indices, EMPTY for open slots
+    :returns counts: np.array   (n, 2) int8 row fill counts
+    :returns cards: np.array    (n,) uint8 card to be placed
+    :returns steps: np.array    (n,) int8 number of placed cards
+    """
+    steps = rng.integers(min_placed, max_placed + 1, n)
+    low = np.maximum(steps - ROW_SIZE, 0)
+    high = np.minimum(steps, ROW_SIZE)
+    front = low + (rng.random(n) * (high - low + 1)).astype(np.int64)
+    counts = np.stack([front, steps - front], axis=1)
+
+    decks = shuffled_decks(rng, n)
+    columns = np.arange(ROW_SIZE)
+    boards = empty_boards(n)
+    boards[:, :ROW_SIZE] = np.where(columns < counts[:, :1], decks[:, :ROW_SIZE], EMPTY)
+    back = np.take_along_axis(decks, counts[:, :1] + columns, axis=1)
+    boards[:, ROW_SIZE:] = np.where(columns < counts[:, 1:], back, EMPTY)
+    cards = decks[np.arange(n), steps]
+    return boards, counts.astype(np.int8), cards, steps.astype(np.int8)
@@ -0,0 +1,482 @@
+"""Open Face games with any number of rows, configured by a `GameConfig`
+
+The simple game of `PokerEngine.ofc` is one configuration, two rows of five cards where the front row must be
+weaker than the back row. `OFC` is 13 card Open Face Chinese: a front row of three cards, a middle and a back
+row of five, fouls when a row beats the row behind it, and the standard royalties. Everything that depends on
+the rows is derived from the config:
+
+    slots           rows are laid out front to back, row r starts at slot row_starts[r]
+    'bits'          32 bits per slot, 32 for the card to be placed and step_bits for the step counter
+    'index'         the card index of every slot, the card to be placed and the step
+    'onehot'        a 52 wide vector per row and one for the card to be placed
+    reward          foul_reward if any row beats the row behind it, otherwise valid_reward plus the royalties
+                    of the rows, and full_row_reward for placing a card in a full row
+
+`Engine` steps and scores whole batches of games with NumPy, three card rows are ranked with the precomputed
+`PokerEngine.evaluation.THREE_CARD_RANKS`. `BoardState` holds one game for the scalar envs, with a
+`RowStrength` per row. `PokerEngine.ofc` is the SIMPLE config of both.
+"""
+import bisect
+import itertools
+from collections import namedtuple
+import numpy as np
+
+from PokerEngine.cards import BIT_TABLE, BIT_WEIGHTS, CARD_BITS, EMPTY, N_CARDS, RANKS, SUITS, decode, encode, \
+    encode_onehot
+from PokerEngine.evaluation import FLUSH_RANK_LIST, PRIMES, PRIME_PRODUCT_RANK_DICT, RANK_CLASS_MAX, \
+    THREE_CARD_PATTERNS, THREE_CARD_RANK_DICT, THREE_CARD_RANKS, evaluate_batch, evaluate_three, rank_class
+
+ROW_SIZES = (3, 5)
+N_RANKS = int(RANK_CLASS_MAX[-1])
+
+
+def _five_card_royalties(by_class, royal_flush):
+    """Royalty of every five card rank from the royalty of each treys rank class, 1 to 9"""
+    royalties = np.array(by_class, dtype=np.int16)[rank_class(np.arange(N_RANKS + 1)) - 1]
+    royalties[0] = 0  # not a rank
+    royalties[1] = royal_flush
+    return royalties
+
+
+def _front_royalties():
+    """Royalty of every three card rank: 1 for a pair of sixes up to 9 for aces, 10 to 22 for trips"""
+    royalties = np.zeros(N_RANKS + 1, dtype=np.int16)
+    for low, mid, high in THREE_CARD_PATTERNS:
+        if low == high:
+            royalty = 10 + low
+        elif low == mid or mid == high:
+            royalty = max(mid - 3, 0)
+        else:
+            continue
+        royalties[THREE_CARD_RANKS[low * 169 + mid * 13 + high]] = royalty
+    return royalties
+
+
+# royalties by treys rank, for the rows of the 13 card game
+ROYALTIES = {
+    'front': _front_royalties(),
+    # straight flush, quads, full house, flush, straight, trips and below
+    'middle': _five_card_royalties((30, 20, 12, 8, 4, 2, 0, 0, 0), royal_flush=50),
+    'back': _five_card_royalties((15, 10, 6, 4, 2, 0, 0, 0, 0), royal_flush=25),
+}
+
+
+class GameConfig(namedtuple('GameConfig', ['row_sizes', 'row_royalties', 'valid_reward', 'foul_reward',
+                                           'full_row_reward', 'ties_foul'])):
+    """Rows and scoring rules of an Open Face game
+
+    :param row_sizes: tuple         cards per row, front to back, each 3 or 5
+    :param row_royalties: tuple     name of the `ROYALTIES` table of each row, or None for no royalties
+    :param valid_reward: int        reward of a board without a foul, before royalties
+    :param foul_reward: int         reward of a fouled board
+    :param full_row_reward: int     reward for placing a card in a full row, which ends the game
+    :param ties_foul: bool          whether a row that ties the row behind it is a foul
+    """
+    __slots__ = ()
+
+    @property
+    def n_rows(self):
+        return len(self.row_sizes)
+
+    @property
+    def n_slots(self):
+        return sum(self.row_sizes)
+
+    @property
+    def row_starts(self):
+        return tuple(itertools.accumulate((0,) + self.row_sizes[:-1]))
+
+    @property
+    def step_bits(self):
+        return self.n_slots.bit_length()
+
+    @property
+    def obs_size(self):
+        return (self.n_slots + 1) * CARD_BITS + self.step_bits
+
+    @property
+    def index_size(self):
+        return self.n_slots + 2
+
+    @property
+    def onehot_size(self):
+        return (self.n_rows + 1) * N_CARDS
+
+    @property
+    def reward_range(self):
+        """Lowest and highest reward of a game"""
+        best = self.valid_reward
+        if self.row_royalties is not None:
+            best += sum(int(ROYALTIES[name].max()) for name in self.row_royalties)
+        return min(self.full_row_reward, self.foul_reward), best
+
+    def check(self):
+        if any(size not in ROW_SIZES for size in self.row_sizes):
+            raise ValueError(f"row sizes must be in {ROW_SIZES}, got {self.row_sizes}")
+        if self.n_slots >= N_CARDS:
+            raise ValueError(f"the board must hold fewer than {N_CARDS} cards, got {self.n_slots}")
+        if self.row_royalties is not None:
+            if len(self.row_royalties) != self.n_rows:
+                raise ValueError("row_royalties needs one table name per row")
+            for size, name in zip(self.row_sizes, self.row_royalties):
+                if name not in ROYALTIES or (name == 'front') != (size == 3):
+                    raise ValueError(f"no royalty table {name!r} for a row of {size} cards")
+        return self
+
+
+# two rows of five, the front row must be weaker than the back row
+SIMPLE = GameConfig(row_sizes=(5, 5), row_royalties=None, valid_reward=2, foul_reward=-1, full_row_reward=-10,
+                    ties_foul=True)
+OFC = GameConfig(row_sizes=(3, 5, 5), row_royalties=('front', 'middle', 'back'), valid_reward=0,
+                 foul_reward=-6, full_row_reward=-10, ties_foul=False)
+CONFIGS = {'simple': SIMPLE, 'ofc': OFC}
+
+
+def get_config(config):
+    """A GameConfig from a config or the name of one of the CONFIGS"""
+    if isinstance(config, str):
+        if config not in CONFIGS:
+            raise ValueError(f"config must be a GameConfig or one of {tuple(CONFIGS)}, got {config!r}")
+        config = CONFIGS[config]
+    return GameConfig(*config).check()
+
+
+class Engine:
+    """Batched game logic for one GameConfig
+
+    :param config: GameConfig or str    the config or the name of one of the CONFIGS
+    """
+
+    def __init__(self, config=OFC):
+        self.config = config = get_config(config)
+        self.n_rows = config.n_rows
+        self.n_slots = config.n_slots
+        self.row_sizes = np.array(config.row_sizes)
+        self.row_starts = np.array(config.row_starts)
+        self.row_slices = [slice(start, start + size) for start, size in zip(config.row_starts, config.row_sizes)]
+        # the first slot and size of each row as ints, for the scalar BoardState
+        self.row_bounds = tuple(zip(config.row_starts, config.row_sizes))
+        self.obs_size = config.obs_size
+        self.player_card = slice(self.n_slots * CARD_BITS, (self.n_slots + 1) * CARD_BITS)
+        self.step = slice(self.obs_size - config.step_bits, self.obs_size)
+        self.step_table = ((np.arange(self.n_slots + 1)[:, None] >> np.arange(config.step_bits - 1, -1, -1)) & 1
+                           ).astype(np.uint8)
+        self.index_high = np.array([EMPTY] * self.n_slots + [N_CARDS - 1, self.n_slots], dtype=np.uint8)
+        self.royalties = None
+        if config.row_royalties is not None:
+            self.royalties = [ROYALTIES[name] for name in config.row_royalties]
+        self._card_columns = np.arange(CARD_BITS)
+
+    def empty_boards(self, n):
+        return np.full((n, self.n_slots), EMPTY, dtype=np.uint8)
+
+    def row_ranks(self, boards):
+        """(N, n_rows) treys ranks of the rows of full boards, lower is stronger"""
+        ranks = np.empty((len(boards), self.n_rows), dtype=np.int64)
+        for r, (size, row) in enumerate(zip(self.config.row_sizes, self.row_slices)):
+            evaluate = evaluate_three if size == 3 else evaluate_batch
+            ranks[:, r], _ = evaluate(boards[:, row])
+        return ranks
+
+    def score_ranks(self, ranks):
+        """Rewards from the (N, n_rows) row ranks of full boards"""
+        front, back = ranks[:, :-1], ranks[:, 1:]
+        fouls = (front <= back) if self.config.ties_foul else (front < back)
+        rewards = np.full(len(ranks), self.config.valid_reward, dtype=np.int64)
+        if self.royalties is not None:
+            for r, royalties in enumerate(self.royalties):
+                rewards += royalties[ranks[:, r]]
+        return np.where(fouls.any(axis=1), self.config.foul_reward, rewards)
+
+    def score_boards(self, boards):
+        """Terminal reward for a batch of full boards
+
+        :param boards: np.array     (N, n_slots) card indices
+        """
+        return self.score_ranks(self.row_ranks(boards))
+
+    def place_cards(self, boards, counts, actions, cards):
+        """Places cards[i] into row actions[i] of game i
+
+        Games whose chosen row is already full are left untouched.
+
+        :returns placed: np.array   boolean mask over games, False where the row was full
+        :returns slots: np.array    board slot of each placed card
+        """
+        games = np.arange(len(actions))
+        filled = counts[games, actions]
+        placed = filled < self.row_sizes[actions]
+        games, actions = games[placed], actions[placed]
+        slots = self.row_starts[actions] + filled[placed]
+        boards[games, slots] = cards[placed]
+        counts[games, actions] += 1
+        return placed, slots
+
+    def encode_cards(self, obs, games, slots, cards):
+        """Writes the bits of cards[i] into slot slots[i] of observation row games[i]"""
+        obs[games[:, None], slots[:, None] * CARD_BITS + self._card_columns] = BIT_TABLE[cards]
+
+    def encode_observations(self, boards, cards, steps, out=None):
+        """Builds the (N, obs_size) bit observations from card indices
+
+        :param boards: np.array     (N, n_slots) card indices, EMPTY for open slots
+        :param cards: np.array      (N,) card index of the card to be placed
+        :param steps: np.array      (N,) number of cards already placed
+        """
+        if out is None:
+            out = np.empty((len(boards), self.obs_size), dtype=np.int8)
+        encode(boards, out[:, :self.n_slots * CARD_BITS])
+        out[:, self.player_card] = BIT_TABLE[cards]
+        out[:, self.step] = self.step_table[steps]
+        return out
+
+    def index_observations(self, boards, cards, steps):
+        """Builds (N, index_size) 'index' observations, see `encode_observations`"""
+        return np.concatenate([boards, cards[:, None], steps[:, None]], axis=1).astype(np.uint8)
+
+    def onehot_observations(self, boards, cards):
+        """Builds (N, onehot_size) 'onehot' observations, see `encode_observations`"""
+        rows = [encode_onehot(boards[:, row]) for row in self.row_slices]
+        return np.concatenate(rows + [encode_onehot(cards[:, None])], axis=1)
+
+    def observations(self, obs_mode, boards, cards, steps):
+        """Builds a batch of observations in any of the `PokerEngine.cards.OBS_MODES`"""
+        if obs_mode == 'index':
+            return self.index_observations(boards, cards, steps)
+        if obs_mode == 'onehot':
+            return self.onehot_observations(boards, cards)
+        return self.encode_observations(boards, cards, steps)
+
+    def _counts(self, board):
+        return [size - board[row].count(EMPTY) for size, row in zip(self.config.row_sizes, self.row_slices)]
+
+    def decode_indices(self, indices):
+        """The card to be placed, board, row counts and step of one 'index' observation"""
+        board = [int(card) for card in indices[:self.n_slots]]
+        return int(indices[self.n_slots]), board, self._counts(board), int(indices[self.n_slots + 1])
+
+    def decode_onehot(self, onehot):
+        """The card to be placed, board, row counts and step of one 'onehot' observation, the cards of each row
+        are placed in index order"""
+        board, counts = [], []
+        for r, size in enumerate(self.config.row_sizes):
+            row = np.flatnonzero(onehot[r * N_CARDS:(r + 1) * N_CARDS]).tolist()
+            counts.append(len(row))
+            board += row + [EMPTY] * (size - len(row))
+        card = int(np.flatnonzero(onehot[self.n_rows * N_CARDS:])[0])
+        return card, board, counts, sum(counts)
+
+    def decode_observation(self, observation):
+        """The card to be placed, board, row counts and step of one bit observation, assuming each row is filled
+        from the left"""
+        observation = np.asarray(observation)
+        cards = decode(observation[:self.player_card.stop]).tolist()
+        board = cards[:self.n_slots]
+        step = int(observation[self.step] @ BIT_WEIGHTS[-self.config.step_bits:])
+        return cards[self.n_slots], board, self._counts(board), step
+
+
+_CARD_RANKS = RANKS.tolist()
+_CARD_SUITS = SUITS.tolist()
+_CARD_PRIMES = PRIMES[RANKS].tolist()
+_RANK_CLASS_MAX = RANK_CLASS_MAX.tolist()
+
+# treys rank classes of the made hands a partial row can already hold
+FOUR_OF_A_KIND, FULL_HOUSE, THREE_OF_A_KIND, TWO_PAIR, PAIR, HIGH_CARD = 2, 3, 6, 7, 8, 9
+
+
+class RowStrength:
+    """Hand state of one row, updated card by card
+
+    Tracks the rank and suit counts of the row, the product of its rank primes and its 13 bit rank pattern,
+    which are exactly the keys of treys' lookup tables, so a full row is ranked with one table lookup. Rows of
+    three cards, the front row of `OFC`, are ranked on the same scale by
+    `PokerEngine.evaluation.THREE_CARD_RANK_DICT`.
+
+    :param cards: iterable      card indices already in the row
+    :param size: int            number of cards in the full row, 3 or 5
+    """
+    __slots__ = ('size', 'n_cards', 'rank_counts', 'suit_counts', 'rank_bits', 'product', 'n_pairs', 'n_trips', 'n_quads')
+
+    def __init__(self, cards=(), size=5):
+        self.size = size
+        self.n_cards = 0
+        self.rank_counts = [0] * 13
+        self.suit_counts = [0] * 4
+        self.rank_bits = 0
+        self.product = 1
+        self.n_pairs = self.n_trips = self.n_quads = 0
+        for card in cards:
+            self.add(card)
+
+    def copy(self):
+        other = RowStrength.__new__(RowStrength)
+        other.size = self.size
+        other.n_cards = self.n_cards
+        other.rank_counts = list(self.rank_counts)
+        other.suit_counts = list(self.suit_counts)
+        other.rank_bits = self.rank_bits
+        other.product = self.product
+        other.n_pairs, other.n_trips, other.n_quads = self.n_pairs, self.n_trips, self.n_quads
+        return other
+
+    def add(self, card):
+        rank = _CARD_RANKS[card]
+        count = self.rank_counts[rank]
+        self.rank_counts[rank] = count + 1
+        # moving a rank from count to count + 1 of a kind
+        if count == 1:
+            self.n_pairs += 1
+        elif count == 2:
+            self.n_pairs -= 1
+            self.n_trips += 1
+        elif count == 3:
+            self.n_trips -= 1
+            self.n_quads += 1
+        self.suit_counts[_CARD_SUITS[card]] += 1
+        self.rank_bits |= 1 << rank
+        self.product *= _CARD_PRIMES[card]
+        self.n_cards += 1
+
+    @property
+    def full(self):
+        return self.n_cards == self.size
+
+    @property
+    def category(self):
+        """The best treys rank class the cards already make, a lower bound on the strength of the full row"""
+        if self.full:
+            return self.rank_class
+        if self.n_quads:
+            return FOUR_OF_A_KIND
+        if self.n_trips:
+            return FULL_HOUSE if self.n_pairs else THREE_OF_A_KIND
+        if self.n_pairs:
+            return TWO_PAIR if self.n_pairs > 1 else PAIR
+        return HIGH_CARD
+
+    @property
+    def rank(self):
+        """treys rank of a full row, lower is stronger"""
+        if self.size == 3:
+            return THREE_CARD_RANK_DICT[self.product]
+        if max(self.suit_counts) == self.size:
+            return FLUSH_RANK_LIST[self.rank_bits]
+        return PRIME_PRODUCT_RANK_DICT[self.product]
+
+    @property
+    def rank_class(self):
+        return bisect.bisect_left(_RANK_CLASS_MAX, self.rank) + 1
+
+    def features(self):
+        return {'n_cards': self.n_cards, 'full': self.full, 'category': self.category,
+                'max_suit_count': max(self.suit_counts), 'max_rank_count': max(self.rank_counts)}
+
+
+class BoardState:
+    """Integer state of a single game of any GameConfig
+
+    Holds the card index in each board slot, the fill count of each row, the card to be placed and the step
+    counter, plus a `RowStrength` per row that is updated as cards are placed. Observations are only built when
+    one of the to_ methods is called.
+    """
+    __slots__ = ('engine', 'board', 'counts', 'card', 'step', 'strength')
+
+    def __init__(self, engine, card, board=None, counts=None, step=0):
+        self.engine = engine
+        self.board = [EMPTY] * engine.n_slots if board is None else board
+        self.counts = [0] * engine.n_rows if counts is None else counts
+        self.card = card
+        self.step = step
+        self.strength = [RowStrength((c for c in self.board[row] if c != EMPTY), size)
+                         for row, size in zip(engine.row_slices, engine.config.row_sizes)]
+
+    def copy(self):
+        state = self.__class__.__new__(self.__class__)
+        state.engine = self.engine
+        state.board = list(self.board)
+        state.counts = list(self.counts)
+        state.card = self.card
+        state.step = self.step
+        state.strength = [row.copy() for row in self.strength]
+        return state
+
+    def place(self, action):
+        """Places the current card in row `action` and advances the step counter
+
+        :returns placed: bool   False if the row was already full, in which case nothing changes
+        """
+        filled = self.counts[action]
+        start, size = self.engine.row_bounds[action]
+        if filled == size:
+            return False
+        self.board[start + filled] = self.card
+        self.counts[action] = filled + 1
+        self.strength[action].add(self.card)
+        self.step += 1
+        return True
+
+    @property
+    def is_over(self):
+        return self.step == self.engine.n_slots
+
+    def rows(self):
+        return [self.board[row] for row in self.engine.row_slices]
+
+    def row_full(self, row):
+        return self.counts[row] == self.engine.row_bounds[row][1]
+
+    def score(self):
+        """Terminal reward of a full board from the row strengths, as `Engine.score_ranks` scores a batch"""
+        config = self.engine.config
+        ranks = [row.rank for row in self.strength]
+        for front, back in zip(ranks[:-1], ranks[1:]):
+            if front < back or (front == back and config.ties_foul):
+                return config.foul_reward
+        if self.engine.royalties is None:
+            return config.valid_reward
+        return config.valid_reward + sum(int(table[rank]) for table, rank in zip(self.engine.royalties, ranks))
+
+    def features(self):
+        """Per row hand features of the cards placed so far, e.g. for reward shaping"""
+        return [row.features() for row in self.strength]
+
+    def to_observation(self, out=None):
+        engine = self.engine
+        if out is None:
+            out = np.empty(engine.obs_size, dtype='int')
+        encode(self.board, out[:engine.n_slots * CARD_BITS])
+        out[engine.player_card] = BIT_TABLE[self.card]
+        out[engine.step] = engine.step_table[self.step]
+        return out
+
+    def to_indices(self, out=None):
+        if out is None:
+            return np.array(self.board + [self.card, self.step], dtype=np.uint8)
+        n_slots = self.engine.n_slots
+        out[:n_slots] = self.board
+        out[n_slots] = self.card
+        out[n_slots + 1] = self.step
+        return out
+
+    def to_onehot(self, out=None):
+        if out is None:
+            rows = [encode_onehot(row) for row in self.rows()]
+            return np.concatenate(rows + [encode_onehot([self.card])])
+        out[:] = 0
+        for r, row in enumerate(self.rows()):
+            out[[r * N_CARDS + card for card in row if card != EMPTY]] = 1
+        out[self.engine.n_rows * N_CARDS + self.card] = 1
+        return out
+
+    @classmethod
+    def from_indices(cls, engine, indices):
+        return cls(engine, *engine.decode_indices(indices))
+
+    @classmethod
+    def from_onehot(cls, engine, onehot):
+        return cls(engine, *engine.decode_onehot(onehot))
+
+    @classmethod
+    def from_observation(cls, engine, observation):
+        return cls(engine, *engine.decode_observation(observation))
@@ -0,0 +1,142 @@
+"""Opt-in timing of the phases of env steps
+
+A `Profiler` times named methods by replacing them on one object with timed versions, so an env that is not
+instrumented runs its own methods unchanged and pays nothing. The envs take a `profiler` constructor kwarg
+(also through `gym.make`) and instrument the methods in their PROFILED_PHASES:
+
+    profiler = Profiler(log_every=100000)
+    env = gym.make('OpenFaceSimpleEnv-v1', profiler=profiler)
+    ...
+    profiler.to_dict()      # count, mean, p50, p99 and max per phase
+    profiler.log_line()     # one line summary
+
+Code outside the envs can time a block with `with profiler.phase('predict'):`.
+"""
+import functools
+import itertools
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """Counts latencies in power of two microsecond buckets, bucket i holds latencies below 2**i us"""
+
+    N_BUCKETS = 32
+
+    def __init__(self):
+        self.counts = [0] * self.N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        self.counts[min(int(us).bit_length(), self.N_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += us
+        self.max = max(self.max, us)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile, in microseconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        for bucket, cumulative in enumerate(itertools.accumulate(self.counts)):
+            if cumulative >= rank:
+                return float(2 ** bucket)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / max(self.count, 1),
+            'p50_us': self.percentile(50),
+            'p99_us': self.percentile(99),
+            'max_us': self.max,
+            'buckets': {f'<{2 ** i}us': c for i, c in enumerate(self.counts) if c},
+        }
+
+
+class Profiler:
+    """Latency histograms and counters of named phases
+
+    :param log_every: int       print a summary line every log_every calls of the 'step' phase, 0 never
+    :param log: callable        receives the summary lines, print by default
+    """
+
+    def __init__(self, log_every=0, log=print):
+        self.histograms = defaultdict(LatencyHistogram)
+        self.counters = Counter()
+        self.log_every = log_every
+        self.log = log
+
+    def record(self, name, seconds):
+        self.histograms[name].record(seconds)
+        if name == 'step' and self.log_every and self.histograms[name].count % self.log_every == 0:
+            self.log(self.log_line())
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name, function):
+        """Returns function wrapped to record its run time under name"""
+        clock, record = time.perf_counter, self.record
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+        return wrapper
+
+    def instrument(self, obj, names):
+        """Replaces the named methods of obj, only this instance, with timed versions
+
+        Phase names drop the leading underscore of private methods, '_draw' is recorded as 'draw'.
+        """
+        for name in names:
+            setattr(obj, name, self.timed(name.lstrip('_'), getattr(obj, name)))
+        return obj
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    def to_dict(self):
+        return {
+            'phases': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            'counters': dict(self.counters),
+        }
+
+    def log_line(self):
+        phases = " ".join(f"{name} {h.total / max(h.count, 1):.1f}us/{h.count}"
+                          for name, h in self.histograms.items())
+        counters = " ".join(f"{name} {value}" for name, value in self.counters.items())
+        return f"[PROFILE] {phases} {counters}".rstrip()
+
+    def write_tensorboard(self, writer, step):
+        """Adds the mean and p99 of every phase as scalars to a TensorFlow 1 summary writer
+
+        :param writer: tf.summary.FileWriter   e.g. the writer stable-baselines logs to under TENSORBOARD_DIR
+        :param step: int                       global step of the scalars
+        """
+        import tensorflow as tf
+        values = []
+        for name, histogram in self.histograms.items():
+            values.append(tf.Summary.Value(tag=f'profile/{name}_mean_us',
+                                           simple_value=histogram.total / max(histogram.count, 1)))
+            values.append(tf.Summary.Value(tag=f'profile/{name}_p99_us', simple_value=histogram.percentile(99)))
+        for name, value in self.counters.items():
+            values.append(tf.Summary.Value(tag=f'profile/{name}', simple_value=value))
+        writer.add_summary(tf.Summary(value=values), step)
@@ -0,0 +1,181 @@
+"""Text and image rendering of open face boards, one board or a whole batch at once
+
+Every card is drawn from a glyph built once at import: the treys pretty string of the card for text and a small
+RGB tile for images, with the rank in the colour of the suit (spades black, hearts red, diamonds blue and clubs
+green) above a pip of the suit. Rendering a board is then a join of strings or one fancy indexing of the tile
+table, so a batch of N boards becomes a single (N, height, width, 3) array.
+
+    mode        render_board returns
+    'human'     None, the text is printed
+    'ansi'      the text, the card to be placed above the rows of the board
+    'rgb_array' an (height, width, 3) uint8 image, the card to be placed above the rows of the board
+"""
+import numpy as np
+import treys
+
+from PokerEngine.cards import CARD_INTS, EMPTY, N_CARDS, RANKS, SUITS
+
+RENDER_MODES = ('human', 'ansi', 'rgb_array')
+
+# CARD_GLYPHS[c] is the text of card index c, EMPTY an open slot
+CARD_GLYPHS = tuple(treys.Card.int_to_pretty_str(int(card)) for card in CARD_INTS[:N_CARDS]) + (' __ ',)
+RULE = '-----------'
+
+# 3x5 pixel rank glyphs, deuce to ace, and 3x3 suit pips, spades, hearts, diamonds and clubs
+_RANK_FONT = (
+    '111001111100111', '111001111001111', '101101111001001', '111100111001111', '111100111101111',
+    '111001001001001', '111101111101111', '111101111001111', '111010010010010', '001001001101111',
+    '111101101111001', '101101110101101', '010101111101101',
+)
+_SUIT_FONT = ('010111111', '101111010', '010111010', '111111010')
+SUIT_COLOURS = np.array([[0, 0, 0], [200, 0, 0], [0, 0, 200], [0, 140, 0]], dtype=np.uint8)
+CARD_COLOUR = (255, 255, 255)
+SLOT_COLOUR = (200, 200, 200)
+TABLE_COLOUR = (30, 100, 60)
+# a tile is a 7x11 card and a one pixel margin of table on its right and bottom
+TILE_HEIGHT, TILE_WIDTH = 12, 8
+BLANK = N_CARDS + 1
+
+
+def _build_tiles():
+    """TILES[c] is the tile of card index c, EMPTY an open slot and BLANK the table where a row has no slot"""
+    tiles = np.empty((N_CARDS + 2, TILE_HEIGHT, TILE_WIDTH, 3), dtype=np.uint8)
+    tiles[:] = TABLE_COLOUR
+    tiles[:N_CARDS, :-1, :-1] = CARD_COLOUR
+    tiles[EMPTY, :-1, :-1] = SLOT_COLOUR
+    rank_masks = np.array([[bit == '1' for bit in glyph] for glyph in _RANK_FONT]).reshape(-1, 5, 3)
+    suit_masks = np.array([[bit == '1' for bit in glyph] for glyph in _SUIT_FONT]).reshape(-1, 3, 3)
+    cards = np.arange(N_CARDS)
+    colours = SUIT_COLOURS[SUITS][:, None, None]
+    rank_area = tiles[cards, 1:6, 2:5]
+    tiles[cards, 1:6, 2:5] = np.where(rank_masks[RANKS][..., None], colours, rank_area)
+    suit_area = tiles[cards, 7:10, 2:5]
+    tiles[cards, 7:10, 2:5] = np.where(suit_masks[SUITS][..., None], colours, suit_area)
+    return tiles
+
+
+TILES = _build_tiles()
+
+
+def check_render_mode(mode):
+    if mode not in RENDER_MODES:
+        raise ValueError(f"render mode must be one of {RENDER_MODES}, got {mode!r}")
+
+
+def check_render_every(render_every):
+    if render_every < 1:
+        raise ValueError(f"render_every must be at least 1, got {render_every!r}")
+    return render_every
+
+
+def board_text(rows, card, step=None):
+    """The text of one board, as the rows of card indices and the card to be placed"""
+    lines = [RULE]
+    if step is not None:
+        lines.append(f"Step: {step}")
+    lines += ["Player card", CARD_GLYPHS[card], "Board"]
+    lines += [" ".join([CARD_GLYPHS[c] for c in row]) for row in rows]
+    lines.append(RULE)
+    return "\n".join(lines)
+
+
+def text_grid(texts, columns=4, gap=4):
+    """Lays out blocks of text side by side, columns blocks to a line"""
+    blocks = [text.split("\n") for text in texts]
+    lines = []
+    for start in range(0, len(blocks), columns):
+        group = blocks[start:start + columns]
+        height = max(len(block) for block in group)
+        # the visible width, treys may colour the suits with escape codes that take no room
+        widths = [max(_visible_len(line) for line in block) for block in group]
+        for i in range(height):
+            cells = [block[i] if i < len(block) else '' for block in group]
+            lines.append((' ' * gap).join(cell + ' ' * (width - _visible_len(cell))
+                                          for cell, width in zip(cells, widths)).rstrip())
+    return "\n".join(lines)
+
+
+def _visible_len(text):
+    length, escape = 0, False
+    for char in text:
+        if char == '\x1b':
+            escape = True
+        elif escape:
+            escape = char != 'm'
+        else:
+            length += 1
+    return length
+
+
+def board_cells(boards, cards, row_sizes):
+    """(N, n_rows + 1, max row size) tile indices: the card to be placed, then each row padded with BLANK"""
+    boards = np.asarray(boards)
+    n = len(boards)
+    cells = np.full((n, len(row_sizes) + 1, max(row_sizes)), BLANK, dtype=np.intp)
+    cells[:, 0, 0] = cards
+    start = 0
+    for row, size in enumerate(row_sizes):
+        cells[:, row + 1, :size] = boards[:, start:start + size]
+        start += size
+    return cells
+
+
+def board_images(boards, cards, row_sizes=(5, 5), scale=1):
+    """Images of a batch of boards
+
+    :param boards: np.array     (N, n_slots) card indices, EMPTY for open slots
+    :param cards: np.array      (N,) card indices of the cards to be placed
+    :param row_sizes: tuple     slots of each row, front to back
+    :param scale: int           pixels per tile pixel
+
+    :returns images: np.array   (N, height, width, 3) uint8
+    """
+    cells = board_cells(boards, cards, row_sizes)
+    n, n_rows, n_columns = cells.shape
+    images = TILES[cells].transpose(0, 1, 3, 2, 4, 5).reshape(n, n_rows * TILE_HEIGHT, n_columns * TILE_WIDTH, 3)
+    if scale > 1:
+        images = images.repeat(scale, axis=1).repeat(scale, axis=2)
+    return images
+
+
+def image_grid(images, columns=4):
+    """Tiles a batch of (N, height, width, 3) images into one image, columns images to a row"""
+    images = np.asarray(images)
+    n, height, width, _ = images.shape
+    columns = min(columns, n)
+    rows = -(-n // columns)
+    grid = np.empty((rows * columns, height, width, 3), dtype=np.uint8)
+    grid[:] = TABLE_COLOUR
+    grid[:n] = images
+    return grid.reshape(rows, columns, height, width, 3).transpose(0, 2, 1, 3, 4).reshape(
+        rows * height, columns * width, 3)
+
+
+def render_boards(boards, cards, steps=None, row_sizes=(5, 5), mode='ansi', columns=4, scale=1):
+    """Renders a batch of boards into one text or image grid, see the module docstring for the modes"""
+    check_render_mode(mode)
+    if mode == 'rgb_array':
+        return image_grid(board_images(boards, cards, row_sizes, scale), columns)
+    boards, cards = np.asarray(boards).tolist(), np.asarray(cards).tolist()
+    steps = [None] * len(boards) if steps is None else np.asarray(steps).tolist()
+    bounds = np.cumsum((0,) + tuple(row_sizes)).tolist()
+    texts = [board_text([board[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])], card, step)
+             for board, card, step in zip(boards, cards, steps)]
+    text = text_grid(texts, columns)
+    if mode == 'human':
+        print(text)
+        return None
+    return text
+
+
+def render_board(rows, card, step=None, mode='ansi', scale=1):
+    """Renders one board given as the rows of card indices and the card to be placed"""
+    check_render_mode(mode)
+    if mode == 'rgb_array':
+        board = [c for row in rows for c in row]
+        return board_images([board], [card], tuple(len(row) for row in rows), scale)[0]
+    text = board_text(rows, card, step)
+    if mode == 'human':
+        print(text)
+        return None
+    return text
@@ -0,0 +1,173 @@
+"""Monte Carlo estimates of action values for simple Open Face positions
+
+Each rollout places the current card in the chosen row and plays the game out, many games at a time as
+NumPy batches. Rollouts are split into chunks that run in a process pool. Every chunk gets its own seed
+spawned from one `np.random.SeedSequence`, so results do not depend on how chunks land on workers.
+
+`iter_action_values` yields updated estimates with confidence intervals as chunks finish, so callers can
+stop as soon as the intervals of the two actions separate. `estimate_action_values` does exactly that.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+import numpy as np
+
+from PokerEngine import ofc
+from PokerEngine.cards import N_CARDS, shuffled_decks
+
+
+class ActionValueEstimate(namedtuple('ActionValueEstimate', ['means', 'lower', 'upper', 'counts'])):
+    """Mean reward, confidence bounds and number of rollouts for the front (0) and back (1) row"""
+
+    @property
+    def separated(self):
+        """True once the confidence intervals of the two actions no longer overlap"""
+        return bool(self.lower[0] > self.upper[1] or self.lower[1] > self.upper[0])
+
+    @property
+    def best_action(self):
+        return int(np.argmax(self.means))
+
+
+def _remaining_decks(state, n, rng):
+    """(n, k) shuffled card indices that are not on the board and not the current card"""
+    used = np.zeros(N_CARDS + 1, dtype=bool)
+    used[state.board] = True
+    used[state.card] = True
+    remaining = np.flatnonzero(~used[:N_CARDS])
+    return remaining[np.argsort(rng.random((n, len(remaining))), axis=1)]
+
+
+def _random_rollouts(state, n, rng):
+    """Rewards of n games finished by a policy that picks uniformly among rows with open slots
+
+    Cards are exchangeable, so under such a policy the cards that end up in each row are a uniform random
+    split of the cards dealt. The first cards of each shuffled deck fill the front row, the rest the back.
+    """
+    board = np.array(state.board, dtype=np.intp)
+    decks = _remaining_decks(state, n, rng)
+    open_front = ofc.ROW_SIZE - state.counts[0]
+    open_back = ofc.ROW_SIZE - state.counts[1]
+    boards = np.tile(board, (n, 1))
+    boards[:, state.counts[0]:ofc.ROW_SIZE] = decks[:, :open_front]
+    boards[:, ofc.ROW_SIZE + state.counts[1]:] = decks[:, open_front:open_front + open_back]
+    return ofc.score_boards(boards).astype(np.float64)
+
+
+def _policy_rollouts(state, n, rng, policy):
+    """Rewards of n games finished by `policy`, which maps an (m, 356) batch of observations to m actions"""
+    boards = np.tile(np.array(state.board, dtype=np.uint8), (n, 1))
+    counts = np.tile(np.array(state.counts, dtype=np.int8), (n, 1))
+    decks = _remaining_decks(state, n, rng).astype(np.uint8)
+    steps = np.full(n, state.step, dtype=np.int8)
+    rewards = np.zeros(n)
+    active = np.arange(n)
+    draw = 0
+    while active.size:
+        cards = decks[active, draw]
+        actions = np.asarray(policy(ofc.encode_observations(boards[active], cards, steps[active])), dtype=np.intp)
+        sub_boards, sub_counts = boards[active], counts[active]
+        placed, _ = ofc.place_cards(sub_boards, sub_counts, actions.reshape(-1), cards)
+        boards[active], counts[active] = sub_boards, sub_counts
+        steps[active] += placed
+        rewards[active[~placed]] = ofc.FULL_ROW_REWARD
+        finished = placed & (steps[active] == ofc.N_SLOTS)
+        if finished.any():
+            rewards[active[finished]] = ofc.score_boards(boards[active[finished]])
+        active = active[placed & ~finished]
+        draw += 1
+    return rewards
+
+
+def rollout_rewards(state, action, n, rng, policy='random'):
+    """Rewards of n rollouts that place the current card of `state` in row `action` and play on
+
+    :param state: GameState
+    :param action: int          0 for the front row, 1 for the back row
+    :param n: int               number of rollouts
+    :param rng: np.random.Generator
+    :param policy: str or callable  'random' or a function from an (m, 356) observation batch to m actions
+    """
+    state = state.copy()
+    if not state.place(action):
+        return np.full(n, float(ofc.FULL_ROW_REWARD))
+    if state.is_over:
+        return np.full(n, float(state.score()))
+    # the rollouts deal the next card themselves
+    state.card = ofc.EMPTY
+    if policy == 'random':
+        return _random_rollouts(state, n, rng)
+    return _policy_rollouts(state, n, rng, policy)
+
+
+def _rollout_chunk(state, action, n, seed, policy):
+    rewards = rollout_rewards(state, action, n, np.random.default_rng(seed), policy)
+    return action, len(rewards), rewards.sum(), np.square(rewards).sum()
+
+
+def _estimate(sums, squares, counts, z):
+    means = sums / np.maximum(counts, 1)
+    variances = np.maximum(squares / np.maximum(counts, 1) - means ** 2, 0)
+    half_widths = z * np.sqrt(variances / np.maximum(counts, 1))
+    return ActionValueEstimate(means, means - half_widths, means + half_widths, counts.copy())
+
+
+def iter_action_values(obs, n_rollouts, policy='random', chunk_size=10000, n_workers=None, seed=None,
+                       confidence=0.95):
+    """Streams Monte Carlo estimates of both action values for a position
+
+    Yields an ActionValueEstimate each time a chunk of rollouts finishes. Stop iterating at any point to
+    cancel the chunks that have not started yet.
+
+    :param obs: np.array or GameState   an observation in any obs_mode, or the game state itself
+    :param n_rollouts: int      rollouts per action
+    :param policy: str or callable  'random' or a picklable function from observation batches to actions
+    :param chunk_size: int      rollouts per task handed to a worker
+    :param n_workers: int       worker processes, 0 runs every chunk in this process
+    :param seed: int            seed of the SeedSequence the chunk seeds are spawned from
+    :param confidence: float    coverage of the normal approximation confidence intervals
+    """
+    state = obs if isinstance(obs, ofc.GameState) else ofc.state_from_observation(obs)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    sizes = [min(chunk_size, n_rollouts - start) for start in range(0, n_rollouts, chunk_size)]
+    tasks = [(action, size) for size in sizes for action in (0, 1)]
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+
+    sums, squares, counts = np.zeros(2), np.zeros(2), np.zeros(2, dtype=np.int64)
+
+    def update(result):
+        action, count, total, square = result
+        sums[action] += total
+        squares[action] += square
+        counts[action] += count
+        return _estimate(sums, squares, counts, z)
+
+    if n_workers == 0:
+        for (action, size), task_seed in zip(tasks, seeds):
+            yield update(_rollout_chunk(state, action, size, task_seed, policy))
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(_rollout_chunk, state, action, size, task_seed, policy)
+                   for (action, size), task_seed in zip(tasks, seeds)]
+        try:
+            for future in as_completed(futures):
+                yield update(future.result())
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def estimate_action_values(obs, n_rollouts, policy='random', stop_when_separated=False, **kwargs):
+    """Monte Carlo estimate of both action values for a position
+
+    Takes the same arguments as `iter_action_values`. With stop_when_separated, returns as soon as the
+    confidence intervals of the two actions no longer overlap.
+
+    :returns estimate: ActionValueEstimate
+    """
+    estimate = None
+    for estimate in iter_action_values(obs, n_rollouts, policy, **kwargs):
+        if stop_when_separated and estimate.counts.min() > 0 and estimate.separated:
+            break
+    return estimate
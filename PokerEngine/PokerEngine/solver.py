@@ -0,0 +1,107 @@
+"""Exact expected values and optimal play for the simple Open Face game
+
+The solver runs expectimax over the rest of the game: the agent picks the row with the higher expected
+reward, and every card still in the deck is equally likely to be dealt next. Two properties keep it tractable:
+
+* Only the set of cards in each row matters for the final score, so rows are kept as sorted tuples.
+* Relabelling the suits of every card on the board does not change any hand rank, so each board is mapped to
+  the smallest of its 24 suit relabellings before it is looked up.
+
+Values of boards waiting for the next card are memoised by their canonical key (see `PokerEngine.transposition`)
+in a `TranspositionCache`, which can be shared between solvers and saved to disk. Once a
+row is full, every remaining card has to go to the other row, so the value is the mean score over all
+completions of that row, evaluated as one batch with `evaluate_batch`.
+
+Exact values are cheap from about 6 placed cards on; from an empty board the game tree is far too large.
+"""
+import itertools
+import numpy as np
+
+from PokerEngine import ofc
+from PokerEngine.cards import EMPTY, N_CARDS
+from PokerEngine.evaluation import evaluate_batch
+from PokerEngine.transposition import TranspositionCache, canonical_key
+
+
+def state_rows(state):
+    """Splits a GameState into its front and back rows as sorted tuples, dropping empty slots"""
+    front, back = state.rows()
+    return tuple(sorted(c for c in front if c != EMPTY)), tuple(sorted(c for c in back if c != EMPTY))
+
+
+class Solver:
+    """Exact expectimax solver with a bounded transposition table
+
+    :param max_entries: int             number of boards kept in the transposition table before the least
+                                        recently used ones are evicted
+    :param table: TranspositionCache    optional cache to use instead, e.g. one shared with other solvers or
+                                        loaded from a saved table
+    """
+
+    def __init__(self, max_entries=1000000, table=None):
+        self.table = TranspositionCache(max_entries) if table is None else table
+
+    @property
+    def hits(self):
+        return self.table.hits
+
+    @property
+    def misses(self):
+        return self.table.misses
+
+    def _completion_value(self, full_row, open_row, open_is_front, deck):
+        """Mean reward over every way to fill open_row from the deck"""
+        missing = ofc.ROW_SIZE - len(open_row)
+        combos = np.array(list(itertools.combinations(deck, missing)), dtype=np.intp).reshape(-1, missing)
+        hands = np.concatenate([np.tile(open_row, (len(combos), 1)).astype(np.intp), combos], axis=1)
+        open_ranks, _ = evaluate_batch(hands)
+        full_rank, _ = evaluate_batch(np.array([full_row]))
+        front_ranks, back_ranks = (open_ranks, full_rank) if open_is_front else (full_rank, open_ranks)
+        return float(np.where(front_ranks > back_ranks, ofc.WIN_REWARD, ofc.LOSS_REWARD).mean())
+
+    def _board_value(self, front, back):
+        """Expected reward of a board before the next card is dealt, under optimal play"""
+        key = canonical_key(front, back)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+
+        used = set(front) | set(back)
+        deck = [c for c in range(N_CARDS) if c not in used]
+        if len(front) == ofc.ROW_SIZE and len(back) == ofc.ROW_SIZE:
+            value = float(ofc.score_boards(np.array([front + back]))[0])
+        elif len(front) == ofc.ROW_SIZE:
+            value = self._completion_value(front, back, False, deck)
+        elif len(back) == ofc.ROW_SIZE:
+            value = self._completion_value(back, front, True, deck)
+        else:
+            value = sum(max(self._action_values(front, back, card)) for card in deck) / len(deck)
+        self.table.put(key, value)
+        return value
+
+    def _action_values(self, front, back, card):
+        values = []
+        for action, row in enumerate((front, back)):
+            if len(row) == ofc.ROW_SIZE:
+                values.append(float(ofc.FULL_ROW_REWARD))
+                continue
+            placed = tuple(sorted(row + (card,)))
+            values.append(self._board_value(placed, back) if action == 0 else self._board_value(front, placed))
+        return values
+
+    def action_values(self, obs):
+        """Expected reward of placing the current card in the front (0) and back (1) row
+
+        :param obs: np.array or GameState   an observation in any obs_mode, or the game state itself
+        """
+        state = obs if isinstance(obs, ofc.GameState) else ofc.state_from_observation(obs)
+        front, back = state_rows(state)
+        return np.array(self._action_values(front, back, state.card))
+
+    def value(self, obs):
+        """Expected reward of the position under optimal play"""
+        return float(self.action_values(obs).max())
+
+    def best_action(self, obs):
+        """The row with the highest expected reward, 0 for front and 1 for back"""
+        return int(self.action_values(obs).argmax())
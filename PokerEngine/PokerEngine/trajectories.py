@@ -0,0 +1,315 @@
+"""Append-only logs of every transition of long training or evaluation runs
+
+`TrajectoryRecorder` wraps an env and streams each (obs, action, reward, done) transition into a
+`TrajectoryWriter`, which fills fixed size column chunks in memory and hands every full chunk to a background
+thread that compresses it into its own .npz file. The step loop only copies one row into the chunk, and at most
+two chunks are held in memory however long the run is. Observations are stored as card indices (the 'index'
+obs_mode) whatever the env's obs_mode, 12 bytes for an open face position instead of 356 bits.
+
+A log is a directory:
+    manifest.json           the columns, their dtypes and shapes and the chunks written so far
+    chunk_000000.npz        one array per column: obs, action, reward, done and episode, the episode number
+
+The manifest is replaced after each chunk is written, so a log is readable while it is being written and a
+crash loses at most the chunks not yet flushed. Opening a writer on an existing log appends to it.
+
+    env = TrajectoryRecorder(gym.make('OpenFaceSimpleEnv-v1'), 'logs/trajectories/run-0')
+    ...
+    env.close()
+    log = TrajectoryLog('logs/trajectories/run-0')
+    for episode in log.iter_episodes():     # one chunk in memory at a time
+        ...
+    rewards = log.memmap('reward')          # the whole column, memory-mapped
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from PokerEngine.cards import CARD_BITS, decode
+
+MANIFEST = 'manifest.json'
+CACHE_DIR = 'cache'
+FORMAT_VERSION = 1
+CHUNK_SIZE = 65536
+
+
+def _copy(obs, out=None):
+    if out is None:
+        return np.array(obs)
+    out[...] = obs
+    return out
+
+
+def index_encoder(env):
+    """A function from the observations of env to the ones stored in its log, and the name of their encoding
+
+    The function takes an observation and an optional out array to write into, as `PokerEngine.cards.encode`.
+    Card indices come from the 'index' observations themselves, the game state of the open face envs or by
+    decoding bits observations made only of cards. Observations of other envs are stored as they are.
+    """
+    unwrapped = getattr(env, 'unwrapped', env)
+    obs_mode = getattr(unwrapped, 'obs_mode', None)
+    if obs_mode == 'index':
+        return _copy, 'index'
+    if hasattr(getattr(unwrapped, 'state', None), 'to_indices'):
+        return lambda obs, out=None: unwrapped.state.to_indices(out), 'index'
+    shape = unwrapped.observation_space.shape
+    if obs_mode == 'bits' and len(shape) == 1 and shape[0] % CARD_BITS == 0:
+        return lambda obs, out=None: _copy(decode(obs).astype(np.uint8), out), 'index'
+    return _copy, obs_mode or 'raw'
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class TrajectoryWriter:
+    """Buffers transitions into chunks of columns and writes each full chunk on a background thread
+
+    :param path: str            log directory, created if needed and appended to if it holds a log
+    :param obs_shape: tuple     shape of one stored observation
+    :param obs_dtype: np.dtype  dtype of the stored observations
+    :param action_dtype: np.dtype   dtype of the actions
+    :param chunk_size: int      transitions per chunk
+    :param compress: bool       deflate the chunk files, otherwise they are stored uncompressed
+    :param metadata: dict       JSON metadata saved in the manifest, e.g. the env id and the encoding
+    """
+
+    def __init__(self, path, obs_shape, obs_dtype=np.uint8, action_dtype=np.int64, chunk_size=CHUNK_SIZE,
+                 compress=True, metadata=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.dtypes = {
+            'obs': (np.dtype(obs_dtype), tuple(obs_shape)),
+            'action': (np.dtype(action_dtype), ()),
+            'reward': (np.dtype(np.float32), ()),
+            'done': (np.dtype(bool), ()),
+            'episode': (np.dtype(np.int64), ()),
+        }
+        os.makedirs(path, exist_ok=True)
+        self.manifest = self._open_manifest(metadata or {})
+        chunks = self.manifest['chunks']
+        # episodes cut off by the end of an earlier run are not continued, the new run starts the next one
+        self.episode = chunks[-1]['episodes'][1] + 1 if chunks else 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.columns = None
+        self.size = 0
+        self._new_chunk()
+
+    def _open_manifest(self, metadata):
+        columns = {name: {'dtype': dtype.str, 'shape': list(shape)} for name, (dtype, shape) in self.dtypes.items()}
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            manifest = {'version': FORMAT_VERSION, 'columns': columns, 'metadata': metadata, 'chunks': []}
+            _write_json(manifest_path, manifest)
+            return manifest
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['columns'] != columns:
+            raise ValueError(f"{self.path} holds a log with columns {manifest['columns']}, not {columns}")
+        return manifest
+
+    def _new_chunk(self):
+        self.columns = {name: np.empty((self.chunk_size,) + shape, dtype=dtype)
+                        for name, (dtype, shape) in self.dtypes.items()}
+        self.size = 0
+
+    def append(self, obs, action, reward, done):
+        """Records one transition, obs is the observation the action was taken on"""
+        i = self.size
+        columns = self.columns
+        columns['obs'][i] = obs
+        columns['action'][i] = action
+        columns['reward'][i] = reward
+        columns['done'][i] = done
+        columns['episode'][i] = self.episode
+        self.size += 1
+        if done:
+            self.episode += 1
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Hands the buffered transitions to the background writer as a chunk"""
+        if not self.size:
+            return
+        chunk = {name: column[:self.size] for name, column in self.columns.items()}
+        # waiting for the previous chunk bounds the memory to two chunks and raises its write errors here
+        self.wait()
+        self.pending = self.executor.submit(self._write_chunk, chunk)
+        self._new_chunk()
+
+    def wait(self):
+        """Blocks until the chunks handed to the background writer are on disk"""
+        if self.pending is not None:
+            self.pending.result()
+            self.pending = None
+
+    def _write_chunk(self, chunk):
+        chunks = self.manifest['chunks']
+        name = f'chunk_{len(chunks):06d}.npz'
+        tmp_path = os.path.join(self.path, f'{name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'wb') as f:
+            (np.savez_compressed if self.compress else np.savez)(f, **chunk)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        episodes = chunk['episode']
+        chunks.append({'file': name, 'records': len(episodes), 'episodes': [int(episodes[0]), int(episodes[-1])]})
+        _write_json(os.path.join(self.path, MANIFEST), self.manifest)
+
+    def close(self):
+        """Writes the buffered transitions and waits for every chunk to be on disk"""
+        if self.executor is None:
+            return
+        self.flush()
+        self.wait()
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrajectoryRecorder:
+    """Wraps an env to record every transition it steps into a log at path
+
+    The writer is created on the first reset, from the shape of the first stored observation. Attributes that are
+    not the recorder's own are the env's.
+
+    :param env: gym.Env         the env to record
+    :param path: str            log directory, see `TrajectoryWriter`
+    :param encoder: callable    encoder(obs, out=None) of the observation stored, `index_encoder(env)` by default
+    :param writer_kwargs:       passed to `TrajectoryWriter`, e.g. chunk_size or compress
+    """
+
+    def __init__(self, env, path, encoder=None, **writer_kwargs):
+        self.env = env
+        self.path = path
+        if encoder is None:
+            encoder, encoding = index_encoder(env)
+        else:
+            encoding = 'custom'
+        self.encoder = encoder
+        self.encoding = encoding
+        self.writer_kwargs = writer_kwargs
+        self.writer = None
+        self.last_obs = None
+
+    def __getattr__(self, name):
+        if name == 'env':
+            raise AttributeError(name)
+        return getattr(self.env, name)
+
+    def _observe(self, obs):
+        if self.writer is None:
+            # copied, the env may reuse the array of its observations
+            self.last_obs = np.asarray(self.encoder(obs))
+            spec = getattr(self.env, 'spec', None)
+            metadata = {'encoding': self.encoding, 'env_id': getattr(spec, 'id', type(self.env.unwrapped).__name__)}
+            self.writer = TrajectoryWriter(self.path, self.last_obs.shape, self.last_obs.dtype, metadata=metadata,
+                                           **self.writer_kwargs)
+        else:
+            self.encoder(obs, self.last_obs)
+
+    def reset(self, **kwargs):
+        obs = self.env.reset(**kwargs)
+        self._observe(obs)
+        return obs
+
+    def step(self, action):
+        obs, reward, done, info = self.env.step(action)
+        self.writer.append(self.last_obs, action, reward, done)
+        self._observe(obs)
+        return obs, reward, done, info
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        return self.env.close()
+
+
+class TrajectoryLog:
+    """Reads a log written by `TrajectoryWriter`, one chunk at a time"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.chunks = self.manifest['chunks']
+        self.columns = list(self.manifest['columns'])
+
+    @property
+    def metadata(self):
+        return self.manifest['metadata']
+
+    def __len__(self):
+        return sum(chunk['records'] for chunk in self.chunks)
+
+    def chunk(self, index):
+        """The columns of one chunk as a dict of arrays"""
+        with np.load(os.path.join(self.path, self.chunks[index]['file'])) as arrays:
+            return {name: arrays[name] for name in self.columns}
+
+    def iter_chunks(self):
+        for index in range(len(self.chunks)):
+            yield self.chunk(index)
+
+    def iter_episodes(self):
+        """Yields the columns of each episode as a dict of arrays, in order
+
+        Episodes spanning chunks are joined. The last episode of a log may be unfinished, its done column is then
+        all False.
+        """
+        pending = []
+        for chunk in self.iter_chunks():
+            starts = np.flatnonzero(np.diff(chunk['episode'])) + 1
+            bounds = [0] + starts.tolist() + [len(chunk['episode'])]
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                part = {name: column[start:stop] for name, column in chunk.items()}
+                if pending and pending[0]['episode'][0] != part['episode'][0]:
+                    yield self._joined(pending)
+                    pending = []
+                pending.append(part)
+        if pending:
+            yield self._joined(pending)
+
+    @staticmethod
+    def _joined(parts):
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+    def memmap(self, column):
+        """One column of the whole log as a read-only memory map
+
+        The chunks are decompressed once into an uncompressed .npy in the log's cache directory, which is rebuilt
+        when the log has grown since.
+        """
+        path = os.path.join(self.path, CACHE_DIR, f'{column}.npy')
+        n = len(self)
+        if os.path.exists(path):
+            array = np.load(path, mmap_mode='r')
+            if len(array) == n:
+                return array
+        spec = self.manifest['columns'][column]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        array = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.dtype(spec['dtype']),
+                                          shape=(n,) + tuple(spec['shape']))
+        start = 0
+        for chunk in self.chunks:
+            with np.load(os.path.join(self.path, chunk['file'])) as arrays:
+                array[start:start + chunk['records']] = arrays[column]
+            start += chunk['records']
+        array.flush()
+        del array
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
@@ -0,0 +1,140 @@
+"""Canonical keys for open face positions and a shared transposition cache
+
+Two positions are strategically identical when one becomes the other by relabelling suits or by reordering the
+cards inside a row. `canonical_key` maps every position to a 64 bit integer that is the same for all of them:
+each row is encoded by the size and combinatorial index of its set of cards, the card to be placed by its
+index, and the smallest key over the 24 suit relabellings is taken.
+
+    bits 31-55  front row   combinatorial index << 3 | number of cards
+    bits 6-30   back row    combinatorial index << 3 | number of cards
+    bits 0-5    card to be placed, EMPTY (52) for positions before the next card is dealt
+
+`TranspositionCache` is a bounded LRU map from keys to float values with hit and miss counts. It can be saved
+as a sorted table of keys and values in a .npy file, and loaded back memory-mapped as a read-only tier under
+the LRU entries, so values computed in one run are reused by the next.
+"""
+import itertools
+import os
+from collections import OrderedDict
+import numpy as np
+
+from PokerEngine import ofc
+from PokerEngine.cards import EMPTY, RANKS, SUITS
+from PokerEngine.evaluation import BINOMIAL
+
+# SUIT_PERMUTATIONS[p, c] is card c with its suit relabelled by the p-th permutation of the four suits
+SUIT_PERMUTATIONS = np.array([RANKS * 4 + np.array(perm)[SUITS] for perm in itertools.permutations(range(4))])
+# EMPTY keeps its index under every relabelling
+SUIT_PERMUTATIONS = np.concatenate([SUIT_PERMUTATIONS, np.full((24, 1), EMPTY)], axis=1)
+
+ROW_BITS = 25
+CARD_BITS = 6
+TABLE_DTYPE = np.dtype([('key', '<u8'), ('value', '<f8')])
+
+
+def _row_codes(rows):
+    """Size and combinatorial index of each row of an (N, k) array of card indices"""
+    k = rows.shape[1]
+    if k == 0:
+        return np.zeros(len(rows), dtype=np.int64)
+    index = BINOMIAL[np.sort(rows, axis=1), np.arange(1, k + 1)].sum(axis=1)
+    return (index << 3) | k
+
+
+def canonical_key(front, back, card=EMPTY):
+    """Canonical 64 bit key of a position
+
+    :param front: sequence      card indices in the front row, empty slots excluded
+    :param back: sequence       card indices in the back row, empty slots excluded
+    :param card: int            the card to be placed, EMPTY between deals
+    """
+    cards = list(front) + list(back) + [card]
+    relabelled = SUIT_PERMUTATIONS[:, cards]
+    n_front = len(front)
+    keys = (_row_codes(relabelled[:, :n_front]) << (ROW_BITS + CARD_BITS)) \
+        | (_row_codes(relabelled[:, n_front:-1]) << CARD_BITS) | relabelled[:, -1]
+    return int(keys.min())
+
+
+def state_key(obs):
+    """Canonical key of a GameState or of an observation in any obs_mode"""
+    state = obs if isinstance(obs, ofc.GameState) else ofc.state_from_observation(obs)
+    front, back = state.rows()
+    return canonical_key([c for c in front if c != EMPTY], [c for c in back if c != EMPTY], state.card)
+
+
+class TranspositionCache:
+    """Bounded LRU cache of values by canonical key, optionally backed by a saved table
+
+    :param max_entries: int     entries kept in memory before the least recently used ones are evicted
+    :param path: str            optional .npy table written by `save`, memory-mapped and searched on misses
+    """
+
+    def __init__(self, max_entries=1000000, path=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.table = None
+        if path is not None and os.path.exists(path):
+            self.table = np.load(path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries or self._table_lookup(key) is not None
+
+    def _table_lookup(self, key):
+        if self.table is None or not len(self.table):
+            return None
+        keys = self.table['key']
+        i = int(np.searchsorted(keys, key))
+        if i < len(keys) and keys[i] == key:
+            return float(self.table['value'][i])
+        return None
+
+    def get(self, key):
+        """The cached value of key or None, counting a hit or a miss"""
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        value = self._table_lookup(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self.entries), 'table_entries': 0 if self.table is None else len(self.table),
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def save(self, path):
+        """Writes the saved table merged with the in-memory entries as a sorted .npy table"""
+        entries = np.array(list(self.entries.items()), dtype=TABLE_DTYPE)
+        if self.table is not None:
+            entries = np.concatenate([entries, np.asarray(self.table)])
+        # np.unique keeps the first occurrence, so in-memory values win over the saved ones
+        _, first = np.unique(entries['key'], return_index=True)
+        entries = entries[first]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, entries)
+        os.replace(tmp_path, path)
+        self.table = np.load(path, mmap_mode='r')
+        return len(entries)
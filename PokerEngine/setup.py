@@ -0,0 +1,7 @@
+from setuptools import setup
+
+setup(name='PokerEngine',
+      version='0.1',
+      packages=['PokerEngine'],
+      install_requires=['treys', 'numpy']
+      )
@@ -0,0 +1,244 @@
+import asyncio
+import csv
+import importlib
+import os
+import tempfile
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from env_server import ENV_IDS, EnvClient, EnvServer, EnvServerError
+from evaluation import ConfusionMatrix, evaluate
+from PokerEngine.dataset import generate
+from PokerEngine.evaluation import evaluate_batch
+from PokerEngine.profiling import Profiler
+from shm_vec_env import VEC_ENVS, SharedMemoryVecEnv, make_games
+from sweep import Sweep, _write_result, grid, make_runs, random_search, read_result, write_table
+
+
+class HandClassifier:
+    """A stand-in model that predicts the rank class of 'index' hand observations, counting its calls"""
+
+    def __init__(self, wrong_class=None):
+        self.wrong_class = wrong_class
+        self.calls = 0
+
+    def predict(self, observations, deterministic=False):
+        self.calls += 1
+        predictions = evaluate_batch(observations)[1] - 1
+        if self.wrong_class is not None:
+            predictions[predictions == self.wrong_class] = 0
+        return predictions, None
+
+
+def dummy_run(config, seed, run_dir, n_cpu=None, checkpoint_interval=None):
+    # a sweep target that trains nothing, its metrics follow from its settings
+    return {'timesteps': config['timesteps'], 'seconds': 2.0, 'steps_per_sec': config['timesteps'] / 2.0,
+            'accuracy': seed / 10}
+
+
+class SharedMemoryVecEnvTestCase(unittest.TestCase):
+    def test_matches_the_in_process_vec_envs(self):
+        n, n_workers, seed = 6, 2, 3
+        for env_id, (module, name) in VEC_ENVS.items():
+            env = SharedMemoryVecEnv(env_id, n, n_workers=n_workers, seed=seed)
+            # every worker runs its slice of the games as a vec env seeded from the root seed
+            references = [getattr(importlib.import_module(module), name)(n // n_workers, seed=worker_seed)
+                          for worker_seed in np.random.SeedSequence(seed).spawn(n_workers)]
+            try:
+                obs = env.reset()
+                assert (obs == np.concatenate([reference.reset() for reference in references])).all(), env_id
+                for t in range(14):
+                    actions = (np.arange(n) + t // 3) % env.action_space.n
+                    obs, rewards, dones, infos = env.step(actions)
+                    expected = [reference.step(part) for reference, part in
+                                zip(references, np.split(actions, n_workers))]
+                    expected_infos = [info for _, _, _, part in expected for info in part]
+                    assert (obs == np.concatenate([e[0] for e in expected])).all(), env_id
+                    assert (rewards == np.concatenate([e[1] for e in expected])).all(), env_id
+                    assert (dones == np.concatenate([e[2] for e in expected])).all(), env_id
+                    for game in np.flatnonzero(dones):
+                        terminal_obs = expected_infos[game]['terminal_observation']
+                        assert (infos[game]['terminal_observation'] == terminal_obs).all(), env_id
+                assert dones.dtype == bool and rewards.dtype == np.float32
+            finally:
+                env.close()
+
+    def test_close_releases_the_shared_memory(self):
+        env = SharedMemoryVecEnv('OpenFaceSimpleEnv-v1', 4, n_workers=2, seed=0)
+        env.reset()
+        name = env.shm.name
+        env.close()
+        assert all(not process.is_alive() for process in env.processes)
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+        env.close()
+
+
+class EnvServerTestCase(unittest.TestCase):
+    def serve(self, test, **server_kwargs):
+        """Runs the coroutine test(server, path) against a server listening on a temporary Unix socket"""
+        async def main():
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'server.sock')
+                server = EnvServer(**server_kwargs)
+                listener = await server.start(path=path)
+                try:
+                    await test(server, path)
+                finally:
+                    listener.close()
+                    await listener.wait_closed()
+                    server.stop()
+        asyncio.run(main())
+
+    def test_round_trip_matches_the_games(self):
+        async def test(server, path):
+            for env_id in ENV_IDS:
+                client = await EnvClient.connect(path=path)
+                await client.open(env_id, 4, seed=7)
+                games = make_games(env_id, 4, 7, obs_mode='index')
+                # opening a session resets its games once to size the observations
+                games.reset()
+                assert (await client.reset() == games.reset()).all(), env_id
+                for t in range(12):
+                    actions = np.full(4, t % 2)
+                    obs, rewards, dones, infos = await client.step(actions)
+                    expected_obs, expected_rewards, expected_dones, expected_infos = games.step(actions)
+                    assert (obs == expected_obs).all() and (dones == expected_dones).all(), env_id
+                    assert np.allclose(rewards, expected_rewards), env_id
+                    for game in np.flatnonzero(dones):
+                        terminal_obs = expected_infos[game]['terminal_observation']
+                        assert (infos[game]['terminal_observation'] == terminal_obs).all(), env_id
+                await client.close()
+            stats = server.stats()
+            assert stats['sessions'] == 0 and stats['latency']['step']['count'] == 12 * len(ENV_IDS)
+        self.serve(test)
+
+    def test_errors_keep_the_connection(self):
+        async def test(server, path):
+            client = await EnvClient.connect(path=path)
+            await client.open(ENV_IDS[0], 2)
+            with self.assertRaises(EnvServerError):
+                await client.step(np.zeros(3))
+            obs, rewards, dones, infos = await client.step(np.zeros(2))
+            assert obs.shape == (2, client.obs_size)
+            await client.close()
+        self.serve(test)
+
+    def test_idle_sessions_are_evicted(self):
+        async def test(server, path):
+            client = await EnvClient.connect(path=path)
+            await client.open(ENV_IDS[1], 2)
+            await client.reset()
+            # the evictor runs every 0.1s at this timeout
+            await asyncio.sleep(0.3)
+            assert server.evicted == 1 and not server.sessions
+            with self.assertRaises(EnvServerError):
+                await client.step(np.zeros(2))
+            assert (await client.stats())['evicted'] == 1
+            client.session_id = 0
+            await client.close()
+        self.serve(test, idle_timeout=0.05)
+
+    def test_stop_before_start(self):
+        server = EnvServer()
+        server.stop()
+        server.stop()
+
+
+class EvaluationTestCase(unittest.TestCase):
+    def test_confusion_matrix_accumulates_batches(self):
+        matrix = ConfusionMatrix(3)
+        matrix.update([0, 0, 1], [0, 1, 1])
+        matrix.update(np.array([1, 0]), np.array([0, 0]))
+        assert matrix.matrix.tolist() == [[2, 1, 0], [1, 1, 0], [0, 0, 0]]
+        assert matrix.support.tolist() == [3, 2, 0] and matrix.accuracy() == 3 / 5
+        # class 2 is never true nor predicted, its scores are 0 instead of nan
+        assert np.allclose(matrix.precision(), [2 / 3, 1 / 2, 0])
+        assert np.allclose(matrix.recall(), [2 / 3, 1 / 2, 0])
+        assert np.allclose(matrix.f1(), [2 / 3, 1 / 2, 0])
+        lines = matrix.report().split("\n")
+        assert len(lines) == 5 and lines[3].split() == ['2', '0.00', '0.00', '0.00', '0']
+        assert ConfusionMatrix(2).accuracy() == 0
+
+    def test_evaluate_generated_samples(self):
+        model = HandClassifier()
+        profiler = Profiler()
+        matrix = evaluate(model, 'HandClassificationEnv-v3', samples=1000, batch_size=300, obs_mode='index',
+                          profiler=profiler)
+        assert model.calls == 4 and matrix.matrix.sum() == 1000 and matrix.accuracy() == 1
+        stats = profiler.to_dict()
+        assert stats['phases']['predict']['count'] == 4 and stats['counters']['observations'] == 1000
+
+    def test_evaluate_a_dataset(self):
+        with tempfile.TemporaryDirectory() as path:
+            generate('HandClassificationEnv-v3', path, 2000, shard_size=700, obs_mode='index', seed=1, workers=0)
+            # one pair is predicted as a high card
+            model = HandClassifier(wrong_class=7)
+            matrix = evaluate(model, 'HandClassificationEnv-v3', dataset=path, batch_size=512)
+        assert model.calls == 4 and matrix.matrix.sum() == 2000
+        pairs = matrix.support[7]
+        assert pairs > 0 and matrix.matrix[7, 0] == pairs and matrix.recall()[7] == 0
+        assert matrix.accuracy() == 1 - pairs / 2000
+
+
+class SweepTestCase(unittest.TestCase):
+    def test_grid(self):
+        configs = grid({'learning_rate': [0.1, 0.01], 'net_arch': [[64], [64, 64]], 'num_envs': 8})
+        assert len(configs) == 4 and all(config['num_envs'] == 8 for config in configs)
+        assert configs[0] == {'learning_rate': 0.1, 'net_arch': [64], 'num_envs': 8}
+        assert {(c['learning_rate'], len(c['net_arch'])) for c in configs} == {(0.1, 1), (0.1, 2), (0.01, 1), (0.01, 2)}
+        with self.assertRaises(ValueError):
+            grid({'learning_rate': {'uniform': [0.1, 0.2]}})
+        with self.assertRaises(ValueError):
+            grid({'batch_size': [1, 2]})
+
+    def test_random_search(self):
+        space = {'learning_rate': {'log_uniform': [1e-5, 1e-2]}, 'num_envs': {'uniform': [4, 8]},
+                 'net_arch': [[64], [128]], 'timesteps': 1000}
+        configs = random_search(space, 50, seed=1)
+        assert configs == random_search(space, 50, seed=1) and configs != random_search(space, 50, seed=2)
+        for config in configs:
+            assert 1e-5 <= config['learning_rate'] <= 1e-2 and config['timesteps'] == 1000
+            assert isinstance(config['num_envs'], int) and 4 <= config['num_envs'] <= 8
+            assert config['net_arch'] in space['net_arch']
+        assert {config['num_envs'] for config in configs} == {4, 5, 6, 7, 8}
+
+    def test_run_ids_are_stable(self):
+        configs = [{'learning_rate': 0.1, 'timesteps': 10}, {'learning_rate': 0.01, 'timesteps': 10}]
+        runs = make_runs(configs, [0, 1], 'sweep')
+        assert len({run.run_id for run in runs}) == 4
+        # the same config and seed give the same id, whatever the order of the config keys
+        again = make_runs([{'timesteps': 10, 'learning_rate': 0.01}], [1], 'sweep')
+        assert again[0] == runs[3] and again[0].run_dir == os.path.join('sweep', again[0].run_id)
+
+    def test_sweep_runs_the_pending_runs(self):
+        with tempfile.TemporaryDirectory() as sweep_dir:
+            runs = make_runs(grid({'timesteps': [10, 20], 'learning_rate': 0.1}), [0, 1], sweep_dir)
+            sweep = Sweep(runs, cores=[0], target=dummy_run)
+            assert sweep.max_concurrent == 1 and sweep.pending() == runs
+            assert [row['status'] for row in sweep.results()] == ['pending'] * 4
+            rows = sweep.run()
+            assert [row['status'] for row in rows] == ['done'] * 4 and sweep.pending() == []
+            assert [(row['timesteps'], row['seed'], row['accuracy']) for row in rows] == [
+                (10, 0, 0.0), (10, 1, 0.1), (20, 0, 0.0), (20, 1, 0.1)]
+            assert read_result(runs[0])['cores'] == [0]
+
+            # failed runs are tried again, done runs are skipped
+            _write_result(runs[1].run_dir, {'status': 'failed'})
+            assert Sweep(runs, cores=[0], target=dummy_run).pending() == [runs[1]]
+
+            path = os.path.join(sweep_dir, 'results.csv')
+            write_table(rows, path)
+            with open(path, newline='') as f:
+                table = list(csv.DictReader(f))
+            assert [row['run_id'] for row in table] == [run.run_id for run in runs]
+            assert table[3]['steps_per_sec'] == '10.0'
+
+    def test_sweep_checks_its_cores(self):
+        with self.assertRaises(ValueError):
+            Sweep([], cores=[0], cores_per_run=2)
+        assert Sweep([], cores=[0, 1, 2, 3, 4], cores_per_run=2, max_concurrent=8).max_concurrent == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
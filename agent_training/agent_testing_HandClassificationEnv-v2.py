@@ -1,58 +1,27 @@
-import gym
-import HandClassificationEnv
 import numpy as np
-from stable_baselines.ppo2 import PPO2
 import matplotlib.pyplot as plt
-from sklearn.metrics import classification_report, confusion_matrix
 import itertools
+from evaluation import evaluate, load_model
+from PokerEngine.profiling import Profiler
 
 ENVIRONMENT = "HandClassificationEnv-v3"
 LOAD_DIR = ""
-SAVE_SAMPLE_DIR = "data_samples"
+DATASET_DIR = None  # evaluate on a dataset made with `python -m PokerEngine.dataset` instead of fresh samples
 TIMESTEPS = int(1e5)
-
-
-def make_env(env_name=ENVIRONMENT):
-    return gym.make(f"{env_name}")
-
-
-def load_model(load_dir=LOAD_DIR):
-    return PPO2.load(load_dir)
-
-
-def generate_samples(model, env, timesteps=TIMESTEPS, load=False, save=True):
-    predictions = []
-    actual_ranks = []
-    observations = []
-    if not load:
-        for _ in range(timesteps):
-            obs = env.reset()
-            rank_class_actual = env.rank_class - 1
-            actual_ranks.append(rank_class_actual)
-            observations.append(obs)
-
-            prediction = model.predict(obs)[0]
-            predictions.append(prediction)
-        if save:
-            np.save(SAVE_SAMPLE_DIR + "ranks", actual_ranks)
-            np.save(SAVE_SAMPLE_DIR + "obs", observations)
-            print("Saved data samples")
-    if load:
-        saved_data = np.load(LOAD_DIR)
-        actual_ranks = np.load(LOAD_DIR)[1]
-        predictions = [model.predict(obs) for obs in saved_data[0]]
-
-    return predictions, actual_ranks
+BATCH_SIZE = 8192
+PROFILE = False  # print where the evaluation time goes
 
 
 def create_confusion_matrix():
-    model = load_model()
-    env = make_env()
-    y_pred, y_true = generate_samples(model, env)
-    cnf = confusion_matrix(y_true, y_pred)
+    model = load_model(LOAD_DIR)
+    profiler = Profiler() if PROFILE else None
+    cm = evaluate(model, ENVIRONMENT, samples=TIMESTEPS, batch_size=BATCH_SIZE, dataset=DATASET_DIR,
+                  profiler=profiler)
+    if profiler is not None:
+        print(profiler.log_line())
     print("Classification report: ")
-    print(classification_report(y_true=y_true, y_pred=y_pred))
-    return cnf
+    print(cm.report())
+    return cm.matrix
 
 
 def plot_confusion_matrix(cm, classes=None,
@@ -89,8 +58,9 @@ def plot_confusion_matrix(cm, classes=None,
     plt.xlabel('Predicted label')
 
 
-np.set_printoptions(precision=2)
-cnf_matrix = create_confusion_matrix()
-plt.figure()
-plot_confusion_matrix(cnf_matrix)
-plt.show()
+if __name__ == '__main__':
+    np.set_printoptions(precision=2)
+    cnf_matrix = create_confusion_matrix()
+    plt.figure()
+    plot_confusion_matrix(cnf_matrix)
+    plt.show()
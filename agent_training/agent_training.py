@@ -1,3 +1,5 @@
+import json
+import os
 import time
 import warnings
 from stable_baselines import A2C, PPO2
@@ -7,6 +9,7 @@ import gym
 import HandMakerEnv
 import OpenFaceSimpleEnv
 import HandClassificationEnv
+from shm_vec_env import SharedMemoryVecEnv, VEC_ENVS, make_games
 import re
 
 # filter warnings
@@ -22,6 +25,7 @@ NETWORK_ARCH = [160, 160, 160, 160]
 LEARNING_RATE = 0.0005
 LOG_INTERVAL = 1000
 NUM_ENVS = 8  # some algorithms can be run in parallel
+NUM_WORKERS = 4  # processes stepping the envs, 0 steps them all in this process
 
 START_TIME = time.asctime().replace(' ', '-').replace(':', '-')
 TENSORBOARD_DIR = f"logs/tb/"
@@ -33,23 +37,93 @@ LOAD_MODEL = False
 LOAD_DIR = "models/Sun-Apr-26-01-04-09-2020-HandClassificationEnv-v2-300000.zip"
 
 
+CHECKPOINT_FILE = 'checkpoint.zip'
+PROGRESS_FILE = 'progress.json'
+
+
+def make_env(env_name=ENVIRONMENT, num_envs=NUM_ENVS, num_workers=NUM_WORKERS, seed=None):
+    # the workers share observations, actions and rewards with this process through shared memory
+    if num_workers:
+        return SharedMemoryVecEnv(env_name, num_envs, num_workers, seed=seed)
+    # envs with a batched NumPy implementation step all games in one call
+    if env_name in VEC_ENVS:
+        return make_games(env_name, num_envs, seed=seed).vec_env
+    return make_vec_env(env_name, num_envs, seed=seed)
+
+
+def make_model(env, net_arch=NETWORK_ARCH, learning_rate=LEARNING_RATE, seed=None, n_cpu=None, load_path=None):
+    """A new PPO2 model, or the model saved at load_path to continue training on env"""
+    if load_path is not None:
+        return PPO2.load(load_path, env=env, tensorboard_log=TENSORBOARD_DIR, n_cpu_tf_sess=n_cpu)
+    # the network architecture can be defined above for any policy
+    policy_kwargs = dict(net_arch=net_arch)
+    return PPO2(policy=POLICY, env=env, verbose=0, policy_kwargs=policy_kwargs, tensorboard_log=TENSORBOARD_DIR,
+                n_steps=1, learning_rate=learning_rate, seed=seed, n_cpu_tf_sess=n_cpu)
+
+
+def read_progress(checkpoint_dir=None):
+    """Timesteps trained and seconds spent training so far by the run checkpointed in checkpoint_dir"""
+    progress = {'timesteps': 0, 'seconds': 0.0}
+    path = None if checkpoint_dir is None else os.path.join(checkpoint_dir, PROGRESS_FILE)
+    if path is not None and os.path.exists(path) and os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_FILE)):
+        with open(path) as f:
+            progress.update(json.load(f))
+    return progress
+
+
+def load_checkpoint(checkpoint_dir, env, n_cpu=None):
+    """The model checkpointed in checkpoint_dir, or None before the first checkpoint"""
+    if not read_progress(checkpoint_dir)['timesteps']:
+        return None
+    return make_model(env, n_cpu=n_cpu, load_path=os.path.join(checkpoint_dir, CHECKPOINT_FILE))
+
+
+def save_checkpoint(model, checkpoint_dir, progress):
+    # the model is replaced before the progress, so a crash in between repeats at most one interval
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tmp_path = os.path.join(checkpoint_dir, f'checkpoint.{os.getpid()}.tmp.zip')
+    model.save(save_path=tmp_path, cloudpickle=False)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, CHECKPOINT_FILE))
+    tmp_path = os.path.join(checkpoint_dir, f'{PROGRESS_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, PROGRESS_FILE))
+
+
+def learn(model, timesteps=TIMESTEPS, tb_log_name=TB_LOG_NAME, checkpoint_dir=None, checkpoint_interval=None):
+    """Trains model up to timesteps, resuming the progress recorded in checkpoint_dir
+
+    With a checkpoint_dir the model and its progress are saved there every checkpoint_interval timesteps (once at
+    the end by default). A run interrupted after a checkpoint continues from it when learn is called again with
+    the model from `load_checkpoint`.
+
+    :returns progress: dict     timesteps trained and seconds spent in `model.learn`, over all resumes
+    """
+    progress = read_progress(checkpoint_dir)
+    interval = checkpoint_interval or timesteps
+    while progress['timesteps'] < timesteps:
+        chunk = min(interval, timesteps - progress['timesteps'])
+        start = time.perf_counter()
+        model.learn(total_timesteps=chunk, log_interval=LOG_INTERVAL, tb_log_name=tb_log_name,
+                    reset_num_timesteps=progress['timesteps'] == 0)
+        progress['seconds'] += time.perf_counter() - start
+        progress['timesteps'] += chunk
+        if checkpoint_dir is not None:
+            save_checkpoint(model, checkpoint_dir, progress)
+    return progress
+
+
 def train(timesteps=TIMESTEPS):
     print(f"[INFO] STARTING TRAINING: {START_TIME} {ENVIRONMENT}-{POLICY_NAME}-{ALGO}")
     print(f"[INFO] NETWORK ARCH {NETWORK_ARCH}")
 
     # use vectorized environments for the appropriate algorithms for a speed boost
-    env = make_vec_env(ENVIRONMENT, NUM_ENVS)
-    # the network architecture can be defined above for any policy
-    policy_kwargs = dict(net_arch=NETWORK_ARCH)
-    model = PPO2(policy=POLICY, env=env, verbose=0, policy_kwargs=policy_kwargs, tensorboard_log=TENSORBOARD_DIR,
-                 n_steps=1,
-                 learning_rate=LEARNING_RATE)
-    if LOAD_MODEL:
-        model.load(load_path=LOAD_DIR)
-    print(f"[INFO] Training for TIMESTEPS {TIMESTEPS}")
+    env = make_env()
+    model = make_model(env, load_path=LOAD_DIR if LOAD_MODEL else None)
+    print(f"[INFO] Training for TIMESTEPS {timesteps}")
 
-    model.learn(total_timesteps=timesteps, log_interval=LOG_INTERVAL, tb_log_name=TB_LOG_NAME)  # experiment select
-    print("[INFO] Done training")
+    progress = learn(model, timesteps)  # experiment select
+    print(f"[INFO] Done training, {progress['timesteps'] / max(progress['seconds'], 1e-9):,.0f} steps/sec")
 
     model.save(save_path=MODEL_DIR, cloudpickle=False)
     print(f"[INFO] MODEL SAVED TO {MODEL_DIR}")
@@ -57,4 +131,5 @@ def train(timesteps=TIMESTEPS):
     return 0
 
 
-failed = train()
+if __name__ == '__main__':
+    failed = train()
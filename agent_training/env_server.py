@@ -0,0 +1,341 @@
+"""Asyncio server that hosts batches of poker env games for remote actors
+
+One process serves any number of sessions over TCP or a Unix domain socket. A session is a batch of
+auto-resetting games of one env, created by an actor and stepped with one message per batch. Sessions that
+are not used for `idle_timeout` seconds are evicted.
+
+Messages are length prefixed binary frames. Observations travel as uint8 card indices (the envs' 'index'
+obs_mode), so an open face observation is 12 bytes instead of 356 ints.
+
+    request     !I length, !BIH op, session id, number of games or actions, body
+    response    !I length, !B status, body
+
+    op          request body            response body
+    OPEN        !Bq env code, seed      !IH session id, observation size
+    RESET       -                       observations
+    STEP        uint8 actions           observations, float32 rewards, uint8 dones, terminal observations
+    CLOSE       -                       -
+    STATS       -                       JSON latency histograms
+
+The observations returned by STEP are those of the next game for games that finished. The terminal
+observations of the finished games follow the dones, in game order.
+
+Serve, then load test it with concurrent simulated actors:
+    python env_server.py serve --path /tmp/poker.sock
+    python env_server.py load-test --path /tmp/poker.sock --no-server --clients 64 --games 16
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import struct
+import time
+from collections import defaultdict
+import numpy as np
+from PokerEngine.profiling import LatencyHistogram
+from shm_vec_env import make_games
+
+ENV_IDS = ('OpenFaceSimpleEnv-v1', 'HandClassificationEnv-v3', 'HandMakerEnv-v1', 'OpenFaceEnv-v1')
+OPEN, RESET, STEP, CLOSE, STATS = range(1, 6)
+OP_NAMES = {OPEN: 'open', RESET: 'reset', STEP: 'step', CLOSE: 'close', STATS: 'stats'}
+OK, ERROR = 0, 1
+PORT = 5555
+
+LENGTH = struct.Struct('!I')
+REQUEST = struct.Struct('!BIH')
+RESPONSE = struct.Struct('!B')
+OPEN_REQUEST = struct.Struct('!Bq')
+OPEN_RESPONSE = struct.Struct('!IH')
+REWARD_DTYPE = np.dtype('>f4')
+
+
+class EnvServerError(RuntimeError):
+    """Raised by the client when the server answers a request with an error"""
+
+
+class Session:
+    def __init__(self, session_id, env_id, games, n):
+        self.session_id = session_id
+        self.env_id = env_id
+        self.games = games
+        self.n = n
+        self.last_used = time.monotonic()
+        self.latency = defaultdict(LatencyHistogram)
+
+
+class EnvServer:
+    """Hosts env sessions, see the module docstring for the protocol
+
+    :param idle_timeout: float  seconds after which an unused session is evicted
+    :param max_games: int       total games over all sessions
+    """
+
+    def __init__(self, idle_timeout=300.0, max_games=1 << 20):
+        self.idle_timeout = idle_timeout
+        self.max_games = max_games
+        self.sessions = {}
+        self.latency = defaultdict(LatencyHistogram)
+        self.evicted = 0
+        self._ids = itertools.count(1)
+        self._evictor = None
+
+    @property
+    def n_games(self):
+        return sum(session.n for session in self.sessions.values())
+
+    def _session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"unknown session {session_id}, it may have been evicted")
+        session.last_used = time.monotonic()
+        return session
+
+    def _open(self, n, body):
+        code, seed = OPEN_REQUEST.unpack(body)
+        if code >= len(ENV_IDS):
+            raise ValueError(f"unknown env code {code}")
+        if self.n_games + n > self.max_games:
+            raise ValueError(f"the server is full, {self.n_games} of {self.max_games} games in use")
+        session_id = next(self._ids)
+        games = make_games(ENV_IDS[code], n, None if seed < 0 else seed, obs_mode='index')
+        self.sessions[session_id] = Session(session_id, ENV_IDS[code], games, n)
+        obs_size = int(np.prod(games.reset().shape[1:]))
+        return session_id, OPEN_RESPONSE.pack(session_id, obs_size)
+
+    def _step(self, session, n, body):
+        if n != session.n:
+            raise ValueError(f"session {session.session_id} has {session.n} games, got {n} actions")
+        actions = np.frombuffer(body, dtype=np.uint8, count=n)
+        obs, rewards, dones, infos = session.games.step(actions)
+        dones = np.asarray(dones, dtype=np.uint8)
+        terminal = [infos[i]['terminal_observation'] for i in np.flatnonzero(dones)]
+        parts = [np.ascontiguousarray(obs, dtype=np.uint8).tobytes(),
+                 np.asarray(rewards, dtype=REWARD_DTYPE).tobytes(), dones.tobytes()]
+        if terminal:
+            parts.append(np.asarray(terminal, dtype=np.uint8).tobytes())
+        return b''.join(parts)
+
+    def stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'games': self.n_games,
+            'evicted': self.evicted,
+            'latency': {OP_NAMES[op]: hist.to_dict() for op, hist in self.latency.items()},
+            'session_latency': {session_id: {OP_NAMES[op]: hist.to_dict() for op, hist in session.latency.items()}
+                                for session_id, session in self.sessions.items()},
+        }
+
+    def dispatch(self, payload):
+        """Handles one request payload, returns (session or None, response body)"""
+        op, session_id, n = REQUEST.unpack_from(payload)
+        body = memoryview(payload)[REQUEST.size:]
+        if op == OPEN:
+            session_id, response = self._open(n, body)
+            return self.sessions[session_id], response
+        if op == STATS:
+            return None, json.dumps(self.stats()).encode()
+        session = self._session(session_id)
+        if op == RESET:
+            return session, np.ascontiguousarray(session.games.reset(), dtype=np.uint8).tobytes()
+        if op == STEP:
+            return session, self._step(session, n, body)
+        if op == CLOSE:
+            self.sessions.pop(session_id).games.close()
+            return session, b''
+        raise ValueError(f"unknown op {op}")
+
+    async def handle(self, reader, writer):
+        """Serves the requests of one connection until the client disconnects"""
+        try:
+            while True:
+                try:
+                    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break
+                start = time.perf_counter()
+                try:
+                    session, body = self.dispatch(payload)
+                    status = OK
+                except Exception as error:  # report bad requests to the client instead of dropping it
+                    session, body, status = None, str(error).encode(), ERROR
+                writer.write(LENGTH.pack(RESPONSE.size + len(body)) + RESPONSE.pack(status) + body)
+                elapsed = time.perf_counter() - start
+                op = payload[0]
+                if status == OK and op in OP_NAMES:
+                    self.latency[op].record(elapsed)
+                    if session is not None:
+                        session.latency[op].record(elapsed)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def evict_idle(self):
+        """Removes sessions idle for longer than idle_timeout, returns how many were removed"""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [session_id for session_id, session in self.sessions.items() if session.last_used < cutoff]
+        for session_id in idle:
+            self.sessions.pop(session_id).games.close()
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def _evict_periodically(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.1))
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"[INFO] Evicted {evicted} idle sessions")
+
+    async def start(self, host='127.0.0.1', port=PORT, path=None):
+        """Starts listening on a Unix socket if path is given, TCP otherwise, and returns the asyncio server"""
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host=host, port=port)
+        self._evictor = asyncio.ensure_future(self._evict_periodically())
+        return server
+
+    def stop(self):
+        if self._evictor is not None:
+            self._evictor.cancel()
+            self._evictor = None
+
+    async def serve(self, host='127.0.0.1', port=PORT, path=None):
+        server = await self.start(host, port, path)
+        print(f"[INFO] Serving on {path or f'{host}:{port}'}")
+        async with server:
+            await server.serve_forever()
+
+
+class EnvClient:
+    """Connection to an EnvServer that drives one session
+
+        client = await EnvClient.connect(path='/tmp/poker.sock')
+        await client.open('HandMakerEnv-v1', 16)
+        obs = await client.reset()
+        obs, rewards, dones, infos = await client.step(actions)
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.session_id = 0
+        self.n = 0
+        self.obs_size = 0
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=PORT, path=None):
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _request(self, op, n=0, body=b''):
+        payload = REQUEST.pack(op, self.session_id, n) + body
+        self.writer.write(LENGTH.pack(len(payload)) + payload)
+        length, = LENGTH.unpack(await self.reader.readexactly(LENGTH.size))
+        response = await self.reader.readexactly(length)
+        if response[0] != OK:
+            raise EnvServerError(response[RESPONSE.size:].decode())
+        return response[RESPONSE.size:]
+
+    def _observations(self, data, n):
+        return np.frombuffer(data, dtype=np.uint8, count=n * self.obs_size).reshape(n, self.obs_size)
+
+    async def open(self, env_id, n, seed=None):
+        """Creates a session of n games and returns its id"""
+        body = OPEN_REQUEST.pack(ENV_IDS.index(env_id), -1 if seed is None else seed)
+        self.session_id, self.obs_size = OPEN_RESPONSE.unpack(await self._request(OPEN, n, body))
+        self.n = n
+        return self.session_id
+
+    async def reset(self):
+        return self._observations(await self._request(RESET), self.n)
+
+    async def step(self, actions):
+        """Steps every game of the session, returns observations, rewards, dones and infos like a VecEnv"""
+        actions = np.asarray(actions, dtype=np.uint8)
+        data = await self._request(STEP, len(actions), actions.tobytes())
+        obs_bytes = self.n * self.obs_size
+        obs = self._observations(data, self.n)
+        rewards = np.frombuffer(data, dtype=REWARD_DTYPE, count=self.n, offset=obs_bytes).astype(np.float32)
+        dones = np.frombuffer(data, dtype=np.uint8, count=self.n, offset=obs_bytes + 4 * self.n).astype(bool)
+        terminal = np.frombuffer(data, dtype=np.uint8, offset=obs_bytes + 5 * self.n).reshape(-1, self.obs_size)
+        infos = [{} for _ in range(self.n)]
+        for game, terminal_obs in zip(np.flatnonzero(dones), terminal):
+            infos[game]['terminal_observation'] = terminal_obs
+        return obs, rewards, dones, infos
+
+    async def stats(self):
+        return json.loads(await self._request(STATS))
+
+    async def close(self):
+        """Closes the session and the connection"""
+        if self.session_id:
+            await self._request(CLOSE)
+            self.session_id = 0
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def load_test(env_id, clients, steps, games, server=None, **address):
+    """Runs concurrent simulated actors against a server and returns its stats
+
+    :param server: EnvServer    started on `address` for the duration of the test if given
+    """
+    if server is not None:
+        listener = await server.start(**address)
+
+    async def actor(seed):
+        client = await EnvClient.connect(**address)
+        await client.open(env_id, games, seed)
+        await client.reset()
+        for t in range(steps):
+            await client.step(np.full(games, t % 2))
+        await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(actor(seed) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    client = await EnvClient.connect(**address)
+    stats = await client.stats()
+    await client.close()
+    if server is not None:
+        # let the handlers see the last disconnect before the listener goes away
+        await asyncio.sleep(0.01)
+        listener.close()
+        await listener.wait_closed()
+        server.stop()
+    stats['steps_per_sec'] = clients * steps * games / elapsed
+    return stats
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('command', choices=['serve', 'load-test'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--path', help="serve on this Unix domain socket instead of TCP")
+    parser.add_argument('--idle-timeout', type=float, default=300.0)
+    parser.add_argument('--env-id', choices=ENV_IDS, default=ENV_IDS[0], help="load-test only")
+    parser.add_argument('--clients', type=int, default=32, help="load-test only")
+    parser.add_argument('--steps', type=int, default=200, help="load-test only")
+    parser.add_argument('--games', type=int, default=16, help="games per client, load-test only")
+    parser.add_argument('--no-server', action='store_true', help="load test an already running server")
+    args = parser.parse_args(args)
+
+    address = {'path': args.path} if args.path else {'host': args.host, 'port': args.port}
+    if args.command == 'serve':
+        asyncio.run(EnvServer(args.idle_timeout).serve(**address))
+        return
+    server = None if args.no_server else EnvServer(args.idle_timeout)
+    stats = asyncio.run(load_test(args.env_id, args.clients, args.steps, args.games, server, **address))
+    print(f"[INFO] {stats['steps_per_sec']:,.0f} env steps/sec over {args.clients} clients")
+    for op, hist in stats['latency'].items():
+        print(f"[INFO] {op}: {hist['count']} requests, mean {hist['mean_us']:.0f}us, p50 <{hist['p50_us']:.0f}us, "
+              f"p99 <{hist['p99_us']:.0f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Batched evaluation of trained agents against the optimal action
+
+Observations are generated in large batches straight from the NumPy engine (or read from a dataset made by
+`PokerEngine.dataset`), passed through one `model.predict` call per batch, and accumulated into a confusion
+matrix of optimal against predicted actions. Works with any of the three registered envs.
+
+    model = load_model("models/...zip")
+    cm = evaluate(model, "HandClassificationEnv-v3", samples=100000)
+    print(cm.report())
+"""
+import numpy as np
+from PokerEngine.dataset import GENERATORS, Dataset
+
+N_ACTIONS = {
+    'HandClassificationEnv-v3': 9,
+    'HandMakerEnv-v1': 2,
+    'OpenFaceSimpleEnv-v1': 2,
+}
+
+
+def load_model(load_dir, algo=None):
+    """Loads a stable-baselines model for CPU inference, PPO2 unless another algorithm class is given"""
+    if algo is None:
+        from stable_baselines import PPO2 as algo
+    return algo.load(load_dir)
+
+
+class ConfusionMatrix:
+    """Confusion matrix of true (rows) against predicted (columns) classes, updated one batch at a time"""
+
+    def __init__(self, n_classes):
+        self.n_classes = n_classes
+        self.matrix = np.zeros((n_classes, n_classes), dtype=np.int64)
+
+    def update(self, y_true, y_pred):
+        pairs = np.asarray(y_true, dtype=np.int64) * self.n_classes + np.asarray(y_pred, dtype=np.int64)
+        self.matrix += np.bincount(pairs, minlength=self.n_classes ** 2).reshape(self.n_classes, self.n_classes)
+
+    @property
+    def support(self):
+        return self.matrix.sum(axis=1)
+
+    def accuracy(self):
+        return np.trace(self.matrix) / max(self.matrix.sum(), 1)
+
+    def precision(self):
+        predicted = self.matrix.sum(axis=0)
+        return np.divide(np.diag(self.matrix), predicted, out=np.zeros(self.n_classes), where=predicted > 0)
+
+    def recall(self):
+        support = self.support
+        return np.divide(np.diag(self.matrix), support, out=np.zeros(self.n_classes), where=support > 0)
+
+    def f1(self):
+        precision, recall = self.precision(), self.recall()
+        total = precision + recall
+        return np.divide(2 * precision * recall, total, out=np.zeros(self.n_classes), where=total > 0)
+
+    def report(self):
+        lines = [f"{'class':>8} {'precision':>10} {'recall':>10} {'f1':>10} {'support':>10}"]
+        for c, (p, r, f, s) in enumerate(zip(self.precision(), self.recall(), self.f1(), self.support)):
+            lines.append(f"{c:>8} {p:>10.2f} {r:>10.2f} {f:>10.2f} {s:>10}")
+        lines.append(f"{'accuracy':>8} {self.accuracy():>32.2f} {self.matrix.sum():>10}")
+        return "\n".join(lines)
+
+
+def iter_samples(env_id, samples, batch_size=8192, obs_mode='bits', seed=0, **options):
+    """Yields (observations, optimal actions) batches generated from the NumPy engine"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, samples, batch_size):
+        observations, _, actions = GENERATORS[env_id](rng, min(batch_size, samples - start), obs_mode, **options)
+        yield observations, actions
+
+
+def iter_dataset(path, batch_size=8192):
+    """Yields (observations, optimal actions) batches from a dataset written by PokerEngine.dataset"""
+    for batch in Dataset(path).iter_batches(batch_size):
+        yield batch['observations'], batch['actions']
+
+
+def _timed_batches(batches, profiler):
+    while True:
+        with profiler.phase('samples'):
+            batch = next(batches, None)
+        if batch is None:
+            return
+        profiler.count('observations', len(batch[0]))
+        yield batch
+
+
+def evaluate(model, env_id, samples=100000, batch_size=8192, dataset=None, profiler=None, **options):
+    """Accumulates the confusion matrix of a model's predictions against the optimal actions
+
+    :param model: object        anything with a stable-baselines style `predict(observations)`
+    :param env_id: str          the env the model was trained on
+    :param samples: int         number of generated observations, ignored when reading a dataset
+    :param batch_size: int      observations per `predict` call
+    :param dataset: str         optional path of a dataset to evaluate on instead of fresh samples
+    :param profiler: Profiler   optional PokerEngine.profiling.Profiler timing the 'samples' and 'predict' phases
+    :param options:             passed to the sample generator, e.g. obs_mode or seed
+    """
+    matrix = ConfusionMatrix(N_ACTIONS[env_id])
+    batches = iter_dataset(dataset, batch_size) if dataset else iter_samples(env_id, samples, batch_size, **options)
+    predict = model.predict
+    if profiler is not None:
+        batches = _timed_batches(batches, profiler)
+        predict = profiler.timed('predict', predict)
+    for observations, actions in batches:
+        predictions, _ = predict(np.asarray(observations), deterministic=True)
+        matrix.update(actions, predictions)
+    return matrix
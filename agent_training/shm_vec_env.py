@@ -0,0 +1,335 @@
+"""Subprocess vector env that exchanges step data through shared memory
+
+Games are split into contiguous slices, one per worker process. Observations, actions, rewards, dones and the
+terminal observations of finished games live in one preallocated `multiprocessing.shared_memory` block that
+the parent and every worker map as NumPy arrays. The envs of a worker write their observations straight into
+its slice of the block through `set_obs_buffer`, and the pipes to the workers only carry short commands, so the
+cost of a step does not grow with the observation size.
+
+Workers for the envs in VEC_ENVS run their slice as one batched vec env, e.g. `VecOpenFaceSimpleEnv`, other
+envs run one env per game. Finished games are reset automatically, with the last observation in the info dict under
+'terminal_observation', as stable-baselines expects of a VecEnv.
+
+    env = SharedMemoryVecEnv("HandClassificationEnv-v3", num_envs=64, n_workers=4)
+"""
+import importlib
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import gym
+import numpy as np
+
+try:
+    from stable_baselines.common.vec_env import VecEnv
+except ImportError:  # stable-baselines is only needed for training
+    VecEnv = object
+
+# the package that registers each env with gym
+ENV_PACKAGES = {
+    'HandClassificationEnv-v3': 'HandClassificationEnv',
+    'HandMakerEnv-v1': 'HandMakerEnv',
+    'OpenFaceSimpleEnv-v1': 'OpenFaceSimpleEnv',
+    'OpenFaceEnv-v1': 'OpenFaceSimpleEnv',
+}
+
+# the batched NumPy implementation of each env that has one, as module and class name
+VEC_ENVS = {
+    'HandClassificationEnv-v3': ('HandClassificationEnv.envs', 'VecHandClassificationEnv'),
+    'HandMakerEnv-v1': ('HandMakerEnv.envs', 'VecHandMaker'),
+    'OpenFaceSimpleEnv-v1': ('OpenFaceSimpleEnv.envs', 'VecOpenFaceSimpleEnv'),
+    'OpenFaceEnv-v1': ('OpenFaceSimpleEnv.envs', 'VecOpenFaceEnv'),
+}
+
+
+def _make_env(env_id, **env_kwargs):
+    importlib.import_module(ENV_PACKAGES[env_id])
+    return gym.make(env_id, **env_kwargs)
+
+
+def _layout(num_envs, observation_space):
+    """Offsets, shapes and dtypes of the arrays in the shared block, and its total size"""
+    fields = [
+        ('obs', (num_envs,) + observation_space.shape, observation_space.dtype),
+        ('terminal_obs', (num_envs,) + observation_space.shape, observation_space.dtype),
+        ('actions', (num_envs,), np.int64),
+        ('rewards', (num_envs,), np.float32),
+        ('dones', (num_envs,), np.bool_),
+    ]
+    layout, offset = {}, 0
+    for name, shape, dtype in fields:
+        dtype = np.dtype(dtype)
+        offset = -(-offset // 8) * 8  # keep every array 8 byte aligned
+        layout[name] = (offset, shape, dtype)
+        offset += int(np.prod(shape)) * dtype.itemsize
+    return layout, max(offset, 1)
+
+
+def _views(buffer, layout):
+    return {name: np.ndarray(shape, dtype, buffer, offset) for name, (offset, shape, dtype) in layout.items()}
+
+
+class EnvGames:
+    """One gym env per game, with the batched interface of VecOpenFaceSimpleEnv"""
+
+    def __init__(self, env_id, n, seed, env_kwargs):
+        self.envs = [_make_env(env_id, **env_kwargs) for _ in range(n)]
+        self.obs_buffer = None
+        self.seed(seed)
+
+    def set_obs_buffer(self, buffer=None):
+        """Has every env write its observations into its row of buffer"""
+        self.obs_buffer = buffer
+        for i, env in enumerate(self.envs):
+            env.set_obs_buffer(None if buffer is None else buffer[i])
+
+    def _stack(self, observations):
+        return np.array(observations) if self.obs_buffer is None else self.obs_buffer
+
+    def seed(self, seed=None):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seeds = seed.spawn(len(self.envs))
+        for env, env_seed in zip(self.envs, seeds):
+            # gym spaces only take int seeds
+            env.seed(int(env_seed.generate_state(1)[0]))
+
+    def reset(self):
+        return self._stack([env.reset() for env in self.envs])
+
+    def step(self, actions):
+        results = [env.step(action) for env, action in zip(self.envs, actions)]
+        infos = []
+        observations = []
+        for env, (obs, _, done, info) in zip(self.envs, results):
+            if done:
+                # copied, as reset overwrites the env's obs buffer
+                info = dict(info, terminal_observation=np.array(obs))
+                obs = env.reset()
+            observations.append(obs)
+            infos.append(info)
+        rewards = np.array([result[1] for result in results])
+        dones = np.array([result[2] for result in results])
+        return self._stack(observations), rewards, dones, infos
+
+    def get_attr(self, attr_name, indices):
+        return [getattr(self.envs[i], attr_name) for i in indices]
+
+    def set_attr(self, attr_name, value, indices):
+        for i in indices:
+            setattr(self.envs[i], attr_name, value)
+
+    def env_method(self, method_name, args, kwargs, indices):
+        return [getattr(self.envs[i], method_name)(*args, **kwargs) for i in indices]
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class VecGames(EnvGames):
+    """A slice of games run as one of the batched VEC_ENVS"""
+
+    def __init__(self, env_id, n, seed, env_kwargs):
+        module, name = VEC_ENVS[env_id]
+        self.vec_env = getattr(importlib.import_module(module), name)(n, seed=seed, **env_kwargs)
+
+    def seed(self, seed=None):
+        self.vec_env.seed(seed)
+
+    def set_obs_buffer(self, buffer=None):
+        self.vec_env.set_obs_buffer(buffer)
+
+    def reset(self):
+        return self.vec_env.reset()
+
+    def step(self, actions):
+        return self.vec_env.step(actions)
+
+    def close(self):
+        self.vec_env.close()
+
+    def get_attr(self, attr_name, indices):
+        return self.vec_env.get_attr(attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices):
+        self.vec_env.set_attr(attr_name, value, indices)
+
+    def env_method(self, method_name, args, kwargs, indices):
+        return self.vec_env.env_method(method_name, *args, indices=indices, **kwargs)
+
+
+def make_games(env_id, n, seed=None, **env_kwargs):
+    """n auto-resetting games of an env, stepped with one call, batched for the VEC_ENVS"""
+    games_class = VecGames if env_id in VEC_ENVS else EnvGames
+    return games_class(env_id, n, seed, env_kwargs)
+
+
+def _worker(remote, parent_remote, shm_name, layout, env_id, games, seed, env_kwargs):
+    parent_remote.close()
+    shm = SharedMemory(name=shm_name)
+    views = {name: array[games] for name, array in _views(shm.buf, layout).items()}
+    runner = make_games(env_id, games.stop - games.start, seed, **env_kwargs)
+    runner.set_obs_buffer(views['obs'])
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == 'step':
+                obs, rewards, dones, infos = runner.step(views['actions'])
+                if obs is not views['obs']:
+                    views['obs'][:] = obs
+                views['rewards'][:] = rewards
+                views['dones'][:] = dones
+                for i in np.flatnonzero(dones):
+                    views['terminal_obs'][i] = infos[i]['terminal_observation']
+                remote.send(None)
+            elif command == 'reset':
+                obs = runner.reset()
+                if obs is not views['obs']:
+                    views['obs'][:] = obs
+                remote.send(None)
+            elif command == 'seed':
+                remote.send(runner.seed(data))
+            elif command == 'get_attr':
+                remote.send(runner.get_attr(*data))
+            elif command == 'set_attr':
+                remote.send(runner.set_attr(*data))
+            elif command == 'env_method':
+                remote.send(runner.env_method(*data))
+            elif command == 'close':
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.close()
+        # the arrays must be released before the block can be closed
+        del views
+        shm.close()
+        remote.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """Steps num_envs games of a registered poker env in n_workers subprocesses
+
+    :param env_id: str          one of the env ids in ENV_PACKAGES
+    :param num_envs: int        total number of games
+    :param n_workers: int       worker processes, each running a contiguous slice of the games
+    :param seed: int            root seed, every worker gets a seed spawned from it, so games repeat for the
+                                same seed and number of workers
+    :param start_method: str    multiprocessing start method, the platform default if None
+    :param env_kwargs:          passed to every env, e.g. obs_mode
+    """
+
+    def __init__(self, env_id, num_envs, n_workers=None, seed=None, start_method=None, **env_kwargs):
+        n_workers = min(n_workers or mp.cpu_count(), num_envs)
+        env = _make_env(env_id, **env_kwargs)
+        self.num_envs = num_envs
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        self.reward_range = env.reward_range
+        self.metadata = {'render_modes': []}
+        env.close()
+
+        layout, size = _layout(num_envs, self.observation_space)
+        self.shm = SharedMemory(create=True, size=size)
+        self.buffers = _views(self.shm.buf, layout)
+        bounds = np.linspace(0, num_envs, n_workers + 1).astype(int)
+        self.slices = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        seeds = np.random.SeedSequence(seed).spawn(n_workers)
+
+        context = mp.get_context(start_method)
+        self.remotes, self.processes = [], []
+        for games, worker_seed in zip(self.slices, seeds):
+            remote, work_remote = context.Pipe()
+            args = (work_remote, remote, self.shm.name, layout, env_id, games, worker_seed, env_kwargs)
+            process = context.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.waiting = False
+        self.closed = False
+
+    def _broadcast(self, command, data=None):
+        for remote in self.remotes:
+            remote.send((command, data))
+        return [remote.recv() for remote in self.remotes]
+
+    def reset(self):
+        self._broadcast('reset')
+        return self.buffers['obs'].copy()
+
+    def step_async(self, actions):
+        self.buffers['actions'][:] = np.asarray(actions).reshape(self.num_envs)
+        for remote in self.remotes:
+            remote.send(('step', None))
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        self.waiting = False
+        dones = self.buffers['dones'].copy()
+        infos = [{} for _ in range(self.num_envs)]
+        for game in np.flatnonzero(dones):
+            infos[game]['terminal_observation'] = self.buffers['terminal_obs'][game].copy()
+        return self.buffers['obs'].copy(), self.buffers['rewards'].copy(), dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def seed(self, seed=None):
+        seeds = np.random.SeedSequence(seed).spawn(len(self.remotes))
+        for remote, worker_seed in zip(self.remotes, seeds):
+            remote.send(('seed', worker_seed))
+        for remote in self.remotes:
+            remote.recv()
+        return [seed] * self.num_envs
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        del self.buffers
+        self.shm.close()
+        self.shm.unlink()
+        self.closed = True
+
+    def _by_worker(self, indices):
+        """Splits global game indices into (worker, local indices) pairs"""
+        indices = range(self.num_envs) if indices is None else [indices] if isinstance(indices, int) else indices
+        for worker, games in enumerate(self.slices):
+            local = [i - games.start for i in indices if games.start <= i < games.stop]
+            if local:
+                yield worker, local
+
+    def _request(self, command, data_for, indices):
+        pending = []
+        for worker, local in self._by_worker(indices):
+            self.remotes[worker].send((command, data_for(local)))
+            pending.append(worker)
+        return [self.remotes[worker].recv() for worker in pending]
+
+    def get_attr(self, attr_name, indices=None):
+        results = self._request('get_attr', lambda local: (attr_name, local), indices)
+        return [value for values in results for value in values]
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._request('set_attr', lambda local: (attr_name, value, local), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        results = self._request('env_method', lambda local: (method_name, method_args, method_kwargs, local),
+                                indices)
+        return [value for values in results for value in values]
+
+    def get_images(self, *args, **kwargs):
+        raise NotImplementedError("SharedMemoryVecEnv does not render")
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
@@ -0,0 +1,264 @@
+"""Grid and random searches over the training settings, run in parallel on the local cores
+
+A sweep trains every configuration drawn from a search space once per seed. Each run is a process of its own
+pinned to `cores_per_run` cores, at most `max_concurrent` of them at a time, and trains through
+`agent_training.learn` with checkpoints in its run directory. A run is identified by a hash of its settings, so
+starting the same sweep again skips the finished runs and resumes the interrupted ones from their last checkpoint.
+The final metrics and steps/sec of every run are gathered into results.csv in the sweep directory.
+
+The search space maps the settings of agent_training (SETTINGS) to a list of values, one value, or for random
+search a {"uniform": [low, high]} or {"log_uniform": [low, high]} range:
+
+    python sweep.py --space '{"learning_rate": [0.0005, 0.0001], "net_arch": [[64, 64], [160, 160]]}' --seeds 0 1 2
+    python sweep.py --space space.json --random 20 --cores-per-run 2 --max-concurrent 4 --checkpoint-interval 50000
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from collections import deque, namedtuple
+from multiprocessing.connection import wait
+import numpy as np
+
+# the swept settings and the agent_training constants they default to
+SETTINGS = {
+    'env_name': 'ENVIRONMENT',
+    'timesteps': 'TIMESTEPS',
+    'net_arch': 'NETWORK_ARCH',
+    'learning_rate': 'LEARNING_RATE',
+    'num_envs': 'NUM_ENVS',
+    'num_workers': 'NUM_WORKERS',
+}
+RESULT_FILE = 'result.json'
+METRICS = ('timesteps', 'seconds', 'steps_per_sec', 'accuracy')
+EVAL_SAMPLES = 20000
+
+Run = namedtuple('Run', ['run_id', 'config', 'seed', 'run_dir'])
+
+
+def _check_space(space):
+    unknown = set(space) - set(SETTINGS)
+    if unknown:
+        raise ValueError(f"unknown settings {sorted(unknown)}, expected some of {list(SETTINGS)}")
+
+
+def _is_range(values):
+    return isinstance(values, dict) and len(values) == 1 and next(iter(values)) in ('uniform', 'log_uniform')
+
+
+def grid(space):
+    """Every combination of the values in space, as a list of configs"""
+    _check_space(space)
+    keys = sorted(space)
+    options = []
+    for key in keys:
+        if _is_range(space[key]):
+            raise ValueError(f"{key}: ranges can only be sampled by a random search")
+        options.append(space[key] if isinstance(space[key], list) else [space[key]])
+    return [dict(zip(keys, values)) for values in itertools.product(*options)]
+
+
+def _sample(rng, values):
+    if isinstance(values, list):
+        return values[rng.integers(len(values))]
+    if not _is_range(values):
+        return values
+    (scale, (low, high)), = values.items()
+    if scale == 'log_uniform':
+        return float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    if isinstance(low, int) and isinstance(high, int):
+        return int(rng.integers(low, high + 1))
+    return float(rng.uniform(low, high))
+
+
+def random_search(space, n, seed=0):
+    """n configs with every setting drawn independently from space, the same n for the same seed"""
+    _check_space(space)
+    rng = np.random.default_rng(seed)
+    return [{key: _sample(rng, space[key]) for key in sorted(space)} for _ in range(n)]
+
+
+def make_runs(configs, seeds, sweep_dir):
+    """One Run per config and seed, with its id and directory derived from both"""
+    runs = []
+    for config, seed in itertools.product(configs, seeds):
+        key = json.dumps({'config': config, 'seed': seed}, sort_keys=True)
+        run_id = hashlib.sha1(key.encode()).hexdigest()[:12]
+        runs.append(Run(run_id, config, seed, os.path.join(sweep_dir, run_id)))
+    return runs
+
+
+def read_result(run):
+    path = os.path.join(run.run_dir, RESULT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_result(run_dir, result):
+    tmp_path = os.path.join(run_dir, f'{RESULT_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f, indent=1)
+    os.replace(tmp_path, os.path.join(run_dir, RESULT_FILE))
+
+
+def train_run(config, seed, run_dir, n_cpu=None, checkpoint_interval=None, eval_samples=EVAL_SAMPLES):
+    """Trains one run of a sweep in this process, resuming its checkpoint, and returns its metrics"""
+    import agent_training
+    from evaluation import N_ACTIONS, evaluate
+
+    settings = {key: config.get(key, getattr(agent_training, name)) for key, name in SETTINGS.items()}
+    env = agent_training.make_env(settings['env_name'], settings['num_envs'], settings['num_workers'], seed=seed)
+    try:
+        model = agent_training.load_checkpoint(run_dir, env, n_cpu)
+        if model is None:
+            model = agent_training.make_model(env, settings['net_arch'], settings['learning_rate'], seed, n_cpu)
+        progress = agent_training.learn(model, settings['timesteps'], os.path.basename(run_dir), run_dir,
+                                        checkpoint_interval)
+        model.save(save_path=os.path.join(run_dir, 'model'), cloudpickle=False)
+        metrics = dict(progress, steps_per_sec=progress['timesteps'] / max(progress['seconds'], 1e-9))
+        if eval_samples and settings['env_name'] in N_ACTIONS:
+            metrics['accuracy'] = evaluate(model, settings['env_name'], samples=eval_samples, seed=seed).accuracy()
+        return metrics
+    finally:
+        env.close()
+
+
+def _run_process(target, run, cores, checkpoint_interval):
+    # pins this run and the env worker processes it starts to its cores
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    result = {'run_id': run.run_id, 'config': run.config, 'seed': run.seed, 'cores': list(cores)}
+    try:
+        result.update(target(run.config, run.seed, run.run_dir, n_cpu=len(cores) or None,
+                             checkpoint_interval=checkpoint_interval), status='done')
+    except BaseException:
+        result.update(status='failed', error=traceback.format_exc())
+        _write_result(run.run_dir, result)
+        raise
+    _write_result(run.run_dir, result)
+
+
+class Sweep:
+    """Runs a list of runs in parallel processes, each pinned to cores of its own
+
+    :param runs: list               `Run`s from `make_runs`
+    :param cores: list              the cores to schedule on, the cores this process may use by default
+    :param cores_per_run: int       cores pinned to each run
+    :param max_concurrent: int      cap on the runs training at once, as many as the cores allow by default
+    :param checkpoint_interval: int timesteps between checkpoints of a run, only one at its end by default
+    :param target: callable         trains one run, `train_run` or anything with its signature returning metrics
+    """
+
+    def __init__(self, runs, cores=None, cores_per_run=1, max_concurrent=None, checkpoint_interval=None,
+                 target=train_run):
+        if cores is None:
+            cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else range(os.cpu_count())
+        self.runs = runs
+        self.cores = list(cores)
+        self.cores_per_run = cores_per_run
+        if cores_per_run > len(self.cores):
+            raise ValueError(f"{cores_per_run} cores per run, only {len(self.cores)} cores to schedule on")
+        slots = len(self.cores) // cores_per_run
+        self.max_concurrent = min(max_concurrent or slots, slots)
+        self.checkpoint_interval = checkpoint_interval
+        self.target = target
+
+    def pending(self):
+        """The runs without a finished result, failed runs are tried again"""
+        return [run for run in self.runs if (read_result(run) or {}).get('status') != 'done']
+
+    def run(self):
+        """Runs the pending runs, blocking until all of them have finished or failed"""
+        queue = deque(self.pending())
+        print(f"[INFO] {len(queue)} of {len(self.runs)} runs to train, {self.max_concurrent} at a time")
+        free_cores = deque(self.cores)
+        running = {}
+        context = multiprocessing.get_context()
+        try:
+            while queue or running:
+                while queue and len(running) < self.max_concurrent:
+                    run = queue.popleft()
+                    cores = [free_cores.popleft() for _ in range(self.cores_per_run)]
+                    os.makedirs(run.run_dir, exist_ok=True)
+                    process = context.Process(target=_run_process, name=f'sweep-{run.run_id}',
+                                              args=(self.target, run, cores, self.checkpoint_interval))
+                    process.start()
+                    running[process.sentinel] = (process, run, cores)
+                    print(f"[INFO] STARTED {run.run_id} seed {run.seed} on cores {cores}: {run.config}")
+                for sentinel in wait(list(running)):
+                    process, run, cores = running.pop(sentinel)
+                    process.join()
+                    free_cores.extend(cores)
+                    status = (read_result(run) or {}).get('status', f'exit code {process.exitcode}')
+                    print(f"[INFO] FINISHED {run.run_id}: {status}")
+        finally:
+            for process, _, _ in running.values():
+                process.terminate()
+                process.join()
+        return self.results()
+
+    def results(self):
+        """One row per run of its seed, settings, status and metrics"""
+        rows = []
+        for run in self.runs:
+            result = read_result(run) or {'status': 'pending'}
+            row = {'run_id': run.run_id, 'status': result['status'], 'seed': run.seed}
+            row.update({key: json.dumps(value) if isinstance(value, list) else value
+                        for key, value in run.config.items()})
+            row.update({metric: result.get(metric, '') for metric in METRICS})
+            rows.append(row)
+        return rows
+
+
+def write_table(rows, path):
+    """Writes result rows as a CSV table"""
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def load_space(space):
+    """A search space from a JSON string or the path of a JSON file"""
+    if os.path.exists(space):
+        with open(space) as f:
+            return json.load(f)
+    return json.loads(space)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--space', required=True, help="JSON search space, or the path of a JSON file")
+    parser.add_argument('--random', type=int, metavar='N', help="sample N configs instead of the full grid")
+    parser.add_argument('--search-seed', type=int, default=0, help="seed of the random search")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0], help="each config trains once per seed")
+    parser.add_argument('--sweep-dir', default='sweeps/sweep')
+    parser.add_argument('--cores-per-run', type=int, default=1)
+    parser.add_argument('--max-concurrent', type=int)
+    parser.add_argument('--checkpoint-interval', type=int)
+    args = parser.parse_args(args)
+
+    space = load_space(args.space)
+    configs = random_search(space, args.random, args.search_seed) if args.random else grid(space)
+    sweep = Sweep(make_runs(configs, args.seeds, args.sweep_dir), cores_per_run=args.cores_per_run,
+                  max_concurrent=args.max_concurrent, checkpoint_interval=args.checkpoint_interval)
+    start = time.perf_counter()
+    rows = sweep.run()
+    path = os.path.join(args.sweep_dir, 'results.csv')
+    write_table(rows, path)
+    done = sum(row['status'] == 'done' for row in rows)
+    print(f"[INFO] {done} of {len(rows)} runs done in {time.perf_counter() - start:.0f}s, results in {path}")
+
+
+if __name__ == '__main__':
+    main()
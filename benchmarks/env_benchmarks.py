@@ -0,0 +1,210 @@
+"""Throughput benchmarks for the poker environments
+
+Measures steps/sec, resets/sec, p50/p99 step latency and the peak memory allocated per step (tracemalloc)
+for the single and vectorized envs, the OpenFaceSimpleEnv observation space sampler and hand evaluation.
+
+    python env_benchmarks.py --output results.json
+    python env_benchmarks.py --baseline results.json --tolerance 0.2
+
+With --baseline the run is compared against a stored result file and exits with status 1 if any metric got
+worse by more than the tolerance.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+import gym
+import numpy as np
+import HandClassificationEnv
+import HandMakerEnv
+import OpenFaceSimpleEnv
+from OpenFaceSimpleEnv.envs import VecOpenFaceEnv, VecOpenFaceSimpleEnv
+from HandClassificationEnv.envs import VecHandClassificationEnv
+from HandMakerEnv.envs import VecHandMaker
+from PokerEngine import ofc
+from PokerEngine.cards import shuffled_decks
+from PokerEngine.evaluation import evaluate_batch, rank_table
+
+warnings.filterwarnings('ignore')
+
+STEPS = 20000
+ALLOC_STEPS = 500
+VEC_ENVS = 256
+EVAL_BATCH = 4096
+
+# metrics where a larger number is better, all others are better when smaller
+HIGHER_IS_BETTER = ('steps_per_sec', 'resets_per_sec')
+
+
+class EnvCase:
+    """Steps a gym env with a fixed action pattern, resetting whenever an episode ends"""
+
+    def __init__(self, env_id, **kwargs):
+        self.env = gym.make(env_id, **kwargs)
+        self.env.reset()
+        self.t = 0
+        self.per_call = 1
+
+    def step(self):
+        self.t += 1
+        # alternating rows keeps the open face env legal until the board is full
+        _, _, done, _ = self.env.step(self.t % 2)
+        if done:
+            self.env.reset()
+
+    def reset(self):
+        self.env.reset()
+
+
+class VecEnvCase:
+    def __init__(self, num_envs, vec_env_class=VecOpenFaceSimpleEnv):
+        self.env = vec_env_class(num_envs, seed=0)
+        self.env.reset()
+        self.t = 0
+        self.per_call = num_envs
+        self.actions = np.zeros(num_envs, dtype=np.intp)
+
+    def step(self):
+        self.t += 1
+        self.actions[:] = self.t % 2
+        self.env.step(self.actions)
+
+    def reset(self):
+        self.env.reset()
+
+
+class SampleCase:
+    def __init__(self):
+        self.space = gym.make('OpenFaceSimpleEnv-v1').observation_space
+        self.per_call = 1
+
+    def step(self):
+        self.space.sample()
+
+
+class SampleBatchCase:
+    def __init__(self, batch_size):
+        self.space = gym.make('OpenFaceSimpleEnv-v1').observation_space
+        self.out = np.empty((batch_size, ofc.OBS_SIZE), dtype=np.uint8)
+        self.per_call = batch_size
+
+    def step(self):
+        self.space.sample_batch(len(self.out), out=self.out)
+
+
+class EvaluateCase:
+    def __init__(self, batch_size):
+        rank_table()
+        self.hands = shuffled_decks(np.random.default_rng(0), batch_size)[:, :5]
+        self.per_call = batch_size
+
+    def step(self):
+        evaluate_batch(self.hands)
+
+
+CASES = {
+    'OpenFaceSimpleEnv-v1': lambda: EnvCase('OpenFaceSimpleEnv-v1'),
+    f'VecOpenFaceSimpleEnv-{VEC_ENVS}': lambda: VecEnvCase(VEC_ENVS),
+    'OpenFaceEnv-v1': lambda: EnvCase('OpenFaceEnv-v1'),
+    f'VecOpenFaceEnv-{VEC_ENVS}': lambda: VecEnvCase(VEC_ENVS, VecOpenFaceEnv),
+    'HandClassificationEnv-v3': lambda: EnvCase('HandClassificationEnv-v3'),
+    'HandMakerEnv-v1': lambda: EnvCase('HandMakerEnv-v1'),
+    f'VecHandClassificationEnv-{VEC_ENVS}': lambda: VecEnvCase(VEC_ENVS, VecHandClassificationEnv),
+    f'VecHandMaker-{VEC_ENVS}': lambda: VecEnvCase(VEC_ENVS, VecHandMaker),
+    'OFCSObservationSpace.sample': SampleCase,
+    f'OFCSObservationSpace.sample_batch-{EVAL_BATCH}': lambda: SampleBatchCase(EVAL_BATCH),
+    'evaluate_batch-1': lambda: EvaluateCase(1),
+    f'evaluate_batch-{EVAL_BATCH}': lambda: EvaluateCase(EVAL_BATCH),
+}
+
+
+def measure(case, steps=STEPS, alloc_steps=ALLOC_STEPS):
+    """Times `steps` calls of case.step, then measures allocation over `alloc_steps` more calls"""
+    latencies = np.empty(steps, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(steps):
+        start = clock()
+        case.step()
+        latencies[i] = clock() - start
+    total = latencies.sum() / 1e9
+    result = {
+        'steps_per_sec': steps * case.per_call / total,
+        'p50_latency_us': float(np.percentile(latencies, 50)) / 1e3,
+        'p99_latency_us': float(np.percentile(latencies, 99)) / 1e3,
+    }
+
+    if hasattr(case, 'reset'):
+        resets = max(steps // 10, 1)
+        start = clock()
+        for _ in range(resets):
+            case.reset()
+        result['resets_per_sec'] = resets / ((clock() - start) / 1e9)
+
+    tracemalloc.start()
+    peaks = np.empty(alloc_steps, dtype=np.int64)
+    for i in range(alloc_steps):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        case.step()
+        peaks[i] = tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    result['alloc_bytes_per_step'] = float(peaks.mean())
+    return result
+
+
+def run(names=None, steps=STEPS):
+    results = {}
+    for name, make_case in CASES.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(make_case(), steps)
+        print(f"[INFO] {name}: " + ", ".join(f"{k} {v:,.1f}" for k, v in results[name].items()))
+    return {'python': sys.version.split()[0], 'machine': platform.machine(), 'numpy': np.__version__,
+            'time': time.asctime(), 'results': results}
+
+
+def compare(results, baseline, tolerance):
+    """Returns a message for every metric that is worse than the baseline by more than `tolerance`"""
+    regressions = []
+    for name, metrics in results['results'].items():
+        for metric, value in metrics.items():
+            reference = baseline['results'].get(name, {}).get(metric)
+            if not reference:
+                continue
+            change = value / reference - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append(f"{name} {metric}: {reference:,.1f} -> {value:,.1f} ({change:+.0%})")
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a previous results file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown per metric")
+    parser.add_argument('--steps', type=int, default=STEPS)
+    parser.add_argument('--only', nargs='*', choices=sorted(CASES), help="run only these benchmarks")
+    args = parser.parse_args(args)
+
+    results = run(args.only, args.steps)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] RESULTS SAVED TO {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            return 1
+        print("[INFO] No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())